@@ -14,6 +14,14 @@ from app.models.user import User  # noqa: F401
 from app.models.persona import Persona  # noqa: F401
 from app.models.plan import BrowsingPlan  # noqa: F401
 from app.models.noise_event import NoiseEvent  # noqa: F401
+from app.models.scheduler_state import SchedulerState  # noqa: F401
+from app.models.job import PlanJob  # noqa: F401
+from app.models.plan_action import PlanAction  # noqa: F401
+from app.models.rollup import ActivityRollup  # noqa: F401
+from app.models.idempotency import IdempotencyRecord  # noqa: F401
+from app.models.persona_pool import PersonaPoolEntry  # noqa: F401
+from app.models.noise_filter import NoiseFilterState  # noqa: F401
+from app.models.llm_usage import LLMUsageRollup  # noqa: F401
 
 config = context.config
 
@@ -0,0 +1,36 @@
+"""per-user plan version and pending-plan index
+
+Revision ID: 2a7c4f90d1b3
+Revises: f19b6d7e4a20
+Create Date: 2026-10-19 13:30:52.904417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a7c4f90d1b3'
+down_revision: Union[str, None] = 'f19b6d7e4a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('plan_version', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('plans_changed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+
+    with op.batch_alter_table('browsing_plans', schema=None) as batch_op:
+        batch_op.create_index('ix_browsing_plans_persona_pending', ['persona_id', 'executed', 'scheduled_for'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('browsing_plans', schema=None) as batch_op:
+        batch_op.drop_index('ix_browsing_plans_persona_pending')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('plans_changed_at')
+        batch_op.drop_column('plan_version')
@@ -0,0 +1,44 @@
+"""one open plan job per persona
+
+Revision ID: 4e8a1c7d2b95
+Revises: c2d84f6a9e17
+Create Date: 2026-10-19 21:02:37.114902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8a1c7d2b95'
+down_revision: Union[str, None] = 'c2d84f6a9e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_OPEN = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade() -> None:
+    # Keep the oldest open job per persona; later duplicates can't coexist with the index
+    op.execute("""
+        UPDATE plan_jobs SET status = 'failed', error = 'Superseded by an earlier open job'
+        WHERE status IN ('queued', 'running') AND EXISTS (
+            SELECT 1 FROM plan_jobs AS o
+            WHERE o.persona_id = plan_jobs.persona_id
+              AND o.status IN ('queued', 'running')
+              AND (o.created_at < plan_jobs.created_at
+                   OR (o.created_at = plan_jobs.created_at AND o.id < plan_jobs.id))
+        )
+    """)
+    with op.batch_alter_table('plan_jobs', schema=None) as batch_op:
+        batch_op.create_index(
+            'uq_plan_jobs_open_persona', ['persona_id'], unique=True,
+            sqlite_where=_OPEN, postgresql_where=_OPEN,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('plan_jobs', schema=None) as batch_op:
+        batch_op.drop_index('uq_plan_jobs_open_persona')
@@ -0,0 +1,58 @@
+"""activity rollups and activity feed index
+
+Revision ID: 5d93e1a6b8c4
+Revises: 2a7c4f90d1b3
+Create Date: 2026-10-19 14:18:36.610295
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d93e1a6b8c4'
+down_revision: Union[str, None] = '2a7c4f90d1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('activity_rollups',
+    sa.Column('persona_id', sa.String(length=36), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('action_type', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.String(length=64), nullable=False),
+    sa.Column('planned', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['persona_id'], ['personas.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('persona_id', 'day', 'action_type')
+    )
+    with op.batch_alter_table('activity_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_rollups_user_day', ['user_id', 'day'], unique=False)
+
+    with op.batch_alter_table('browsing_plans', schema=None) as batch_op:
+        batch_op.create_index('ix_browsing_plans_persona_created', ['persona_id', 'created_at'], unique=False)
+
+    # Seed rollups from existing plan actions
+    op.execute("""
+        INSERT INTO activity_rollups (persona_id, day, action_type, user_id, planned, completed, failed)
+        SELECT a.persona_id, DATE(a.due_at), a.action_type, p.user_id,
+               COUNT(*),
+               SUM(CASE WHEN a.status = 'completed' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN a.status = 'failed' THEN 1 ELSE 0 END)
+        FROM plan_actions a JOIN personas p ON p.id = a.persona_id
+        GROUP BY a.persona_id, DATE(a.due_at), a.action_type, p.user_id
+    """)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('browsing_plans', schema=None) as batch_op:
+        batch_op.drop_index('ix_browsing_plans_persona_created')
+
+    with op.batch_alter_table('activity_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_rollups_user_day')
+
+    op.drop_table('activity_rollups')
@@ -0,0 +1,38 @@
+"""persona pool buckets keyed on location and profession
+
+Revision ID: 7a5e0b3c9d16
+Revises: 4e8a1c7d2b95
+Create Date: 2026-10-19 21:08:13.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a5e0b3c9d16'
+down_revision: Union[str, None] = '4e8a1c7d2b95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pooled profiles are a cache; ones filed under the old bucket format
+    # would never be claimed, so drop them and let the scheduler refill
+    op.execute("DELETE FROM persona_pool")
+    with op.batch_alter_table('persona_pool', schema=None) as batch_op:
+        batch_op.alter_column('bucket',
+               existing_type=sa.String(length=64),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM persona_pool")
+    with op.batch_alter_table('persona_pool', schema=None) as batch_op:
+        batch_op.alter_column('bucket',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=64),
+               existing_nullable=False)
@@ -0,0 +1,144 @@
+"""persona timezone and active hours
+
+Revision ID: 8b1d52c0a7e4
+Revises: 3f05e5f2203c
+Create Date: 2026-10-19 09:12:04.118532
+
+"""
+import json
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1d52c0a7e4'
+down_revision: Union[str, None] = '3f05e5f2203c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of app.services.timezones as of this revision, so later edits
+# to the app's table don't change (or break) what this backfill writes.
+
+# US states (names + postal codes) — the wizard is US-centric, so these cover
+# the bulk of generated "City, State" locations.
+US_STATES = {
+    "alabama": "America/Chicago", "al": "America/Chicago",
+    "alaska": "America/Anchorage", "ak": "America/Anchorage",
+    "arizona": "America/Phoenix", "az": "America/Phoenix",
+    "arkansas": "America/Chicago", "ar": "America/Chicago",
+    "california": "America/Los_Angeles", "ca": "America/Los_Angeles",
+    "colorado": "America/Denver", "co": "America/Denver",
+    "connecticut": "America/New_York", "ct": "America/New_York",
+    "delaware": "America/New_York", "de": "America/New_York",
+    "district of columbia": "America/New_York", "dc": "America/New_York",
+    "florida": "America/New_York", "fl": "America/New_York",
+    "georgia": "America/New_York", "ga": "America/New_York",
+    "hawaii": "Pacific/Honolulu", "hi": "Pacific/Honolulu",
+    "idaho": "America/Boise", "id": "America/Boise",
+    "illinois": "America/Chicago", "il": "America/Chicago",
+    "indiana": "America/Indiana/Indianapolis", "in": "America/Indiana/Indianapolis",
+    "iowa": "America/Chicago", "ia": "America/Chicago",
+    "kansas": "America/Chicago", "ks": "America/Chicago",
+    "kentucky": "America/New_York", "ky": "America/New_York",
+    "louisiana": "America/Chicago", "la": "America/Chicago",
+    "maine": "America/New_York", "me": "America/New_York",
+    "maryland": "America/New_York", "md": "America/New_York",
+    "massachusetts": "America/New_York", "ma": "America/New_York",
+    "michigan": "America/Detroit", "mi": "America/Detroit",
+    "minnesota": "America/Chicago", "mn": "America/Chicago",
+    "mississippi": "America/Chicago", "ms": "America/Chicago",
+    "missouri": "America/Chicago", "mo": "America/Chicago",
+    "montana": "America/Denver", "mt": "America/Denver",
+    "nebraska": "America/Chicago", "ne": "America/Chicago",
+    "nevada": "America/Los_Angeles", "nv": "America/Los_Angeles",
+    "new hampshire": "America/New_York", "nh": "America/New_York",
+    "new jersey": "America/New_York", "nj": "America/New_York",
+    "new mexico": "America/Denver", "nm": "America/Denver",
+    "new york": "America/New_York", "ny": "America/New_York",
+    "north carolina": "America/New_York", "nc": "America/New_York",
+    "north dakota": "America/Chicago", "nd": "America/Chicago",
+    "ohio": "America/New_York", "oh": "America/New_York",
+    "oklahoma": "America/Chicago", "ok": "America/Chicago",
+    "oregon": "America/Los_Angeles", "or": "America/Los_Angeles",
+    "pennsylvania": "America/New_York", "pa": "America/New_York",
+    "rhode island": "America/New_York", "ri": "America/New_York",
+    "south carolina": "America/New_York", "sc": "America/New_York",
+    "south dakota": "America/Chicago", "sd": "America/Chicago",
+    "tennessee": "America/Chicago", "tn": "America/Chicago",
+    "texas": "America/Chicago", "tx": "America/Chicago",
+    "utah": "America/Denver", "ut": "America/Denver",
+    "vermont": "America/New_York", "vt": "America/New_York",
+    "virginia": "America/New_York", "va": "America/New_York",
+    "washington": "America/Los_Angeles", "wa": "America/Los_Angeles",
+    "west virginia": "America/New_York", "wv": "America/New_York",
+    "wisconsin": "America/Chicago", "wi": "America/Chicago",
+    "wyoming": "America/Denver", "wy": "America/Denver",
+}
+
+# Cities, provinces and countries outside the state table.
+PLACES = {
+    "new york city": "America/New_York", "nyc": "America/New_York",
+    "los angeles": "America/Los_Angeles", "san francisco": "America/Los_Angeles",
+    "seattle": "America/Los_Angeles", "portland": "America/Los_Angeles",
+    "chicago": "America/Chicago", "houston": "America/Chicago",
+    "dallas": "America/Chicago", "austin": "America/Chicago",
+    "denver": "America/Denver", "phoenix": "America/Phoenix",
+    "boston": "America/New_York", "miami": "America/New_York",
+    "atlanta": "America/New_York", "toronto": "America/Toronto",
+    "ontario": "America/Toronto", "quebec": "America/Toronto",
+    "montreal": "America/Toronto", "vancouver": "America/Vancouver",
+    "british columbia": "America/Vancouver", "alberta": "America/Edmonton",
+    "calgary": "America/Edmonton", "mexico": "America/Mexico_City",
+    "united kingdom": "Europe/London", "uk": "Europe/London",
+    "england": "Europe/London", "london": "Europe/London",
+    "scotland": "Europe/London", "ireland": "Europe/Dublin",
+    "dublin": "Europe/Dublin", "france": "Europe/Paris", "paris": "Europe/Paris",
+    "germany": "Europe/Berlin", "berlin": "Europe/Berlin",
+    "spain": "Europe/Madrid", "madrid": "Europe/Madrid",
+    "italy": "Europe/Rome", "rome": "Europe/Rome",
+    "netherlands": "Europe/Amsterdam", "amsterdam": "Europe/Amsterdam",
+    "india": "Asia/Kolkata", "japan": "Asia/Tokyo", "tokyo": "Asia/Tokyo",
+    "australia": "Australia/Sydney", "sydney": "Australia/Sydney",
+    "melbourne": "Australia/Melbourne", "brazil": "America/Sao_Paulo",
+}
+
+
+def timezone_for_location(location: str | None) -> str:
+    if not location:
+        return "UTC"
+    parts = [p.strip().lower() for p in re.split(r"[,/;]", location) if p.strip()]
+    for token in reversed(parts):
+        if token in US_STATES:
+            return US_STATES[token]
+        if token in PLACES:
+            return PLACES[token]
+    return "UTC"
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('personas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timezone', sa.String(length=64), nullable=False, server_default='UTC'))
+        batch_op.add_column(sa.Column('active_hours_start', sa.Integer(), nullable=False, server_default='8'))
+        batch_op.add_column(sa.Column('active_hours_end', sa.Integer(), nullable=False, server_default='22'))
+        batch_op.create_index('ix_personas_active_timezone', ['is_active', 'timezone'], unique=False)
+
+    # Backfill timezones from existing profile locations
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, profile FROM personas")).all()
+    for persona_id, profile in rows:
+        location = json.loads(profile or "{}").get("location")
+        conn.execute(
+            sa.text("UPDATE personas SET timezone = :tz WHERE id = :id"),
+            {"tz": timezone_for_location(location), "id": persona_id},
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('personas', schema=None) as batch_op:
+        batch_op.drop_index('ix_personas_active_timezone')
+        batch_op.drop_column('active_hours_end')
+        batch_op.drop_column('active_hours_start')
+        batch_op.drop_column('timezone')
@@ -0,0 +1,28 @@
+"""plan source (llm or derived)
+
+Revision ID: 9c2e57b4a1f0
+Revises: 5d93e1a6b8c4
+Create Date: 2026-10-19 16:05:12.318842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e57b4a1f0'
+down_revision: Union[str, None] = '5d93e1a6b8c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('browsing_plans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('source', sa.String(length=16), nullable=False, server_default='llm'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('browsing_plans', schema=None) as batch_op:
+        batch_op.drop_column('source')
@@ -0,0 +1,33 @@
+"""noise dedupe filter state
+
+Revision ID: a7c93e5f1b42
+Revises: f4c81b26d9a7
+Create Date: 2026-10-19 19:04:37.512208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c93e5f1b42'
+down_revision: Union[str, None] = 'f4c81b26d9a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('noise_filters',
+    sa.Column('persona_id', sa.String(length=36), nullable=False),
+    sa.Column('state', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['persona_id'], ['personas.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('persona_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('noise_filters')
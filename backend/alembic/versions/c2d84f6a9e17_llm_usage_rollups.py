@@ -0,0 +1,41 @@
+"""llm usage rollups
+
+Revision ID: c2d84f6a9e17
+Revises: a7c93e5f1b42
+Create Date: 2026-10-19 20:11:52.308416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d84f6a9e17'
+down_revision: Union[str, None] = 'a7c93e5f1b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('llm_usage_rollups',
+    sa.Column('user_id', sa.String(length=64), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('persona_id', sa.String(length=36), nullable=False),
+    sa.Column('task', sa.String(length=32), nullable=False),
+    sa.Column('calls', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('completion_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('wall_ms', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'persona_id', 'task')
+    )
+    with op.batch_alter_table('llm_usage_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_llm_usage_rollups_day_user', ['day', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('llm_usage_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_llm_usage_rollups_day_user')
+
+    op.drop_table('llm_usage_rollups')
@@ -0,0 +1,31 @@
+"""scheduler state checkpoint table
+
+Revision ID: c47e9a31f2d8
+Revises: 8b1d52c0a7e4
+Create Date: 2026-10-19 10:03:27.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e9a31f2d8'
+down_revision: Union[str, None] = '8b1d52c0a7e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('scheduler_state',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('state', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduler_state')
@@ -0,0 +1,37 @@
+"""persona warm pool
+
+Revision ID: d8a4c61f7e93
+Revises: b6f1d3e8c025
+Create Date: 2026-10-19 17:22:41.086514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a4c61f7e93'
+down_revision: Union[str, None] = 'b6f1d3e8c025'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('persona_pool',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('bucket', sa.String(length=64), nullable=False),
+    sa.Column('profile', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('persona_pool', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_persona_pool_bucket'), ['bucket'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('persona_pool', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_persona_pool_bucket'))
+
+    op.drop_table('persona_pool')
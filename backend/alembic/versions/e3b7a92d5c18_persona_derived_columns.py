@@ -0,0 +1,62 @@
+"""persona summary, location and noise intensity columns
+
+Revision ID: e3b7a92d5c18
+Revises: d8a4c61f7e93
+Create Date: 2026-10-19 17:51:36.402217
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7a92d5c18'
+down_revision: Union[str, None] = 'd8a4c61f7e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def summarize_profile(profile: dict, fallback_name: str | None = None) -> str:
+    # Frozen copy of app.models.persona.summarize_profile as of this revision,
+    # so later changes to the app don't change what this backfill writes
+    return (
+        f"{profile.get('name', fallback_name)}, "
+        f"age {profile.get('age', '?')}, "
+        f"{profile.get('profession', '?')} from {profile.get('location', '?')}. "
+        f"Interests: {', '.join(profile.get('interests', [])[:5])}"
+    )
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('personas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.Text(), nullable=False, server_default=''))
+        batch_op.add_column(sa.Column('location', sa.String(length=128), nullable=True))
+        batch_op.add_column(sa.Column('noise_intensity', sa.String(length=16), nullable=False, server_default='moderate'))
+
+    # Backfill the derived columns from the stored JSON
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, name, profile, wizard_answers FROM personas")).all()
+    for persona_id, name, profile, answers in rows:
+        profile = json.loads(profile or "{}")
+        conn.execute(
+            sa.text(
+                "UPDATE personas SET summary = :summary, location = :location, "
+                "noise_intensity = :intensity WHERE id = :id"
+            ),
+            {
+                "summary": summarize_profile(profile, name),
+                "location": profile.get("location"),
+                "intensity": json.loads(answers or "{}").get("noise_intensity", "moderate"),
+                "id": persona_id,
+            },
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('personas', schema=None) as batch_op:
+        batch_op.drop_column('noise_intensity')
+        batch_op.drop_column('location')
+        batch_op.drop_column('summary')
@@ -0,0 +1,46 @@
+"""plan generation jobs
+
+Revision ID: e5a0c8d13b62
+Revises: c47e9a31f2d8
+Create Date: 2026-10-19 11:20:48.703315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a0c8d13b62'
+down_revision: Union[str, None] = 'c47e9a31f2d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('plan_jobs',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=64), nullable=False),
+    sa.Column('persona_id', sa.String(length=36), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('plan_id', sa.String(length=36), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['persona_id'], ['personas.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('plan_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_plan_jobs_persona_id'), ['persona_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_plan_jobs_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_plan_jobs_user_id'), ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('plan_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_plan_jobs_user_id'))
+        batch_op.drop_index(batch_op.f('ix_plan_jobs_status'))
+        batch_op.drop_index(batch_op.f('ix_plan_jobs_persona_id'))
+
+    op.drop_table('plan_jobs')
@@ -0,0 +1,90 @@
+"""normalized plan actions
+
+Revision ID: f19b6d7e4a20
+Revises: e5a0c8d13b62
+Create Date: 2026-10-19 12:41:09.228174
+
+"""
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19b6d7e4a20'
+down_revision: Union[str, None] = 'e5a0c8d13b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_SECTIONS = (
+    ("searches", "search"),
+    ("page_visits", "page_visit"),
+    ("product_browsing", "product_browse"),
+)
+
+
+def upgrade() -> None:
+    plan_actions = op.create_table('plan_actions',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('plan_id', sa.String(length=36), nullable=False),
+    sa.Column('persona_id', sa.String(length=36), nullable=False),
+    sa.Column('action_type', sa.String(length=32), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('due_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['persona_id'], ['personas.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['plan_id'], ['browsing_plans.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('plan_actions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_plan_actions_plan_id'), ['plan_id'], unique=False)
+        batch_op.create_index('ix_plan_actions_persona_status_due', ['persona_id', 'status', 'due_at'], unique=False)
+
+    # Expand plans that are still pending so the extension can pick them up
+    conn = op.get_bind()
+    now = datetime.now(timezone.utc)
+    browsing_plans = sa.table(
+        'browsing_plans',
+        sa.column('id'), sa.column('persona_id'), sa.column('plan_data'),
+        sa.column('scheduled_for'), sa.column('executed', sa.Boolean()),
+    )
+    plans = conn.execute(
+        sa.select(
+            browsing_plans.c.id, browsing_plans.c.persona_id,
+            browsing_plans.c.plan_data, browsing_plans.c.scheduled_for,
+        ).where(browsing_plans.c.executed == sa.false())
+    ).all()
+    rows = []
+    for plan_id, persona_id, plan_data, scheduled_for in plans:
+        start = scheduled_for if isinstance(scheduled_for, datetime) else datetime.fromisoformat(str(scheduled_for))
+        data = plan_data if isinstance(plan_data, dict) else json.loads(plan_data)
+        for key, action_type in _SECTIONS:
+            for action in data.get(key, []):
+                offset = action.pop("time_offset_min", 0)
+                rows.append({
+                    "id": str(uuid.uuid4()),
+                    "plan_id": plan_id,
+                    "persona_id": persona_id,
+                    "action_type": action_type,
+                    "payload": json.dumps(action),
+                    "due_at": start + timedelta(minutes=offset),
+                    "status": "pending",
+                    "created_at": now,
+                })
+    if rows:
+        op.bulk_insert(plan_actions, rows)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('plan_actions', schema=None) as batch_op:
+        batch_op.drop_index('ix_plan_actions_persona_status_due')
+        batch_op.drop_index(batch_op.f('ix_plan_actions_plan_id'))
+
+    op.drop_table('plan_actions')
@@ -0,0 +1,62 @@
+"""native JSON columns and persona attribute indexes
+
+Revision ID: f4c81b26d9a7
+Revises: e3b7a92d5c18
+Create Date: 2026-10-19 18:20:09.771450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c81b26d9a7'
+down_revision: Union[str, None] = 'e3b7a92d5c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JSON_COLUMNS = (
+    ('personas', 'wizard_answers'),
+    ('personas', 'profile'),
+    ('browsing_plans', 'plan_data'),
+    ('noise_events', 'payload'),
+)
+
+
+def _json_type():
+    return sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+
+def upgrade() -> None:
+    # Existing values are already JSON text: SQLite keeps them as-is and
+    # PostgreSQL casts them in place.
+    for table, column in JSON_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                column,
+                existing_type=sa.Text(),
+                type_=_json_type(),
+                postgresql_using=f'{column}::jsonb',
+            )
+
+    with op.batch_alter_table('personas', schema=None) as batch_op:
+        batch_op.create_index('ix_personas_user_intensity', ['user_id', 'noise_intensity'], unique=False)
+        batch_op.create_index('ix_personas_location', ['location'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('personas', schema=None) as batch_op:
+        batch_op.drop_index('ix_personas_location')
+        batch_op.drop_index('ix_personas_user_intensity')
+
+    for table, column in JSON_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                column,
+                existing_type=_json_type(),
+                type_=sa.Text(),
+                postgresql_using=f'{column}::text',
+            )
@@ -1,12 +1,123 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import JSON, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from app.config import get_settings
+from app.config import DatabaseSettings, Settings, get_settings
 
 _settings = get_settings()
 
-engine = create_async_engine(_settings.database_url, echo=False)
+
+def _sqlite_file(url: URL) -> bool:
+    """True for an on-disk SQLite database (not ``:memory:``)."""
+    return (
+        url.get_backend_name() == "sqlite"
+        and url.database not in (None, "", ":memory:")
+        and url.query.get("mode") != "memory"
+    )
+
+
+def split_reads(settings: Settings) -> bool:
+    """True when reads get their own pooled read-only engine (SQLite files)."""
+    return _sqlite_file(make_url(settings.database_url)) and settings.db.sqlite_readers > 0
+
+
+def sqlite_pragmas(cfg: DatabaseSettings, read_only: bool = False) -> list[str]:
+    """PRAGMAs run on every new SQLite connection."""
+    pragmas = [
+        f"PRAGMA busy_timeout={cfg.sqlite_busy_timeout}",
+        f"PRAGMA synchronous={cfg.sqlite_synchronous}",
+        f"PRAGMA mmap_size={cfg.sqlite_mmap_size}",
+        f"PRAGMA cache_size=-{cfg.sqlite_cache_size}",  # negative: KiB rather than pages
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        # Persistent in the file; set by the writer so readers never need the lock
+        pragmas.insert(1, f"PRAGMA journal_mode={cfg.sqlite_journal_mode}")
+    return pragmas
+
+
+def engine_options(settings: Settings, read_only: bool = False) -> dict:
+    """``create_async_engine`` keyword arguments for the configured database."""
+    url = make_url(settings.database_url)
+    cfg = settings.db
+    if _sqlite_file(url):
+        # aiosqlite defaults to opening a connection per checkout; keep them
+        # (and their page caches) pooled instead
+        if read_only:
+            return {
+                "poolclass": AsyncAdaptedQueuePool,
+                "pool_size": cfg.sqlite_readers,
+                "max_overflow": cfg.max_overflow,
+                "pool_timeout": cfg.pool_timeout,
+            }
+        if cfg.sqlite_readers > 0:
+            # SQLite has one writer at a time anyway; queueing for the single
+            # connection in-process beats spinning on SQLITE_BUSY
+            return {
+                "poolclass": AsyncAdaptedQueuePool,
+                "pool_size": 1,
+                "max_overflow": 0,
+                "pool_timeout": cfg.pool_timeout,
+            }
+        return {}
+    if url.get_backend_name() != "postgresql":
+        return {}
+    options = {
+        "pool_size": cfg.pool_size,
+        "max_overflow": cfg.max_overflow,
+        "pool_timeout": cfg.pool_timeout,
+        "pool_recycle": cfg.pool_recycle,
+        "pool_pre_ping": cfg.pool_pre_ping,
+    }
+    if url.get_driver_name() == "asyncpg":
+        # asyncpg prepares every statement; keep them cached per connection
+        options["connect_args"] = {"prepared_statement_cache_size": cfg.statement_cache_size}
+    return options
+
+
+def make_engine(settings: Settings, read_only: bool = False) -> AsyncEngine:
+    engine = create_async_engine(settings.database_url, echo=False, **engine_options(settings, read_only))
+    if _sqlite_file(make_url(settings.database_url)):
+        pragmas = sqlite_pragmas(settings.db, read_only)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return engine
+
+
+engine = make_engine(_settings)
+read_engine = make_engine(_settings, read_only=True) if split_reads(_settings) else engine
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+read_session = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def is_postgres(db: AsyncSession) -> bool:
+    """True when ``db`` talks to PostgreSQL (SKIP LOCKED, RETURNING fast paths)."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+async def release_connection(db: AsyncSession) -> None:
+    """Hand ``db``'s connection back to the pool if it has only been reading.
+
+    A session keeps its connection from its first query until it commits,
+    and on SQLite every writer shares one connection — call this before slow
+    work such as an LLM call so other writers don't queue behind it.
+    """
+    if db.in_transaction() and not (db.new or db.dirty or db.deleted):
+        await db.commit()
+
+
+# JSON documents: SQLite JSON1 text, JSONB on PostgreSQL
+JSONType = JSON().with_variant(JSONB(), "postgresql")
 
 
 class Base(DeclarativeBase):
@@ -18,6 +129,28 @@ async def get_db():
         yield session
 
 
+async def get_read_db():
+    """Session for endpoints that only read (read-only connections on SQLite)."""
+    async with read_session() as session:
+        yield session
+
+
+def get_sessionmaker() -> async_sessionmaker:
+    """Session factory for work that outlives the request (background jobs)."""
+    return async_session
+
+
+def get_read_sessionmaker() -> async_sessionmaker:
+    """Read-only session factory for work that outlives the request (polling streams)."""
+    return read_session
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
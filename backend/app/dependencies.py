@@ -7,33 +7,56 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_read_db
 from app.models.user import User
-from app.services.auth import decode_access_token
+from app.services.auth import decode_access_token_claims
+from app.services.principal_cache import principal_cache
 
 _bearer = HTTPBearer(auto_error=False)
 
 
-async def get_current_user(
+async def get_optional_user(
     request: Request,
     credentials: HTTPAuthorizationCredentials | None = Depends(_bearer),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    """Authenticate via JWT Bearer token or X-API-Key header."""
+    db: AsyncSession = Depends(get_read_db),
+) -> User | None:
+    """Authenticate via JWT Bearer token or X-API-Key header; None if neither is valid.
+
+    Validated principals are cached briefly (see ``principal_cache``), so
+    repeat requests with the same token or key skip the database.
+    """
     # Try JWT first
     if credentials:
-        user_id = decode_access_token(credentials.credentials)
-        if user_id:
-            user = await db.get(User, user_id)
+        token = credentials.credentials
+        cache_key = f"jwt:{token}"
+        user = principal_cache.get(cache_key)
+        if user is not None:
+            return user
+        claims = decode_access_token_claims(token)
+        if claims and claims.get("sub"):
+            user = await db.get(User, claims["sub"])
             if user and user.is_active:
+                principal_cache.put(cache_key, user, expires_at=claims.get("exp"))
                 return user
 
     # Fall back to API key (for extension)
     api_key = request.headers.get("X-API-Key")
     if api_key:
+        cache_key = f"key:{api_key}"
+        user = principal_cache.get(cache_key)
+        if user is not None:
+            return user
         result = await db.execute(select(User).where(User.api_key == api_key))
         user = result.scalar_one_or_none()
         if user and user.is_active:
+            principal_cache.put(cache_key, user)
             return user
 
-    raise HTTPException(status_code=401, detail="Not authenticated")
+    return None
+
+
+async def get_current_user(user: User | None = Depends(get_optional_user)) -> User:
+    """Authenticate via JWT Bearer token or X-API-Key header, or 401."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user
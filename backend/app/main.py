@@ -7,10 +7,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-from app.db import init_db
+from app.db import async_session, dispose_engines, init_db
 from app.middleware import ExceptionMiddleware, RequestIDMiddleware
-from app.routers import auth, noise, personas, plans
+from app.routers import analytics, auth, metrics, noise, personas, plans
+from app.services import passwords
+from app.services.diversity import diversity_index
+from app.services.jobs import job_runner
+from app.services.loop_monitor import LoopMonitor
 from app.services.scheduler import PhantomScheduler
+from app.services.usage import usage_meter
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,11 +27,31 @@ logging.basicConfig(
 async def lifespan(app: FastAPI):
     await init_db()
     settings = get_settings()
+    if settings.diversity.enabled:
+        await diversity_index.start(async_session, settings.diversity.sync_interval)
+    await usage_meter.start(async_session, settings.usage.flush_interval)
+    monitor = None
+    if settings.monitor.enabled:
+        monitor = LoopMonitor(
+            probe_interval=settings.monitor.probe_interval_ms / 1000,
+            slow_threshold=settings.monitor.slow_callback_ms / 1000,
+            asyncio_debug=settings.monitor.asyncio_debug,
+        )
+        await monitor.start()
+    app.state.loop_monitor = monitor
     scheduler = PhantomScheduler(settings)
     app.state.scheduler = scheduler
     await scheduler.start()
+    await job_runner.resume(async_session)
     yield
+    await job_runner.shutdown()
     await scheduler.stop()
+    await usage_meter.stop(async_session)
+    await diversity_index.stop()
+    passwords.shutdown()
+    if monitor:
+        await monitor.stop()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -54,6 +79,8 @@ app.include_router(auth.router)
 app.include_router(personas.router)
 app.include_router(plans.router)
 app.include_router(noise.router)
+app.include_router(metrics.router)
+app.include_router(analytics.router)
 
 
 @app.get("/api/health")
@@ -0,0 +1,43 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, Index, String, Text, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+_OPEN = text("status IN ('queued', 'running')")
+
+
+class PlanJob(Base):
+    __tablename__ = "plan_jobs"
+    __table_args__ = (
+        # At most one queued or running job per persona, so concurrent
+        # generate requests can't both start one
+        Index(
+            "uq_plan_jobs_open_persona", "persona_id",
+            unique=True, sqlite_where=_OPEN, postgresql_where=_OPEN,
+        ),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    user_id: Mapped[str] = mapped_column(String(64), index=True)
+    persona_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("personas.id", ondelete="CASCADE"), index=True
+    )
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True)  # queued | running | succeeded | failed
+    plan_id: Mapped[str | None] = mapped_column(String(36), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow, onupdate=_utcnow
+    )
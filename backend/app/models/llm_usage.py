@@ -0,0 +1,29 @@
+from datetime import date
+
+from sqlalchemy import BigInteger, Date, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class LLMUsageRollup(Base):
+    """Per-day LLM usage counters by user, persona and task.
+
+    ``user_id`` / ``persona_id`` are ``""`` for work not attributed to one
+    (e.g. the shared persona warm pool).  No foreign keys: usage history
+    outlives deleted personas.
+    """
+
+    __tablename__ = "llm_usage_rollups"
+    __table_args__ = (
+        Index("ix_llm_usage_rollups_day_user", "day", "user_id"),
+    )
+
+    user_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    persona_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    task: Mapped[str] = mapped_column(String(32), primary_key=True)
+    calls: Mapped[int] = mapped_column(Integer, default=0)
+    prompt_tokens: Mapped[int] = mapped_column(BigInteger, default=0)
+    completion_tokens: Mapped[int] = mapped_column(BigInteger, default=0)
+    wall_ms: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -1,10 +1,10 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, String, Text
+from sqlalchemy import Boolean, DateTime, ForeignKey, String
 from sqlalchemy.orm import Mapped, mapped_column
 
-from app.db import Base
+from app.db import Base, JSONType
 
 
 def _utcnow() -> datetime:
@@ -21,7 +21,7 @@ class NoiseEvent(Base):
         String(36), ForeignKey("personas.id", ondelete="CASCADE"), nullable=True, index=True
     )
     event_type: Mapped[str] = mapped_column(String(32), index=True)  # search | browse | shop | persona_rotate
-    payload: Mapped[str] = mapped_column(Text)  # JSON string
+    payload: Mapped[dict] = mapped_column(JSONType)
     delivered: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=_utcnow
@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base, JSONType
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class NoiseFilterState(Base):
+    """A persona's persisted noise dedupe filter (Bloom bits + MinHash signatures)."""
+
+    __tablename__ = "noise_filters"
+
+    persona_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("personas.id", ondelete="CASCADE"), primary_key=True
+    )
+    state: Mapped[dict] = mapped_column(JSONType)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow, onupdate=_utcnow
+    )
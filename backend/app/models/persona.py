@@ -1,30 +1,67 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, String, Text
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Boolean, DateTime, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column, validates
 
-from app.db import Base
+from app.db import Base, JSONType
 
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def summarize_profile(profile: dict, fallback_name: str | None = None) -> str:
+    """One-line description of a persona for the noise prompts."""
+    return (
+        f"{profile.get('name', fallback_name)}, "
+        f"age {profile.get('age', '?')}, "
+        f"{profile.get('profession', '?')} from {profile.get('location', '?')}. "
+        f"Interests: {', '.join(profile.get('interests', [])[:5])}"
+    )
+
+
 class Persona(Base):
     __tablename__ = "personas"
+    __table_args__ = (
+        # Scheduler looks up active personas by timezone to find who is awake
+        Index("ix_personas_active_timezone", "is_active", "timezone"),
+        # Listing / analytics filters on the derived attributes
+        Index("ix_personas_user_intensity", "user_id", "noise_intensity"),
+        Index("ix_personas_location", "location"),
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
     )
     user_id: Mapped[str] = mapped_column(String(64), index=True)
     name: Mapped[str] = mapped_column(String(128))
-    wizard_answers: Mapped[str] = mapped_column(Text)  # JSON string
-    profile: Mapped[str] = mapped_column(Text, default="{}")  # JSON string
+    wizard_answers: Mapped[dict] = mapped_column(JSONType)
+    profile: Mapped[dict] = mapped_column(JSONType, default=dict)
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Local activity window, derived from profile location at creation
+    timezone: Mapped[str] = mapped_column(String(64), default="UTC")
+    active_hours_start: Mapped[int] = mapped_column(Integer, default=8)
+    active_hours_end: Mapped[int] = mapped_column(Integer, default=22)
+    # Copied out of profile / wizard_answers whenever those are written, so
+    # they can be indexed and filtered on portably
+    summary: Mapped[str] = mapped_column(Text, default="")
+    location: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    noise_intensity: Mapped[str] = mapped_column(String(16), default="moderate")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=_utcnow
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=_utcnow, onupdate=_utcnow
     )
+
+    @validates("profile")
+    def _derive_from_profile(self, _key: str, value: dict) -> dict:
+        self.summary = summarize_profile(value or {}, self.name)
+        self.location = (value or {}).get("location")
+        return value
+
+    @validates("wizard_answers")
+    def _derive_from_answers(self, _key: str, value: dict) -> dict:
+        self.noise_intensity = (value or {}).get("noise_intensity", "moderate")
+        return value
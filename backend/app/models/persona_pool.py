@@ -0,0 +1,31 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+# Longest pool bucket key; wizard answers that don't fit skip the pool
+BUCKET_LENGTH = 255
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class PersonaPoolEntry(Base):
+    """A pre-generated profile waiting to be claimed by a matching wizard submission."""
+
+    __tablename__ = "persona_pool"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    bucket: Mapped[str] = mapped_column(
+        String(BUCKET_LENGTH), index=True
+    )  # age|style|location|profession|interest cluster
+    profile: Mapped[str] = mapped_column(Text)  # JSON string
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow
+    )
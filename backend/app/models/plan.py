@@ -1,10 +1,10 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, String, Text
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, String
 from sqlalchemy.orm import Mapped, mapped_column
 
-from app.db import Base
+from app.db import Base, JSONType
 
 
 def _utcnow() -> datetime:
@@ -13,6 +13,12 @@ def _utcnow() -> datetime:
 
 class BrowsingPlan(Base):
     __tablename__ = "browsing_plans"
+    __table_args__ = (
+        # /api/plans/next: pending plans of a persona in schedule order
+        Index("ix_browsing_plans_persona_pending", "persona_id", "executed", "scheduled_for"),
+        # Activity feed: a persona's plans newest first
+        Index("ix_browsing_plans_persona_created", "persona_id", "created_at"),
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
@@ -20,8 +26,9 @@ class BrowsingPlan(Base):
     persona_id: Mapped[str] = mapped_column(
         String(36), ForeignKey("personas.id", ondelete="CASCADE"), index=True
     )
-    plan_data: Mapped[str] = mapped_column(Text)  # JSON string
+    plan_data: Mapped[dict] = mapped_column(JSONType)
     scheduled_for: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    source: Mapped[str] = mapped_column(String(16), default="llm")  # llm | derived
     executed: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=_utcnow
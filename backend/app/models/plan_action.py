@@ -0,0 +1,40 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, Index, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class PlanAction(Base):
+    """One executable step of a BrowsingPlan, delivered and acked individually."""
+
+    __tablename__ = "plan_actions"
+    __table_args__ = (
+        # Extension polls: pending actions of a persona due before a cutoff
+        Index("ix_plan_actions_persona_status_due", "persona_id", "status", "due_at"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    plan_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("browsing_plans.id", ondelete="CASCADE"), index=True
+    )
+    persona_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("personas.id", ondelete="CASCADE")
+    )
+    action_type: Mapped[str] = mapped_column(String(32))  # search | page_visit | product_browse
+    payload: Mapped[str] = mapped_column(Text)  # JSON string
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending | delivered | completed | failed
+    delivered_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow
+    )
@@ -0,0 +1,25 @@
+from datetime import date
+
+from sqlalchemy import Date, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class ActivityRollup(Base):
+    """Per-day, per-persona, per-action-type counters, maintained incrementally."""
+
+    __tablename__ = "activity_rollups"
+    __table_args__ = (
+        Index("ix_activity_rollups_user_day", "user_id", "day"),
+    )
+
+    persona_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("personas.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    action_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(64))
+    planned: Mapped[int] = mapped_column(Integer, default=0)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class SchedulerState(Base):
+    __tablename__ = "scheduler_state"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True, default="default")
+    state: Mapped[str] = mapped_column(Text, default="{}")  # JSON string
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow, onupdate=_utcnow
+    )
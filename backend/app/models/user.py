@@ -2,7 +2,7 @@ import secrets
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, String
+from sqlalchemy import Boolean, DateTime, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -24,6 +24,11 @@ class User(Base):
         String(64), unique=True, index=True, default=lambda: secrets.token_urlsafe(32)
     )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Bumped whenever the set of plans /api/plans/next would return changes
+    plan_version: Mapped[int] = mapped_column(Integer, default=0)
+    plans_changed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=_utcnow
     )
@@ -0,0 +1,135 @@
+"""Activity and LLM usage analytics — served from incrementally maintained rollup tables."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db import get_read_db
+from app.dependencies import get_current_user
+from app.models.llm_usage import LLMUsageRollup
+from app.models.persona import Persona
+from app.models.rollup import ActivityRollup
+from app.models.user import User
+from app.schemas.analytics import (
+    ActivityCounts,
+    AnalyticsOut,
+    DayCounts,
+    PersonaCounts,
+    TypeCounts,
+    UsageCounts,
+    UsageDay,
+    UsageOut,
+    UsagePersona,
+    UsageTask,
+)
+from app.services.usage import usage_meter
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+_SUMS = (
+    func.sum(ActivityRollup.planned).label("planned"),
+    func.sum(ActivityRollup.completed).label("completed"),
+    func.sum(ActivityRollup.failed).label("failed"),
+)
+
+
+@router.get("", response_model=AnalyticsOut)
+async def get_analytics(
+    days: int = Query(30, ge=1, le=366),
+    persona_id: str | None = None,
+    noise_intensity: str | None = None,
+    location: str | None = None,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Planned / completed / failed action counts by day, persona and type.
+
+    ``noise_intensity`` and ``location`` (substring) narrow the counts to
+    matching personas.
+    """
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    filters = [ActivityRollup.user_id == user.id, ActivityRollup.day >= since]
+    if persona_id:
+        filters.append(ActivityRollup.persona_id == persona_id)
+    if noise_intensity or location:
+        personas = select(Persona.id).where(Persona.user_id == user.id)
+        if noise_intensity:
+            personas = personas.where(Persona.noise_intensity == noise_intensity)
+        if location:
+            personas = personas.where(Persona.location.icontains(location, autoescape=True))
+        filters.append(ActivityRollup.persona_id.in_(personas))
+
+    async def grouped(column):
+        result = await db.execute(
+            select(column, *_SUMS).where(*filters).group_by(column).order_by(column)
+        )
+        return result.all()
+
+    by_day = [DayCounts(day=r.day, planned=r.planned, completed=r.completed, failed=r.failed)
+              for r in await grouped(ActivityRollup.day)]
+    by_persona = [PersonaCounts(persona_id=r.persona_id, planned=r.planned, completed=r.completed, failed=r.failed)
+                  for r in await grouped(ActivityRollup.persona_id)]
+    by_type = [TypeCounts(action_type=r.action_type, planned=r.planned, completed=r.completed, failed=r.failed)
+               for r in await grouped(ActivityRollup.action_type)]
+    totals = ActivityCounts(
+        planned=sum(d.planned for d in by_day),
+        completed=sum(d.completed for d in by_day),
+        failed=sum(d.failed for d in by_day),
+    )
+    return AnalyticsOut(
+        since=since, totals=totals, by_day=by_day, by_persona=by_persona, by_type=by_type
+    )
+
+
+_USAGE_SUMS = (
+    func.sum(LLMUsageRollup.calls).label("calls"),
+    func.sum(LLMUsageRollup.prompt_tokens).label("prompt_tokens"),
+    func.sum(LLMUsageRollup.completion_tokens).label("completion_tokens"),
+    func.sum(LLMUsageRollup.wall_ms).label("wall_ms"),
+)
+
+
+def _usage(row) -> dict:
+    return {c: int(getattr(row, c) or 0) for c in UsageCounts.model_fields}
+
+
+@router.get("/usage", response_model=UsageOut)
+async def get_usage(
+    days: int = Query(30, ge=1, le=366),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """LLM calls, tokens and wall time triggered by the user, by day, persona and task.
+
+    Rollups are written on the scheduler's checkpoint interval; ``used_today``
+    also counts calls not flushed yet.
+    """
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    filters = [LLMUsageRollup.user_id == user.id, LLMUsageRollup.day >= since]
+
+    async def grouped(column):
+        result = await db.execute(
+            select(column, *_USAGE_SUMS).where(*filters).group_by(column).order_by(column)
+        )
+        return result.all()
+
+    by_day = [UsageDay(day=r.day, **_usage(r)) for r in await grouped(LLMUsageRollup.day)]
+    by_persona = [UsagePersona(persona_id=r.persona_id or None, **_usage(r))
+                  for r in await grouped(LLMUsageRollup.persona_id)]
+    by_task = [UsageTask(task=r.task, **_usage(r)) for r in await grouped(LLMUsageRollup.task)]
+    totals = UsageCounts(**{c: sum(getattr(d, c) for d in by_day) for c in UsageCounts.model_fields})
+    quota = get_settings().usage.daily_token_quota
+    return UsageOut(
+        since=since,
+        totals=totals,
+        by_day=by_day,
+        by_persona=by_persona,
+        by_task=by_task,
+        used_today=usage_meter.used_today(user.id),
+        daily_quota=quota or None,
+    )
@@ -1,16 +1,25 @@
-"""Authentication endpoints — register, login, token refresh, user info."""
+"""Authentication endpoints — register, login, token refresh, user info, API key rotation."""
 
 from __future__ import annotations
 
+import secrets
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_db, release_connection
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.schemas.auth import TokenResponse, UserLogin, UserOut, UserRegister
-from app.services.auth import create_access_token, hash_password, verify_password
+from app.services.auth import create_access_token
+from app.services.passwords import (
+    hash_password_async,
+    needs_rehash,
+    verify_dummy_async,
+    verify_password_async,
+)
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -21,12 +30,18 @@ async def register(body: UserRegister, db: AsyncSession = Depends(get_db)):
     if existing.scalar_one_or_none():
         raise HTTPException(409, "Email already registered")
 
+    # The KDF is slow; don't hold the (single, on SQLite) writer connection through it
+    await release_connection(db)
     user = User(
         email=body.email,
-        hashed_password=hash_password(body.password),
+        hashed_password=await hash_password_async(body.password),
     )
     db.add(user)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(409, "Email already registered")
     await db.refresh(user)
     return UserOut.model_validate(user)
 
@@ -35,8 +50,17 @@ async def register(body: UserRegister, db: AsyncSession = Depends(get_db)):
 async def login(body: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == body.email))
     user = result.scalar_one_or_none()
-    if not user or not verify_password(body.password, user.hashed_password):
+    await release_connection(db)  # see register
+    if user is None:
+        # Same KDF work as a wrong password, so timing doesn't reveal which emails exist
+        await verify_dummy_async(body.password)
         raise HTTPException(401, "Invalid email or password")
+    if not await verify_password_async(body.password, user.hashed_password):
+        raise HTTPException(401, "Invalid email or password")
+    if needs_rehash(user.hashed_password):
+        # Old format or cost: upgrade now that we have the plain password
+        user.hashed_password = await hash_password_async(body.password)
+        await db.commit()
 
     token = create_access_token(user.id)
     return TokenResponse(access_token=token)
@@ -51,3 +75,18 @@ async def get_me(user: User = Depends(get_current_user)):
 async def refresh_token(user: User = Depends(get_current_user)):
     token = create_access_token(user.id)
     return TokenResponse(access_token=token)
+
+
+@router.post("/api-key", response_model=UserOut)
+async def rotate_api_key(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Replace the user's API key.
+
+    The old key stops working at once on this worker; other workers may
+    still accept it from their principal cache for up to ``auth.cache_ttl``
+    seconds.
+    """
+    user = await db.get(User, user.id)
+    user.api_key = secrets.token_urlsafe(32)
+    await db.commit()
+    await db.refresh(user)
+    return UserOut.model_validate(user)
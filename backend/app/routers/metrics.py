@@ -0,0 +1,15 @@
+"""Runtime metrics — event-loop health."""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, Request
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def get_metrics(request: Request):
+    monitor = getattr(request.app.state, "loop_monitor", None)
+    return {
+        "event_loop": monitor.metrics() if monitor else None,
+    }
@@ -2,17 +2,22 @@
 
 from __future__ import annotations
 
-import json
 import time
+from collections import Counter
 
-from fastapi import APIRouter, HTTPException, Query, Request
-from sqlalchemy import func, select, update
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
-from app.db import async_session
+from app.db import get_db, get_read_db, is_postgres
+from app.dependencies import get_optional_user
 from app.models.noise_event import NoiseEvent
+from app.models.user import User
 from app.schemas.noise import FingerprintResponse, NoiseEventOut, StatusResponse
+from app.services.rate_limit import check_rate_limit
 from app.services.scheduler import generate_form_data
+from app.services.usage import metered
 
 router = APIRouter(prefix="/api", tags=["noise"])
 
@@ -30,61 +35,93 @@ _PLATFORMS = ["Win32", "MacIntel", "Linux x86_64"]
 
 
 @router.get("/status", response_model=StatusResponse)
-async def get_status(request: Request):
+async def get_status(request: Request, db: AsyncSession = Depends(get_read_db)):
     scheduler = getattr(request.app.state, "scheduler", None)
-    queue_depth = await scheduler.get_queue_depth() if scheduler else 0
+    queue_depth = await scheduler.get_queue_depth(db) if scheduler else 0
     return StatusResponse(
         running=scheduler.running if scheduler else False,
         current_persona=scheduler.current_persona if scheduler else None,
         stats=scheduler.stats if scheduler else {},
         queue_depth=queue_depth,
+        adaptive=scheduler.adaptive_state() if scheduler else {},
     )
 
 
-@router.get("/noise/{event_type}", response_model=list[NoiseEventOut])
-async def get_noise_by_type(event_type: str, limit: int = Query(10, le=100)):
-    """Fetch pending noise events of a specific type. Marks them as delivered."""
-    async with async_session() as db:
+def _record_claims(request: Request, events: list[NoiseEvent]) -> None:
+    """Feed claimed events into the scheduler's demand tracker."""
+    scheduler = getattr(request.app.state, "scheduler", None)
+    if not scheduler or not events:
+        return
+    for event_type, count in Counter(e.event_type for e in events).items():
+        scheduler.demand.record_claim(event_type, count)
+
+
+async def _claim(db: AsyncSession, filters: list, limit: int) -> list[NoiseEvent]:
+    """Mark up to ``limit`` oldest undelivered events matching ``filters`` delivered and return them.
+
+    On PostgreSQL this is one ``UPDATE ... RETURNING`` over rows picked with
+    ``FOR UPDATE SKIP LOCKED``, so concurrent pollers never block on, or
+    double-claim, the same events.
+    """
+    pending = (
+        select(NoiseEvent)
+        .where(NoiseEvent.delivered == False, *filters)
+        .order_by(NoiseEvent.created_at)
+        .limit(limit)
+    )
+    if is_postgres(db):
         result = await db.execute(
-            select(NoiseEvent)
-            .where(NoiseEvent.event_type == event_type, NoiseEvent.delivered == False)
-            .order_by(NoiseEvent.created_at)
-            .limit(limit)
+            update(NoiseEvent)
+            .where(NoiseEvent.id.in_(
+                pending.with_only_columns(NoiseEvent.id).with_for_update(skip_locked=True).scalar_subquery()
+            ))
+            .values(delivered=True)
+            .returning(NoiseEvent)
+            .execution_options(synchronize_session=False)
+        )
+        events = sorted(result.scalars().all(), key=lambda e: e.created_at)
+        await db.commit()
+        return events
+    result = await db.execute(pending)
+    events = list(result.scalars().all())
+    if events:
+        ids = [e.id for e in events]
+        await db.execute(
+            update(NoiseEvent).where(NoiseEvent.id.in_(ids)).values(delivered=True)
         )
-        events = result.scalars().all()
-        if events:
-            ids = [e.id for e in events]
-            await db.execute(
-                update(NoiseEvent).where(NoiseEvent.id.in_(ids)).values(delivered=True)
-            )
-            await db.commit()
-        return [
-            NoiseEventOut(event_type=e.event_type, payload=json.loads(e.payload))
-            for e in events
-        ]
+        await db.commit()
+    return events
+
+
+@router.get("/noise/{event_type}", response_model=list[NoiseEventOut])
+async def get_noise_by_type(
+    event_type: str,
+    request: Request,
+    limit: int = Query(10, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """Fetch pending noise events of a specific type. Marks them as delivered."""
+    events = await _claim(db, [NoiseEvent.event_type == event_type], limit)
+    _record_claims(request, events)
+    return [
+        NoiseEventOut(event_type=e.event_type, payload=e.payload)
+        for e in events
+    ]
 
 
 @router.get("/noise", response_model=list[NoiseEventOut])
-async def get_all_noise(limit: int = Query(20, le=100)):
+async def get_all_noise(
+    request: Request,
+    limit: int = Query(20, le=100),
+    db: AsyncSession = Depends(get_db),
+):
     """Fetch all pending noise events. Marks them as delivered."""
-    async with async_session() as db:
-        result = await db.execute(
-            select(NoiseEvent)
-            .where(NoiseEvent.delivered == False)
-            .order_by(NoiseEvent.created_at)
-            .limit(limit)
-        )
-        events = result.scalars().all()
-        if events:
-            ids = [e.id for e in events]
-            await db.execute(
-                update(NoiseEvent).where(NoiseEvent.id.in_(ids)).values(delivered=True)
-            )
-            await db.commit()
-        return [
-            NoiseEventOut(event_type=e.event_type, payload=json.loads(e.payload))
-            for e in events
-        ]
+    events = await _claim(db, [], limit)
+    _record_claims(request, events)
+    return [
+        NoiseEventOut(event_type=e.event_type, payload=e.payload)
+        for e in events
+    ]
 
 
 @router.get("/fingerprint", response_model=FingerprintResponse)
@@ -123,9 +160,15 @@ async def rotate_persona(request: Request):
 
 
 @router.get("/form-data")
-async def get_form_data(request: Request):
-    """Generate fake form data matching the current persona."""
+async def get_form_data(request: Request, user: User | None = Depends(get_optional_user)):
+    """Generate fake form data matching the current persona.
+
+    Rate limited per user, or per client address for anonymous callers.
+    """
     scheduler = request.app.state.scheduler
     if not scheduler or not scheduler.current_persona:
         raise HTTPException(400, "No active persona — cannot generate form data")
-    return await generate_form_data(scheduler.current_persona)
+    principal = user.id if user else f"ip:{request.client.host if request.client else 'unknown'}"
+    await check_rate_limit(principal, "form_data")
+    with metered("form_data", user.id if user else None):
+        return await generate_form_data(scheduler.current_persona)
@@ -2,30 +2,57 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.db import get_db
+from app.config import get_settings
+from app.db import get_db, get_read_db, get_sessionmaker, release_connection
 from app.dependencies import get_current_user
 from app.models.persona import Persona
 from app.models.user import User
-from app.schemas.persona import PersonaCreate, PersonaOut, PersonaUpdate
-from app.services.persona_gen import generate_persona
+from app.schemas.persona import (
+    PersonaBulkCreate,
+    PersonaCreate,
+    PersonaOut,
+    PersonaProfile,
+    PersonaUpdate,
+    WizardAnswers,
+)
+from app.services import idempotency, persona_pool
+from app.services.diversity import diversity_index
+from app.services.persona_cache import DEFER_JSON, profile_cache
+from app.services.persona_gen import DISTINCT_NOTE, generate_persona, variation_note
+from app.services.plan_versions import bump_plan_version
+from app.services.prefetch import prefetch_on_activation
+from app.services.rate_limit import check_rate_limit
+from app.services.timezones import timezone_for_location
+from app.services.usage import metered
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/personas", tags=["personas"])
 
 
-def _persona_to_out(p: Persona) -> PersonaOut:
+def _persona_to_out(p: Persona, decoded: tuple[dict, dict] | None = None) -> PersonaOut:
+    """``decoded`` is ``(profile, wizard_answers)`` from ``profile_cache`` (``DEFER_JSON`` loads)."""
+    profile, answers = decoded or (p.profile, p.wizard_answers)
     return PersonaOut(
         id=p.id,
         user_id=p.user_id,
         name=p.name,
-        wizard_answers=json.loads(p.wizard_answers),
-        profile=json.loads(p.profile),
+        wizard_answers=answers,
+        profile=profile,
         is_active=p.is_active,
+        timezone=p.timezone,
+        active_hours_start=p.active_hours_start,
+        active_hours_end=p.active_hours_end,
         created_at=p.created_at,
         updated_at=p.updated_at,
     )
@@ -36,44 +63,211 @@ async def create_persona(
     body: PersonaCreate,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
 ):
-    """Create a new persona from wizard answers.  Calls LLM to generate profile."""
-    profile = await generate_persona(body.wizard_answers)
+    """Create a new persona from wizard answers.
+
+    Uses a matching pre-generated profile from the warm pool when there is
+    one, otherwise calls the LLM to generate the profile.
+
+    With an ``Idempotency-Key`` header, retries of the same request return the
+    persona created by the first one instead of generating another.
+    Replays don't count against the rate limit.
+    """
+    if idempotency_key is None:
+        await check_rate_limit(user.id, "personas")
+        with metered("persona", user.id):
+            return await _create_persona(body, user, db)
+    scope = "POST /api/personas"
+    fingerprint = idempotency.request_hash(body.model_dump_json())
+    done = await idempotency.reserve(db, user.id, scope, idempotency_key, fingerprint)
+    if done is not None:
+        return idempotency.replay(done)
+    try:
+        await check_rate_limit(user.id, "personas")
+    except HTTPException:
+        await idempotency.release(db, user.id, scope, idempotency_key)
+        raise
+    try:
+        with metered("persona", user.id):
+            out = await _create_persona(body, user, db)
+    except Exception:
+        await idempotency.release(db, user.id, scope, idempotency_key)
+        raise
+    await idempotency.complete(db, user.id, scope, idempotency_key, 201, out.model_dump(mode="json"))
+    return out
+
 
-    persona = Persona(
-        user_id=user.id,
+def _new_persona(user_id: str, answers: WizardAnswers, profile: PersonaProfile) -> Persona:
+    hours = get_settings().scheduler
+    return Persona(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
         name=profile.name,
-        wizard_answers=body.wizard_answers.model_dump_json(),
-        profile=profile.model_dump_json(),
+        wizard_answers=answers.model_dump(),
+        profile=profile.model_dump(),
         is_active=False,
+        timezone=timezone_for_location(profile.location),
+        active_hours_start=hours.active_hours_start,
+        active_hours_end=hours.active_hours_end,
     )
+
+
+def _find_duplicate(user_id: str, profile: PersonaProfile) -> str | None:
+    """Id of the user's persona that ``profile`` nearly duplicates, if any."""
+    cfg = get_settings().diversity
+    if not (cfg.enabled and cfg.reject_duplicates):
+        return None
+    match = diversity_index.find_duplicate(profile.model_dump(), user_id, cfg.duplicate_threshold)
+    return match[0] if match else None
+
+
+def _index_persona(persona: Persona) -> None:
+    if get_settings().diversity.enabled:
+        diversity_index.add(persona.id, persona.user_id, persona.profile)
+
+
+async def _create_persona(body: PersonaCreate, user: User, db: AsyncSession) -> PersonaOut:
+    settings = get_settings()
+    profile = None
+    if settings.pool.enabled:
+        # A pooled near-duplicate of this user's personas stays for someone else
+        profile = await persona_pool.claim(
+            db, body.wizard_answers, accept=lambda p: _find_duplicate(user.id, p) is None
+        )
+    if profile is None:
+        await release_connection(db)
+        profile = await generate_persona(body.wizard_answers)
+    for _ in range(settings.diversity.max_regenerations):
+        if _find_duplicate(user.id, profile) is None:
+            break
+        profile = await generate_persona(body.wizard_answers, DISTINCT_NOTE)
+    duplicate = _find_duplicate(user.id, profile)
+    if duplicate is not None:
+        raise HTTPException(409, f"Generated persona is a near-duplicate of persona {duplicate}")
+
+    persona = _new_persona(user.id, body.wizard_answers, profile)
     db.add(persona)
     await db.commit()
     await db.refresh(persona)
+    _index_persona(persona)
     return _persona_to_out(persona)
 
 
+@router.post("/bulk")
+async def create_personas_bulk(
+    body: PersonaBulkCreate,
+    user: User = Depends(get_current_user),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
+):
+    """Create many personas, streaming NDJSON as each one is generated.
+
+    Profiles are generated concurrently (at most ``llm.max_concurrent`` per
+    request, on top of the global LLM admission limit).  Whatever has finished
+    is inserted in one batch and emitted as ``{"index": i, "persona": {...}}``
+    lines; failures, including near-duplicates of the user's existing (or
+    just created) personas, are ``{"index": i, "error": "..."}``.  A final
+    ``{"done": true, ...}`` line carries the totals.
+    """
+    if body.wizard_answers is not None:
+        jobs = [(answers, "") for answers in body.wizard_answers]
+    else:
+        jobs = [
+            (body.template, variation_note(i, body.count, body.diversity))
+            for i in range(body.count)
+        ]
+    await check_rate_limit(user.id, "persona_bulk", cost=len(jobs))
+    limit = asyncio.Semaphore(max(1, get_settings().llm.max_concurrent))
+
+    async def generate(index: int, answers: WizardAnswers, variation: str):
+        async with limit:
+            try:
+                with metered("persona_bulk", user.id):
+                    return index, answers, await generate_persona(answers, variation)
+            except Exception as exc:
+                logger.warning("Bulk persona %d failed: %s", index, exc)
+                return index, answers, exc
+
+    async def results():
+        tasks = {
+            asyncio.create_task(generate(i, answers, variation))
+            for i, (answers, variation) in enumerate(jobs)
+        }
+        created = failed = 0
+        try:
+            while tasks:
+                finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                batch, lines = [], []
+                for task in finished:
+                    index, answers, profile = task.result()
+                    if isinstance(profile, Exception):
+                        failed += 1
+                        lines.append({"index": index, "error": str(profile)[:500]})
+                    elif (duplicate := _find_duplicate(user.id, profile)) is not None:
+                        failed += 1
+                        lines.append({"index": index, "error": f"Near-duplicate of persona {duplicate}"})
+                    else:
+                        persona = _new_persona(user.id, answers, profile)
+                        _index_persona(persona)  # so later results are checked against it
+                        batch.append((index, persona))
+                if batch:
+                    async with session_factory() as db:
+                        db.add_all([persona for _, persona in batch])
+                        try:
+                            await db.commit()
+                        except Exception:
+                            for _, persona in batch:
+                                diversity_index.remove(persona.id)
+                            raise
+                        for index, persona in batch:
+                            out = _persona_to_out(persona).model_dump(mode="json")
+                            lines.append({"index": index, "persona": out})
+                    created += len(batch)
+                for line in sorted(lines, key=lambda l: l["index"]):
+                    yield json.dumps(line) + "\n"
+            yield json.dumps({"done": True, "created": created, "failed": failed}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.get("", response_model=list[PersonaOut])
 async def list_personas(
+    active: bool | None = None,
+    noise_intensity: str | None = None,
+    location: str | None = None,
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    result = await db.execute(
-        select(Persona).where(Persona.user_id == user.id).order_by(Persona.created_at.desc())
-    )
-    return [_persona_to_out(p) for p in result.scalars().all()]
+    """List the user's personas, optionally filtered (``location`` is a substring)."""
+    query = select(Persona).options(*DEFER_JSON).where(Persona.user_id == user.id)
+    if active is not None:
+        query = query.where(Persona.is_active == active)
+    if noise_intensity:
+        query = query.where(Persona.noise_intensity == noise_intensity)
+    if location:
+        query = query.where(Persona.location.icontains(location, autoescape=True))
+    result = await db.execute(query.order_by(Persona.created_at.desc()))
+    personas = result.scalars().all()
+    decoded = await profile_cache.load(db, personas)
+    return [_persona_to_out(p, decoded[p.id]) for p in personas if p.id in decoded]
 
 
 @router.get("/{persona_id}", response_model=PersonaOut)
 async def get_persona(
     persona_id: str,
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    persona = await db.get(Persona, persona_id)
+    persona = await db.get(Persona, persona_id, options=DEFER_JSON)
     if not persona or persona.user_id != user.id:
         raise HTTPException(404, "Persona not found")
-    return _persona_to_out(persona)
+    decoded = await profile_cache.load(db, [persona])
+    if persona.id not in decoded:
+        raise HTTPException(404, "Persona not found")
+    return _persona_to_out(persona, decoded[persona.id])
 
 
 @router.patch("/{persona_id}", response_model=PersonaOut)
@@ -82,15 +276,22 @@ async def update_persona(
     body: PersonaUpdate,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
 ):
+    """Update a persona.  Activating one queues its first plan and noise in the background."""
     persona = await db.get(Persona, persona_id)
     if not persona or persona.user_id != user.id:
         raise HTTPException(404, "Persona not found")
-    if body.is_active is not None:
+    activated = body.is_active is True and not persona.is_active
+    if body.is_active is not None and body.is_active != persona.is_active:
         persona.is_active = body.is_active
+        await bump_plan_version(db, {user.id})
     if body.name is not None:
         persona.name = body.name
     await db.commit()
+    profile_cache.invalidate(persona.id)
+    if activated and get_settings().plans.prefetch_on_activate:
+        await prefetch_on_activation(db, persona, session_factory)
     await db.refresh(persona)
     return _persona_to_out(persona)
 
@@ -105,4 +306,7 @@ async def delete_persona(
     if not persona or persona.user_id != user.id:
         raise HTTPException(404, "Persona not found")
     await db.delete(persona)
+    await bump_plan_version(db, {user.id})
     await db.commit()
+    profile_cache.invalidate(persona_id)
+    diversity_index.remove(persona_id)
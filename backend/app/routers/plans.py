@@ -2,20 +2,44 @@
 
 from __future__ import annotations
 
+import asyncio
+import base64
 import json
 from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.db import get_db
+from app.db import (
+    get_db,
+    get_read_db,
+    get_read_sessionmaker,
+    get_sessionmaker,
+    is_postgres,
+    release_connection,
+)
 from app.dependencies import get_current_user
+from app.models.job import PlanJob
 from app.models.persona import Persona
 from app.models.plan import BrowsingPlan
+from app.models.plan_action import PlanAction
 from app.models.user import User
-from app.schemas.plan import PlanComplete, PlanOut
-from app.services.plan_gen import generate_plan
+from app.schemas.plan import (
+    ActionAck,
+    ActionAckResult,
+    PlanActionOut,
+    PlanComplete,
+    PlanJobOut,
+    PlanOut,
+)
+from app.services import idempotency
+from app.services.jobs import TERMINAL_STATUSES, create_open_job, find_open_job, job_runner
+from app.services.plan_actions import DELIVERY_LEASE, OPEN_STATUSES, settle_plans
+from app.services.rate_limit import check_rate_limit
+from app.services.rollups import record_outcomes
 
 router = APIRouter(prefix="/api/plans", tags=["plans"])
 
@@ -24,65 +48,319 @@ def _plan_to_out(p: BrowsingPlan) -> PlanOut:
     return PlanOut(
         id=p.id,
         persona_id=p.persona_id,
-        plan_data=json.loads(p.plan_data),
+        plan_data=p.plan_data,
         scheduled_for=p.scheduled_for,
         executed=p.executed,
         created_at=p.created_at,
     )
 
 
-@router.post("/generate/{persona_id}", response_model=PlanOut, status_code=201)
+async def _job_to_out(db: AsyncSession, job: PlanJob) -> PlanJobOut:
+    plan = await db.get(BrowsingPlan, job.plan_id) if job.plan_id else None
+    return PlanJobOut(
+        id=job.id,
+        persona_id=job.persona_id,
+        status=job.status,
+        plan_id=job.plan_id,
+        error=job.error,
+        plan=_plan_to_out(plan) if plan else None,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+async def _get_user_job(db: AsyncSession, job_id: str, user: User) -> PlanJob:
+    job = await db.get(PlanJob, job_id)
+    if not job or job.user_id != user.id:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@router.post("/generate/{persona_id}", response_model=PlanJobOut, status_code=202)
 async def generate_browsing_plan(
     persona_id: str,
+    response: Response,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
+    idempotency_key: str | None = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
 ):
-    """Generate a new browsing plan for a persona.  Calls LLM."""
+    """Queue generation of a new browsing plan for a persona.
+
+    Returns 202 with a job; poll ``GET /api/plans/jobs/{id}`` (or stream
+    ``/events``) until it reaches ``succeeded`` and carries the plan.  While a
+    job for the persona is still queued or running, further requests attach
+    to it instead of starting another; an ``Idempotency-Key`` retry returns
+    the job its first request got, in its current state.  Only requests that
+    start a new job count against the ``plans`` rate limit.
+    """
     persona = await db.get(Persona, persona_id)
     if not persona or persona.user_id != user.id:
         raise HTTPException(404, "Persona not found")
 
-    profile = json.loads(persona.profile)
-    answers = json.loads(persona.wizard_answers)
-    plan_data = await generate_plan(profile, noise_intensity=answers.get("noise_intensity", "moderate"))
+    scope = "POST /api/plans/generate"
+    if idempotency_key is not None:
+        fingerprint = idempotency.request_hash(persona_id)
+        done = await idempotency.reserve(db, user.id, scope, idempotency_key, fingerprint)
+        if done is not None:
+            job = await _get_user_job(db, json.loads(done.response)["id"], user)
+            response.headers["Location"] = f"/api/plans/jobs/{job.id}"
+            response.headers[idempotency.REPLAYED_HEADER] = "true"
+            return await _job_to_out(db, job)
 
-    plan = BrowsingPlan(
-        persona_id=persona_id,
-        plan_data=plan_data.model_dump_json(),
-        scheduled_for=datetime.now(timezone.utc),
-    )
-    db.add(plan)
-    await db.commit()
-    await db.refresh(plan)
-    return _plan_to_out(plan)
+    job = await find_open_job(db, persona_id)
+    if job is None:
+        try:
+            await check_rate_limit(user.id, "plans")
+        except HTTPException:
+            if idempotency_key is not None:
+                await idempotency.release(db, user.id, scope, idempotency_key)
+            raise
+        job, created = await create_open_job(db, user.id, persona_id)
+        if created:
+            job_runner.submit(job.id, session_factory)
+    out = await _job_to_out(db, job)
+    if idempotency_key is not None:
+        await idempotency.complete(db, user.id, scope, idempotency_key, 202, {"id": job.id})
+    response.headers["Location"] = f"/api/plans/jobs/{job.id}"
+    return out
+
+
+@router.get("/jobs/{job_id}", response_model=PlanJobOut)
+async def get_plan_job(
+    job_id: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Poll a plan-generation job.  ``plan`` is set once it has succeeded."""
+    job = await _get_user_job(db, job_id, user)
+    return await _job_to_out(db, job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_plan_job(
+    job_id: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    session_factory: async_sessionmaker = Depends(get_read_sessionmaker),
+):
+    """Server-sent events: one ``status`` event per change, ending at a terminal state."""
+    await _get_user_job(db, job_id, user)
+
+    async def events():
+        last_status = None
+        while True:
+            async with session_factory() as poll_db:
+                job = await poll_db.get(PlanJob, job_id)
+                if job is None:
+                    return
+                if job.status != last_status:
+                    last_status = job.status
+                    out = await _job_to_out(poll_db, job)
+                    yield f"event: status\ndata: {out.model_dump_json()}\n\n"
+                if job.status in TERMINAL_STATUSES:
+                    return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# Plans become visible up to an hour before they're scheduled; the ETag also
+# rolls over every bucket so newly-visible plans appear within this delay.
+NEXT_LOOKAHEAD = timedelta(hours=1)
+NEXT_POLL_BUCKET_SECONDS = 300
+
+
+def _next_validators(plan_version: int, changed_at: datetime | None, now: datetime) -> tuple[str, datetime]:
+    bucket = int(now.timestamp()) // NEXT_POLL_BUCKET_SECONDS
+    bucket_start = datetime.fromtimestamp(bucket * NEXT_POLL_BUCKET_SECONDS, timezone.utc)
+    if changed_at is not None and changed_at.tzinfo is None:
+        changed_at = changed_at.replace(tzinfo=timezone.utc)
+    last_modified = max(changed_at, bucket_start) if changed_at else bucket_start
+    if last_modified.microsecond:
+        # HTTP dates have whole seconds.  Rounding down could give a change the
+        # same date as the previous validator (e.g. the bucket start), and
+        # If-Modified-Since would then hide it
+        last_modified = last_modified.replace(microsecond=0) + timedelta(seconds=1)
+    return f'W/"{plan_version}-{bucket}"', last_modified
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
 
 
 @router.get("/next", response_model=list[PlanOut])
 async def get_next_plans(
+    request: Request,
+    response: Response,
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Extension polls this — returns unexecuted plans for active personas."""
-    persona_result = await db.execute(
-        select(Persona.id).where(Persona.user_id == user.id, Persona.is_active == True)
+    """Extension polls this — returns unexecuted plans for active personas.
+
+    Supports conditional GET: the ETag is derived from the user's plan
+    version, so an unchanged poll is answered with 304 without touching the
+    plans table.  The version is read from the users row rather than the
+    (possibly cached, per-process) principal, so a plan change made by
+    another worker is seen on the next poll.
+    """
+    now = datetime.now(timezone.utc)
+    version = await db.execute(
+        select(User.plan_version, User.plans_changed_at).where(User.id == user.id)
     )
-    active_ids = [row[0] for row in persona_result.all()]
-    if not active_ids:
-        return []
+    plan_version, changed_at = version.one()
+    etag, last_modified = _next_validators(plan_version, changed_at, now)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
 
     result = await db.execute(
         select(BrowsingPlan)
+        .join(Persona, Persona.id == BrowsingPlan.persona_id)
         .where(
-            BrowsingPlan.persona_id.in_(active_ids),
+            Persona.user_id == user.id,
+            Persona.is_active == True,
             BrowsingPlan.executed == False,
-            BrowsingPlan.scheduled_for <= datetime.now(timezone.utc) + timedelta(hours=1),
+            BrowsingPlan.scheduled_for <= now + NEXT_LOOKAHEAD,
         )
         .order_by(BrowsingPlan.scheduled_for)
         .limit(5)
     )
+    response.headers.update(headers)
     return [_plan_to_out(p) for p in result.scalars().all()]
 
 
+@router.get("/actions/due", response_model=list[PlanActionOut])
+async def get_due_actions(
+    window_minutes: int = Query(60, ge=0, le=24 * 60),
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+):
+    """Extension polls this — actions of active personas due within the window.
+
+    Returned actions are marked delivered; ack them via ``POST /actions/ack``.
+    Unacked deliveries become due again after a lease, so a crashed extension
+    doesn't lose work.  Most polls find nothing due; those are answered from
+    a read-only connection without waiting for the writer.
+    """
+    now = datetime.now(timezone.utc)
+    claimable = or_(
+        PlanAction.status == "pending",
+        and_(
+            PlanAction.status == "delivered",
+            PlanAction.delivered_at < now - DELIVERY_LEASE,
+        ),
+    )
+    due = (
+        select(PlanAction)
+        .join(Persona, Persona.id == PlanAction.persona_id)
+        .where(
+            Persona.user_id == user.id,
+            Persona.is_active == True,
+            PlanAction.due_at <= now + timedelta(minutes=window_minutes),
+            claimable,
+        )
+        .order_by(PlanAction.due_at)
+        .limit(limit)
+    )
+    if (await read_db.execute(due.with_only_columns(PlanAction.id).limit(1))).first() is None:
+        return []
+    await release_connection(read_db)
+    if is_postgres(db):
+        # One round trip; SKIP LOCKED keeps concurrent pollers off each other's rows
+        locked = due.with_only_columns(PlanAction.id).with_for_update(skip_locked=True, of=PlanAction)
+        result = await db.execute(
+            update(PlanAction)
+            .where(PlanAction.id.in_(locked.scalar_subquery()))
+            .values(status="delivered", delivered_at=now)
+            .returning(PlanAction)
+            .execution_options(synchronize_session=False)
+        )
+        actions = sorted(result.scalars().all(), key=lambda a: a.due_at)
+        await db.commit()
+    else:
+        actions = (await db.execute(due)).scalars().all()
+        if actions:
+            # Re-check the status in the UPDATE: another poller may have
+            # claimed some of these rows since the SELECT; keep only ours
+            result = await db.execute(
+                update(PlanAction)
+                .where(PlanAction.id.in_([a.id for a in actions]), claimable)
+                .values(status="delivered", delivered_at=now)
+                .returning(PlanAction.id)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = set(result.scalars().all())
+            actions = [a for a in actions if a.id in claimed]
+            await db.commit()
+    return [
+        PlanActionOut(
+            id=a.id,
+            plan_id=a.plan_id,
+            persona_id=a.persona_id,
+            action_type=a.action_type,
+            payload=json.loads(a.payload),
+            due_at=a.due_at,
+            status="delivered",
+        )
+        for a in actions
+    ]
+
+
+async def _finish_actions(db: AsyncSession, user: User, action_ids: list[str], status: str) -> int:
+    """Move the caller's open actions to ``status`` and settle their plans.  Caller commits."""
+    if not action_ids:
+        return 0
+    owned = (
+        select(PlanAction.id, PlanAction.plan_id, PlanAction.persona_id, PlanAction.action_type, PlanAction.due_at)
+        .join(Persona, Persona.id == PlanAction.persona_id)
+        .where(
+            PlanAction.id.in_(action_ids),
+            PlanAction.status.in_(OPEN_STATUSES),
+            Persona.user_id == user.id,
+        )
+    )
+    rows = (await db.execute(owned)).all()
+    if not rows:
+        return 0
+    await db.execute(
+        update(PlanAction)
+        .where(PlanAction.id.in_([r.id for r in rows]))
+        .values(status=status, completed_at=datetime.now(timezone.utc))
+    )
+    await record_outcomes(db, user.id, rows, status)
+    await settle_plans(db, {r.plan_id for r in rows})
+    return len(rows)
+
+
+@router.post("/actions/ack", response_model=ActionAckResult)
+async def ack_actions(
+    body: ActionAck,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Extension reports per-action outcomes.  Plans finish when no action is open."""
+    updated = await _finish_actions(db, user, body.completed, "completed")
+    updated += await _finish_actions(db, user, body.failed, "failed")
+    await db.commit()
+    return ActionAckResult(updated=updated)
+
+
 @router.post("/{plan_id}/complete", response_model=PlanOut)
 async def complete_plan(
     plan_id: str,
@@ -90,24 +368,99 @@ async def complete_plan(
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Extension reports a plan as executed."""
+    """Extension reports progress on a whole plan.
+
+    Completes ``action_ids`` if given, otherwise the first
+    ``actions_completed`` open actions in due order.  The plan is marked
+    executed only once all of its actions are done.
+    """
     plan = await db.get(BrowsingPlan, plan_id)
-    if not plan:
+    persona = await db.get(Persona, plan.persona_id) if plan else None
+    if not plan or not persona or persona.user_id != user.id:
         raise HTTPException(404, "Plan not found")
-    plan.executed = True
+
+    action_ids = body.action_ids
+    if action_ids is None:
+        result = await db.execute(
+            select(PlanAction.id)
+            .where(PlanAction.plan_id == plan_id, PlanAction.status.in_(OPEN_STATUSES))
+            .order_by(PlanAction.due_at)
+            .limit(max(body.actions_completed, 0))
+        )
+        action_ids = list(result.scalars().all())
+    await _finish_actions(db, user, action_ids, "completed")
+    await settle_plans(db, {plan_id})  # plans without action rows finish immediately
     await db.commit()
     await db.refresh(plan)
     return _plan_to_out(plan)
 
 
+def _encode_cursor(created_at: datetime, plan_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{plan_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, plan_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), plan_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
 @router.get("/activity", response_model=list[PlanOut])
 async def get_activity(
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    include_plan_data: bool = False,
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Activity log — recent plans (executed and pending)."""
+    """Activity log — the caller's plans, newest first (executed and pending).
+
+    Keyset-paginated: pass the ``X-Next-Cursor`` response header back as
+    ``cursor`` for the next page.  ``plan_data`` is only loaded and returned
+    when ``include_plan_data`` is set.
+    """
+    columns = [
+        BrowsingPlan.id,
+        BrowsingPlan.persona_id,
+        BrowsingPlan.scheduled_for,
+        BrowsingPlan.executed,
+        BrowsingPlan.created_at,
+    ]
+    if include_plan_data:
+        columns.append(BrowsingPlan.plan_data)
+    query = (
+        select(*columns)
+        .join(Persona, Persona.id == BrowsingPlan.persona_id)
+        .where(Persona.user_id == user.id)
+    )
+    if cursor:
+        created_at, plan_id = _decode_cursor(cursor)
+        query = query.where(
+            or_(
+                BrowsingPlan.created_at < created_at,
+                and_(BrowsingPlan.created_at == created_at, BrowsingPlan.id < plan_id),
+            )
+        )
     result = await db.execute(
-        select(BrowsingPlan).order_by(BrowsingPlan.created_at.desc()).limit(limit)
+        query.order_by(BrowsingPlan.created_at.desc(), BrowsingPlan.id.desc()).limit(limit + 1)
     )
-    return [_plan_to_out(p) for p in result.scalars().all()]
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [
+        PlanOut(
+            id=r.id,
+            persona_id=r.persona_id,
+            plan_data=r.plan_data if include_plan_data else None,
+            scheduled_for=r.scheduled_for,
+            executed=r.executed,
+            created_at=r.created_at,
+        )
+        for r in rows
+    ]
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from datetime import date
+
+from pydantic import BaseModel
+
+
+class ActivityCounts(BaseModel):
+    planned: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+class DayCounts(ActivityCounts):
+    day: date
+
+
+class PersonaCounts(ActivityCounts):
+    persona_id: str
+
+
+class TypeCounts(ActivityCounts):
+    action_type: str
+
+
+class AnalyticsOut(BaseModel):
+    since: date
+    totals: ActivityCounts
+    by_day: list[DayCounts]
+    by_persona: list[PersonaCounts]
+    by_type: list[TypeCounts]
+
+
+class UsageCounts(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    wall_ms: int = 0
+
+
+class UsageDay(UsageCounts):
+    day: date
+
+
+class UsagePersona(UsageCounts):
+    persona_id: str | None  # None: not tied to a persona (e.g. persona creation)
+
+
+class UsageTask(UsageCounts):
+    task: str
+
+
+class UsageOut(BaseModel):
+    since: date
+    totals: UsageCounts
+    by_day: list[UsageDay]
+    by_persona: list[UsagePersona]
+    by_task: list[UsageTask]
+    used_today: int  # tokens, including usage not yet flushed to the rollups
+    daily_quota: int | None  # None: unlimited
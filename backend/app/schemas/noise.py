@@ -15,6 +15,7 @@ class StatusResponse(BaseModel):
     current_persona: str | None
     stats: dict
     queue_depth: int
+    adaptive: dict = {}
 
 
 class FingerprintResponse(BaseModel):
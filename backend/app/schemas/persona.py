@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any
+from typing import Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 
 # --- Wizard input ---
@@ -22,6 +22,26 @@ class PersonaCreate(BaseModel):
     wizard_answers: WizardAnswers
 
 
+MAX_BULK_PERSONAS = 50
+
+
+class PersonaBulkCreate(BaseModel):
+    """Either explicit ``wizard_answers`` per persona, or one ``template`` × ``count``."""
+
+    wizard_answers: list[WizardAnswers] | None = Field(None, max_length=MAX_BULK_PERSONAS)
+    template: WizardAnswers | None = None
+    count: int = Field(1, ge=1, le=MAX_BULK_PERSONAS)
+    diversity: Literal["low", "medium", "high"] = "medium"
+
+    @model_validator(mode="after")
+    def _one_source(self) -> PersonaBulkCreate:
+        if (self.wizard_answers is None) == (self.template is None):
+            raise ValueError("Provide exactly one of wizard_answers or template")
+        if self.wizard_answers is not None and not self.wizard_answers:
+            raise ValueError("wizard_answers must not be empty")
+        return self
+
+
 class PersonaUpdate(BaseModel):
     is_active: bool | None = None
     name: str | None = None
@@ -53,6 +73,9 @@ class PersonaOut(BaseModel):
     wizard_answers: dict[str, Any]
     profile: dict[str, Any]
     is_active: bool
+    timezone: str
+    active_hours_start: int
+    active_hours_end: int
     created_at: datetime
     updated_at: datetime
 
@@ -34,7 +34,7 @@ class BrowsingPlanData(BaseModel):
 class PlanOut(BaseModel):
     id: str
     persona_id: str
-    plan_data: dict[str, Any]
+    plan_data: dict[str, Any] | None = None  # omitted from activity listings unless requested
     scheduled_for: datetime
     executed: bool
     created_at: datetime
@@ -44,3 +44,34 @@ class PlanOut(BaseModel):
 
 class PlanComplete(BaseModel):
     actions_completed: int
+    action_ids: list[str] | None = None  # exact actions; otherwise the first N still open
+
+
+class PlanActionOut(BaseModel):
+    id: str
+    plan_id: str
+    persona_id: str
+    action_type: str  # search | page_visit | product_browse
+    payload: dict[str, Any]
+    due_at: datetime
+    status: str
+
+
+class ActionAck(BaseModel):
+    completed: list[str] = []
+    failed: list[str] = []
+
+
+class ActionAckResult(BaseModel):
+    updated: int
+
+
+class PlanJobOut(BaseModel):
+    id: str
+    persona_id: str
+    status: str  # queued | running | succeeded | failed
+    plan_id: str | None = None
+    error: str | None = None
+    plan: PlanOut | None = None
+    created_at: datetime
+    updated_at: datetime
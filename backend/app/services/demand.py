@@ -0,0 +1,116 @@
+"""Demand tracking — how fast the extension claims each noise event type.
+
+The noise endpoints report every claim here; the scheduler reads the
+smoothed rates back to size its next LLM batch so it generates roughly what
+will actually be consumed instead of a fixed amount per cycle.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+
+# Claims are folded into the average over windows at least this long, so a
+# status poll right after a burst can't turn it into a huge per-minute rate
+MIN_FOLD_SECONDS = 60.0
+
+
+@dataclass
+class CyclePlan:
+    """Batch size and sleep interval chosen for one generation cycle."""
+
+    batch: int
+    interval_minutes: float
+
+
+class DemandTracker:
+    """Time-weighted exponential moving average of claims per minute, per event type.
+
+    The first window of a type starts when the tracker was created, not at
+    its first claim, so an opening burst is spread over the time it actually
+    took to arrive.
+    """
+
+    def __init__(self, halflife_minutes: float = 30.0):
+        self._tau = max(halflife_minutes, 0.1) * 60 / math.log(2)
+        self._rates: dict[str, float] = {}  # events per minute
+        self._pending: dict[str, int] = {}
+        self._last_fold: dict[str, float] = {}
+        self._since = time.time()
+
+    def record_claim(self, event_type: str, count: int) -> None:
+        if count <= 0:
+            return
+        self._last_fold.setdefault(event_type, self._since)
+        self._pending[event_type] = self._pending.get(event_type, 0) + count
+
+    def _fold(self, event_type: str, now: float) -> None:
+        last = self._last_fold.get(event_type)
+        if last is None:
+            return
+        elapsed = now - last
+        if elapsed < MIN_FOLD_SECONDS:
+            return
+        observed = self._pending.pop(event_type, 0) / (elapsed / 60)
+        alpha = 1 - math.exp(-elapsed / self._tau)
+        previous = self._rates.get(event_type)
+        self._rates[event_type] = observed if previous is None else (
+            alpha * observed + (1 - alpha) * previous
+        )
+        self._last_fold[event_type] = now
+
+    def rate(self, event_type: str) -> float | None:
+        """Smoothed claims per minute, or None if nothing has been observed yet."""
+        self._fold(event_type, time.time())
+        return self._rates.get(event_type)
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        for event_type in list(self._last_fold):
+            self._fold(event_type, now)
+        return {
+            "rates": {k: round(v, 4) for k, v in self._rates.items()},
+            "last_fold": dict(self._last_fold),
+        }
+
+    def load(self, data: dict) -> None:
+        self._rates = {k: float(v) for k, v in data.get("rates", {}).items()}
+        self._last_fold = {k: float(v) for k, v in data.get("last_fold", {}).items()}
+
+
+def plan_cycle(
+    rate: float | None,
+    backlog: int,
+    default_batch: int,
+    base_interval: float,
+    min_batch: int,
+    max_batch: int,
+    min_interval: float,
+    max_interval: float,
+) -> CyclePlan:
+    """Size the next cycle so generated supply tracks measured demand.
+
+    The batch aims to cover what will be claimed over one interval, minus the
+    undelivered backlog already waiting.  When that exceeds ``max_batch`` the
+    interval is shortened instead; when demand is too low to justify even
+    ``min_batch`` the interval is stretched, down to one small batch per
+    ``max_interval``.  With no observations yet the static settings apply.
+    """
+    if rate is None:
+        return CyclePlan(batch=default_batch, interval_minutes=base_interval)
+
+    wanted = rate * base_interval - backlog
+    if wanted > max_batch:
+        interval = max(min_interval, max_batch / rate)
+        return CyclePlan(batch=max_batch, interval_minutes=interval)
+    if wanted < min_batch:
+        if rate <= 0:
+            return CyclePlan(batch=min_batch, interval_minutes=max_interval)
+        # Wait long enough for the backlog to drain and min_batch to be wanted
+        interval = (min_batch + backlog) / rate
+        return CyclePlan(
+            batch=min_batch,
+            interval_minutes=min(max_interval, max(base_interval, interval)),
+        )
+    return CyclePlan(batch=round(wanted), interval_minutes=base_interval)
@@ -0,0 +1,269 @@
+"""Persona diversity index — hashed bag-of-words vectors and cosine search.
+
+Each profile becomes an L2-normalised ``float32`` vector: the words of its
+interests, search topics, shopping interests and profession plus the
+domains of its favourite sites are hashed (signed, CRC32 so the mapping is
+stable across processes) into ``diversity.dim`` buckets with sublinear term
+weights.  Vectors live in one contiguous NumPy matrix, so a nearest-neighbour
+query is a single matrix-vector product.  The index also keeps each user's
+persona ids, and per-user queries (the duplicate check on every creation)
+gather and score only that user's rows: well under a millisecond at 100k
+personas, where a full 256-dimension scan reads ~100 MB.
+
+The index is built from the database at startup and kept current by the
+persona endpoints.  Each worker has its own copy, so every
+``diversity.sync_interval`` seconds it also picks up personas that other
+workers created or deleted (set 0 when running a single worker).  Creation
+uses it to turn away near-duplicates of a
+user's existing personas; the scheduler uses it to rotate through awake
+personas that are least like the ones it used recently.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from urllib.parse import urlparse
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.models.persona import Persona
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]{3,}")
+# Relative weight of each profile field in the vector
+FIELD_WEIGHTS = {
+    "interests": 1.0,
+    "search_topics": 0.6,
+    "shopping_interests": 0.8,
+    "favorite_sites": 1.0,
+    "profession": 0.5,
+}
+LOAD_PAGE = 1000
+
+
+def _tokens(profile: dict) -> Counter[str]:
+    counts: Counter[str] = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = profile.get(field) or []
+        items = [value] if isinstance(value, str) else value
+        for item in items:
+            if not isinstance(item, str):
+                continue
+            if field == "favorite_sites":
+                host = urlparse(item if "://" in item else f"https://{item}").netloc
+                words = [host.lower().removeprefix("www.")] if host else []
+            else:
+                words = _WORD.findall(item.lower())
+            for word in words:
+                counts[f"{field[0]}:{word}"] += weight
+    return counts
+
+
+def vectorize(profile: dict, dim: int = 256) -> np.ndarray:
+    """Signed hashed bag-of-words vector for a profile, L2-normalised."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token, weight in _tokens(profile).items():
+        h = zlib.crc32(token.encode())
+        vec[h % dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(weight + 1.0))
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class PersonaIndex:
+    """Dense in-memory matrix of persona vectors with cosine nearest-neighbour search."""
+
+    def __init__(self, dim: int = 256, capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        # Each user's persona ids, so per-user queries score only their rows
+        self._owners: dict[str, str] = {}
+        self._by_owner: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _set_owner(self, persona_id: str, user_id: str) -> None:
+        previous = self._owners.get(persona_id)
+        if previous == user_id:
+            return
+        if previous is not None:
+            self._drop_owner(persona_id)
+        self._owners[persona_id] = user_id
+        self._by_owner.setdefault(user_id, set()).add(persona_id)
+
+    def _drop_owner(self, persona_id: str) -> None:
+        user_id = self._owners.pop(persona_id, None)
+        owned = self._by_owner.get(user_id)
+        if owned is not None:
+            owned.discard(persona_id)
+            if not owned:
+                del self._by_owner[user_id]
+
+    def add(self, persona_id: str, user_id: str, profile: dict) -> None:
+        vec = vectorize(profile, self.dim)
+        with self._lock:
+            row = self._rows.get(persona_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._vectors):
+                    self._vectors = np.resize(self._vectors, (row * 2, self.dim))
+                self._ids.append(persona_id)
+                self._rows[persona_id] = row
+            self._vectors[row] = vec
+            self._set_owner(persona_id, user_id)
+
+    def remove(self, persona_id: str) -> None:
+        """Drop a persona, moving the last row into its slot."""
+        with self._lock:
+            row = self._rows.pop(persona_id, None)
+            if row is None:
+                return
+            self._drop_owner(persona_id)
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._ids.pop()
+
+    def nearest_batch(
+        self, queries: np.ndarray, k: int = 5, user_id: str | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Top-``k`` ``(persona_id, cosine)`` per query row, optionally within one user's personas.
+
+        A per-user query scores only that user's rows rather than masking
+        the full matrix, so duplicate checks stay cheap however many
+        personas other users have.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        with self._lock:
+            if user_id is None:
+                rows = None
+                n = len(self._ids)
+                if n == 0:
+                    return [[] for _ in range(len(queries))]
+                scores = queries @ self._vectors[:n].T
+            else:
+                owned = self._by_owner.get(user_id)
+                if not owned:
+                    return [[] for _ in range(len(queries))]
+                rows = np.fromiter((self._rows[p] for p in owned), dtype=np.intp, count=len(owned))
+                n = len(rows)
+                scores = queries @ self._vectors[rows].T
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for q, candidates in enumerate(top):
+                ordered = candidates[np.argsort(-scores[q, candidates])]
+                picked = ordered if rows is None else rows[ordered]
+                results.append([
+                    (self._ids[i], float(scores[q, j]))
+                    for i, j in zip(picked, ordered)
+                ])
+            return results
+
+    def nearest(self, profile: dict, k: int = 5, user_id: str | None = None) -> list[tuple[str, float]]:
+        return self.nearest_batch(vectorize(profile, self.dim)[None, :], k, user_id)[0]
+
+    def find_duplicate(self, profile: dict, user_id: str, threshold: float) -> tuple[str, float] | None:
+        """The user's most similar persona if it is at least ``threshold`` similar."""
+        best = self.nearest(profile, k=1, user_id=user_id)
+        if best and best[0][1] >= threshold:
+            return best[0]
+        return None
+
+    def most_diverse(self, candidates: list[str], recent: list[str]) -> str | None:
+        """The candidate least similar to any of the ``recent`` personas."""
+        with self._lock:
+            rows = [self._rows[c] for c in candidates if c in self._rows]
+            recent_rows = [self._rows[r] for r in recent if r in self._rows]
+            if not rows:
+                return candidates[0] if candidates else None
+            if not recent_rows:
+                return self._ids[rows[0]]
+            similarity = self._vectors[rows] @ self._vectors[recent_rows].T
+            return self._ids[rows[int(np.argmin(similarity.max(axis=1)))]]
+
+    async def load(self, session_factory: async_sessionmaker[AsyncSession]) -> int:
+        """Add every persona in the database to the index, paging by id."""
+        cursor = ""
+        while True:
+            async with session_factory() as db:
+                result = await db.execute(
+                    select(Persona.id, Persona.user_id, Persona.profile)
+                    .where(Persona.id > cursor)
+                    .order_by(Persona.id)
+                    .limit(LOAD_PAGE)
+                )
+                rows = result.all()
+            if not rows:
+                break
+            for persona_id, user_id, profile in rows:
+                self.add(persona_id, user_id, profile or {})
+            cursor = rows[-1][0]
+        logger.info("Persona diversity index loaded with %d personas", len(self))
+        return len(self)
+
+    async def sync(self, session_factory: async_sessionmaker[AsyncSession]) -> tuple[int, int]:
+        """Catch up with personas created or deleted elsewhere; ``(added, removed)``."""
+        with self._lock:
+            # Taken before the query, so personas indexed while it runs aren't
+            # dropped.  (A bulk batch is indexed just before its commit; a sync
+            # in that gap drops it until the next one.)
+            known = set(self._rows)
+        async with session_factory() as db:
+            current = set((await db.execute(select(Persona.id))).scalars().all())
+            missing = sorted(current - known)
+            added = 0
+            for start in range(0, len(missing), LOAD_PAGE):
+                result = await db.execute(
+                    select(Persona.id, Persona.user_id, Persona.profile)
+                    .where(Persona.id.in_(missing[start:start + LOAD_PAGE]))
+                )
+                for persona_id, user_id, profile in result.all():
+                    self.add(persona_id, user_id, profile or {})
+                    added += 1
+        removed = known - current
+        for persona_id in removed:
+            self.remove(persona_id)
+        return added, len(removed)
+
+    async def start(self, session_factory: async_sessionmaker[AsyncSession], interval: float) -> None:
+        """Load the index, then sync it every ``interval`` seconds in the background (0 = never)."""
+        await self.load(session_factory)
+        if interval > 0:
+            self._task = asyncio.create_task(self._sync_loop(session_factory, interval))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sync_loop(self, session_factory: async_sessionmaker[AsyncSession], interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                added, removed = await self.sync(session_factory)
+                if added or removed:
+                    logger.info("Persona diversity index synced: %d added, %d removed", added, removed)
+            except Exception:
+                logger.exception("Error syncing the persona diversity index")
+
+
+diversity_index = PersonaIndex(dim=get_settings().diversity.dim)
@@ -0,0 +1,109 @@
+"""Idempotency-Key support for endpoints that trigger expensive generation.
+
+A client sends ``Idempotency-Key: <unique value>`` with a POST.  The first
+request reserves the key (an ``idempotency_keys`` row with no response yet),
+does its work and stores the response; a retry with the same key gets that
+stored response back instead of repeating the LLM call.  A retry that
+arrives while the first request is still running gets 409, and reusing a key
+for a different request body gets 422.  Records expire after
+``idempotency_ttl_hours`` and are purged by the scheduler's cleanup loop.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.idempotency import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def request_hash(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+async def reserve(
+    db: AsyncSession, user_id: str, scope: str, key: str, fingerprint: str
+) -> IdempotencyRecord | None:
+    """Claim ``key`` for this request, or return the completed record to replay.
+
+    Returns None when the caller should do the work (and later call
+    ``complete`` or ``release``).
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(400, f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+    now = datetime.now(timezone.utc)
+    record = await db.get(IdempotencyRecord, (user_id, scope, key))
+    if record is not None and record.expires_at.replace(tzinfo=timezone.utc) <= now:
+        await db.delete(record)
+        await db.flush()
+        record = None
+    if record is None:
+        ttl = timedelta(hours=get_settings().idempotency_ttl_hours)
+        db.add(IdempotencyRecord(
+            user_id=user_id, scope=scope, key=key,
+            request_hash=fingerprint, expires_at=now + ttl,
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()  # a concurrent request reserved it first
+            raise HTTPException(409, "A request with this Idempotency-Key is already in progress")
+        return None
+    if record.request_hash != fingerprint:
+        raise HTTPException(422, f"{IDEMPOTENCY_HEADER} was already used for a different request")
+    if record.response is None:
+        raise HTTPException(409, "A request with this Idempotency-Key is already in progress")
+    return record
+
+
+async def complete(
+    db: AsyncSession, user_id: str, scope: str, key: str, status_code: int, body: dict
+) -> None:
+    record = await db.get(IdempotencyRecord, (user_id, scope, key))
+    if record is None:
+        return
+    record.status_code = status_code
+    record.response = json.dumps(body, default=str)
+    await db.commit()
+
+
+async def release(db: AsyncSession, user_id: str, scope: str, key: str) -> None:
+    """Drop a reservation whose request failed, so the client can retry it."""
+    await db.rollback()
+    await db.execute(
+        delete(IdempotencyRecord).where(
+            IdempotencyRecord.user_id == user_id,
+            IdempotencyRecord.scope == scope,
+            IdempotencyRecord.key == key,
+            IdempotencyRecord.response.is_(None),
+        )
+    )
+    await db.commit()
+
+
+def replay(record: IdempotencyRecord, headers: dict[str, str] | None = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=record.status_code,
+        content=json.loads(record.response),
+        headers={REPLAYED_HEADER: "true", **(headers or {})},
+    )
+
+
+async def purge_expired(db: AsyncSession) -> int:
+    result = await db.execute(
+        delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= datetime.now(timezone.utc))
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,181 @@
+"""Background plan-generation jobs.
+
+``POST /api/plans/generate/{persona_id}`` records a ``PlanJob`` and returns
+202 immediately; the generation itself runs here as an asyncio task.  LLM
+calls still pass through the admission semaphore in ``app.services.llm``, so
+queued jobs wait for capacity instead of overloading the model.  Job state
+lives in the ``plan_jobs`` table: clients poll it, and jobs left unfinished by
+a restart are picked up again on startup.  A job only runs once the worker
+has claimed it by moving it from ``queued`` to ``running`` with a
+conditional UPDATE, so when several workers resume the same jobs each one
+still runs exactly once.  While it runs, the worker touches the job every
+``JOB_HEARTBEAT`` so a slow generation isn't mistaken for an abandoned one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Coroutine
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.job import PlanJob
+from app.models.persona import Persona
+from app.services.plan_gen import create_plan_for_persona
+from app.services.usage import metered
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+OPEN_JOB_STATUSES = ("queued", "running")
+# A running job untouched for this long is taken to have lost its worker
+JOB_LEASE = timedelta(minutes=30)
+JOB_HEARTBEAT = JOB_LEASE / 3
+
+
+async def find_open_job(db: AsyncSession, persona_id: str) -> PlanJob | None:
+    """The persona's queued or running plan job, if there is one."""
+    result = await db.execute(
+        select(PlanJob)
+        .where(PlanJob.persona_id == persona_id, PlanJob.status.in_(OPEN_JOB_STATUSES))
+        .order_by(PlanJob.created_at)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def create_open_job(db: AsyncSession, user_id: str, persona_id: str) -> tuple[PlanJob, bool]:
+    """Queue a plan job for the persona; ``(job, created)``.
+
+    A partial unique index allows one open job per persona.  When a
+    concurrent request got there first, its job is returned with
+    ``created`` false instead of starting a second one.
+    """
+    job = PlanJob(user_id=user_id, persona_id=persona_id)
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        existing = await find_open_job(db, persona_id)
+        if existing is None:
+            raise
+        return existing, False
+    return job, True
+
+
+async def _heartbeat(job_id: str, session_factory: async_sessionmaker[AsyncSession]) -> None:
+    """Renew a running job's lease until cancelled."""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT.total_seconds())
+        try:
+            async with session_factory() as db:
+                await db.execute(
+                    update(PlanJob)
+                    .where(PlanJob.id == job_id, PlanJob.status == "running")
+                    .values(updated_at=datetime.now(timezone.utc))
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Heartbeat for plan job %s failed", job_id)
+
+
+async def run_plan_job(job_id: str, session_factory: async_sessionmaker[AsyncSession]) -> None:
+    async with session_factory() as db:
+        claimed = await db.execute(
+            update(PlanJob)
+            .where(PlanJob.id == job_id, PlanJob.status == "queued")
+            .values(status="running")
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return  # finished, or already claimed by another worker
+        job = await db.get(PlanJob, job_id)
+        heartbeat = asyncio.create_task(_heartbeat(job_id, session_factory))
+        try:
+            persona = await db.get(Persona, job.persona_id)
+            if persona is None:
+                raise LookupError("Persona no longer exists")
+            with metered("plan", job.user_id, job.persona_id):
+                plan = await create_plan_for_persona(db, persona)
+            job.status = "succeeded"
+            job.plan_id = plan.id
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next startup runs it
+            await db.rollback()
+            await db.execute(update(PlanJob).where(PlanJob.id == job_id).values(status="queued"))
+            await db.commit()
+            raise
+        except Exception as exc:
+            logger.exception("Plan job %s failed", job_id)
+            await db.rollback()
+            await db.refresh(job)
+            job.status = "failed"
+            job.error = str(exc)[:500]
+        finally:
+            heartbeat.cancel()
+        await db.commit()
+
+
+class JobRunner:
+    """Holds references to in-flight background tasks so they aren't garbage collected."""
+
+    def __init__(self) -> None:
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def submit(self, job_id: str, session_factory: async_sessionmaker[AsyncSession]) -> asyncio.Task:
+        return self.spawn(job_id, run_plan_job(job_id, session_factory))
+
+    def spawn(self, key: str, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Run ``coro`` in the background under ``key``; a running task with that key wins."""
+        existing = self._tasks.get(key)
+        if existing is not None and not existing.done():
+            coro.close()
+            return existing
+        task = asyncio.create_task(coro)
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return task
+
+    async def resume(self, session_factory: async_sessionmaker[AsyncSession]) -> int:
+        """Submit queued jobs, and running jobs whose worker has gone away.
+
+        Every worker calls this on startup.  Running jobs are requeued only
+        once they have gone ``JOB_LEASE`` without an update, so jobs live in
+        another worker are left alone, and the claim in ``run_plan_job``
+        keeps a queued job submitted by several workers from running twice.
+        """
+        stale = datetime.now(timezone.utc) - JOB_LEASE
+        async with session_factory() as db:
+            await db.execute(
+                update(PlanJob)
+                .where(PlanJob.status == "running", PlanJob.updated_at < stale)
+                .values(status="queued")
+            )
+            result = await db.execute(select(PlanJob.id).where(PlanJob.status == "queued"))
+            job_ids = list(result.scalars().all())
+            await db.commit()
+        for job_id in job_ids:
+            self.submit(job_id, session_factory)
+        if job_ids:
+            logger.info("Resumed %d unfinished plan jobs", len(job_ids))
+        return len(job_ids)
+
+    async def drain(self) -> None:
+        """Wait for every in-flight job to finish."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+job_runner = JobRunner()
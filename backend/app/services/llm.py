@@ -1,33 +1,58 @@
-"""LLM integration — supports Ollama (local) and OpenAI-compatible APIs."""
+"""LLM integration — supports Ollama (local) and OpenAI-compatible APIs.
+
+Each successful call is metered (tokens and wall time) in ``app.services.usage``.
+"""
 
 from __future__ import annotations
 
 import asyncio
 import json
 import logging
+import time
 
 import httpx
 
 from app.config import get_settings
+from app.services.usage import estimate_tokens, usage_meter
 
 logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 3
 
+_admission: asyncio.Semaphore | None = None
+
 
 def _llm_cfg():
     return get_settings().llm
 
 
+def admission() -> asyncio.Semaphore:
+    """Process-wide semaphore bounding concurrent LLM calls (``llm.max_concurrent``)."""
+    global _admission
+    if _admission is None:
+        _admission = asyncio.Semaphore(max(1, _llm_cfg().max_concurrent))
+    return _admission
+
+
 async def generate(prompt: str) -> str:
-    """Send a prompt to the configured LLM with retry + exponential backoff."""
+    """Send a prompt to the configured LLM with retry + exponential backoff.
+
+    Each attempt waits for an admission slot, so bursts from the API and the
+    scheduler queue here instead of piling onto the model server.
+    """
     cfg = _llm_cfg()
     last_err: Exception | None = None
     for attempt in range(MAX_RETRIES):
         try:
-            if cfg.backend == "openai" and cfg.openai_api_key:
-                return await _openai_generate(prompt)
-            return await _ollama_generate(prompt)
+            async with admission():
+                usage: dict = {}
+                started = time.perf_counter()
+                if cfg.backend == "openai" and cfg.openai_api_key:
+                    text = await _openai_generate(prompt, usage)
+                else:
+                    text = await _ollama_generate(prompt, usage)
+                _record_usage(prompt, text, usage, time.perf_counter() - started)
+                return text
         except (httpx.HTTPError, httpx.TimeoutException) as exc:
             last_err = exc
             wait = 2 ** attempt
@@ -36,6 +61,17 @@ async def generate(prompt: str) -> str:
     raise RuntimeError(f"LLM call failed after {MAX_RETRIES} attempts") from last_err
 
 
+def _record_usage(prompt: str, text: str, usage: dict, seconds: float) -> None:
+    """Meter one call, estimating token counts the provider didn't report."""
+    if not get_settings().usage.enabled:
+        return
+    usage_meter.record(
+        prompt_tokens=usage.get("prompt_tokens") or estimate_tokens(prompt),
+        completion_tokens=usage.get("completion_tokens") or estimate_tokens(text),
+        wall_ms=round(seconds * 1000),
+    )
+
+
 def _extract_json(raw: str) -> dict:
     """Extract JSON from LLM response, handling markdown fences."""
     text = raw.strip()
@@ -63,7 +99,8 @@ async def generate_json(prompt: str) -> dict:
     return {}  # unreachable
 
 
-async def _ollama_generate(prompt: str) -> str:
+async def _ollama_generate(prompt: str, usage: dict) -> str:
+    """Ollama reports ``prompt_eval_count`` / ``eval_count``; missing ones are estimated later."""
     cfg = _llm_cfg()
     async with httpx.AsyncClient(timeout=120.0) as client:
         resp = await client.post(
@@ -71,10 +108,13 @@ async def _ollama_generate(prompt: str) -> str:
             json={"model": cfg.ollama_model, "prompt": prompt, "stream": False},
         )
         resp.raise_for_status()
-        return resp.json()["response"]
+        data = resp.json()
+        usage["prompt_tokens"] = data.get("prompt_eval_count")
+        usage["completion_tokens"] = data.get("eval_count")
+        return data["response"]
 
 
-async def _openai_generate(prompt: str) -> str:
+async def _openai_generate(prompt: str, usage: dict) -> str:
     cfg = _llm_cfg()
     async with httpx.AsyncClient(timeout=120.0) as client:
         resp = await client.post(
@@ -87,4 +127,6 @@ async def _openai_generate(prompt: str) -> str:
             },
         )
         resp.raise_for_status()
-        return resp.json()["choices"][0]["message"]["content"]
+        data = resp.json()
+        usage.update(data.get("usage") or {})
+        return data["choices"][0]["message"]["content"]
@@ -0,0 +1,173 @@
+"""Event-loop health — lag histogram and slow-callback detection.
+
+The API, the scheduler loops and CPU-bound work share one asyncio loop, so a
+single blocking call stalls everything.  ``LoopMonitor`` measures that two
+ways:
+
+  - a probe task sleeps for a fixed interval and records how late it wakes
+    up (the loop lag) into a histogram;
+  - a watchdog thread notices when the probe's heartbeat is overdue by more
+    than the slow-callback threshold and captures the loop thread's stack
+    *while it is blocked*, so the log names the offending code.  Stacks go
+    to the log only; the metrics export lists stalls without them, since
+    ``/api/metrics`` is unauthenticated.
+
+With ``asyncio_debug`` enabled the loop's own slow-callback warnings
+(``loop.slow_callback_duration``) are counted as well.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the final bucket catches everything above.
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+
+class _AsyncioSlowCallbackHandler(logging.Handler):
+    """Counts asyncio debug-mode "Executing <Handle> took N seconds" warnings."""
+
+    def __init__(self, monitor: LoopMonitor):
+        super().__init__(level=logging.WARNING)
+        self._monitor = monitor
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Executing ") and " took " in message:
+            self._monitor._record_slow(message)
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        probe_interval: float = 0.25,
+        slow_threshold: float = 0.1,
+        asyncio_debug: bool = False,
+        max_recent: int = 20,
+    ):
+        self.probe_interval = probe_interval
+        self.slow_threshold = slow_threshold
+        self.asyncio_debug = asyncio_debug
+        self._bucket_counts = [0] * len(LAG_BUCKETS_MS)
+        self._lag_sum_ms = 0.0
+        self._lag_max_ms = 0.0
+        self._samples = 0
+        self._slow_count = 0
+        self._recent_slow: deque[dict] = deque(maxlen=max_recent)
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._debug_handler: logging.Handler | None = None
+        # the loop's (debug, slow_callback_duration) before start(), restored by stop()
+        self._previous_debug: tuple[bool, float] | None = None
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        if self.asyncio_debug:
+            self._previous_debug = (loop.get_debug(), loop.slow_callback_duration)
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_threshold
+            self._debug_handler = _AsyncioSlowCallbackHandler(self)
+            logging.getLogger("asyncio").addHandler(self._debug_handler)
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            "Loop monitor started (probe %.0f ms, slow threshold %.0f ms)",
+            self.probe_interval * 1000,
+            self.slow_threshold * 1000,
+        )
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+        if self._debug_handler:
+            logging.getLogger("asyncio").removeHandler(self._debug_handler)
+            self._debug_handler = None
+        if self._previous_debug is not None:
+            loop = asyncio.get_running_loop()
+            loop.set_debug(self._previous_debug[0])
+            loop.slow_callback_duration = self._previous_debug[1]
+            self._previous_debug = None
+
+    # --- Recording ---
+
+    def record_lag(self, lag_ms: float) -> None:
+        with self._lock:
+            for i, bound in enumerate(LAG_BUCKETS_MS):
+                if lag_ms <= bound:
+                    self._bucket_counts[i] += 1
+                    break
+            self._samples += 1
+            self._lag_sum_ms += lag_ms
+            self._lag_max_ms = max(self._lag_max_ms, lag_ms)
+
+    def _record_slow(self, description: str) -> None:
+        with self._lock:
+            self._slow_count += 1
+            self._recent_slow.append({"at": time.time(), "description": description})
+
+    async def _probe(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self.record_lag(max(0.0, (now - start - self.probe_interval) * 1000))
+
+    def _watch(self) -> None:
+        """Runs in a thread: capture the loop's stack when the heartbeat stalls."""
+        reported_beat = None
+        while not self._stop.wait(self.slow_threshold / 2):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.probe_interval
+            if overdue < self.slow_threshold or beat == reported_beat:
+                continue
+            reported_beat = beat  # one report per stall
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else None
+            description = f"Event loop blocked for more than {overdue * 1000:.0f} ms"
+            self._record_slow(description)
+            logger.warning("%s; loop thread stack:\n%s", description, stack or "<unavailable>")
+
+    # --- Export ---
+
+    def metrics(self) -> dict:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(LAG_BUCKETS_MS, self._bucket_counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {
+                "lag_ms": {
+                    "buckets": buckets,
+                    "count": self._samples,
+                    "sum": round(self._lag_sum_ms, 3),
+                    "max": round(self._lag_max_ms, 3),
+                },
+                "slow_callbacks": self._slow_count,
+                "slow_threshold_ms": self.slow_threshold * 1000,
+                "recent_slow": list(self._recent_slow),
+            }
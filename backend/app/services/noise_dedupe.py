@@ -0,0 +1,270 @@
+"""Per-persona duplicate suppression for LLM-generated noise.
+
+The search and browsing prompts see the same persona summary every cycle, so
+the model keeps returning the same queries and URLs; each repeat used to be
+stored as a new ``NoiseEvent`` and executed again by the extension.  Every
+generated item now passes two checks before it is queued:
+
+- **exact** — the normalised item (case, whitespace and punctuation folded;
+  URLs without ``www.``, fragments, trailing slashes or ``utm_*`` params) is
+  looked up in a rolling Bloom filter.  Two generations of
+  ``dedupe.bloom_capacity`` items are kept and the older one is dropped when
+  the current one fills, so memory stays fixed and old items age out.
+- **near** — a MinHash signature over character 3-grams is compared with the
+  persona's last ``dedupe.recent_signatures`` signatures of that event type;
+  an estimated Jaccard similarity of ``dedupe.near_threshold`` or more (say
+  "hiking trails denver" vs "denver hiking trails") counts as a repeat.
+
+Filters are held per persona in an LRU of ``dedupe.max_personas`` entries and,
+with ``dedupe.persist``, stored in ``noise_filters`` so a restart does not
+forget them.  The most recent accepted items are also handed back for the
+prompt, so the model is asked not to repeat them and fewer generated tokens
+are thrown away.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import math
+import re
+import zlib
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import DedupeSettings, get_settings
+from app.models.noise_filter import NoiseFilterState
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_PRIME = (1 << 31) - 1
+SHINGLE = 3
+
+
+def normalize(event_type: str, item: str) -> str:
+    """Canonical form of a generated item, used for exact matching."""
+    text = item.strip()
+    if event_type == "browse":
+        parsed = urlparse(text if "://" in text else f"https://{text}")
+        host = parsed.netloc.lower().removeprefix("www.")
+        query = urlencode(sorted(
+            (k, v) for k, v in parse_qsl(parsed.query) if not k.lower().startswith("utm_")
+        ))
+        return f"{host}{parsed.path.rstrip('/')}" + (f"?{query}" if query else "")
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def shingles(text: str) -> set[str]:
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+@lru_cache
+def _permutations(num_perm: int) -> tuple[np.ndarray, np.ndarray]:
+    # Fixed seed: persisted signatures must stay comparable across restarts
+    rng = np.random.default_rng(0x6E6F697365)
+    a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash(text: str, num_perm: int = 32) -> np.ndarray:
+    """MinHash signature of the text's character shingles."""
+    a, b = _permutations(num_perm)
+    x = np.array([zlib.crc32(s.encode()) % _PRIME for s in shingles(text)], dtype=np.uint64)
+    return ((a[:, None] * x[None, :] + b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+class RollingBloom:
+    """Bloom filter that keeps the current and previous generation of items."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._current = bytearray((self.size + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self.count = 0
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    @staticmethod
+    def _has(bits: bytearray, positions: list[int]) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def __contains__(self, key: str) -> bool:
+        positions = self._positions(key)
+        return self._has(self._current, positions) or self._has(self._previous, positions)
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self._current[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+        if self.count >= self.capacity:
+            self._previous, self._current = self._current, bytearray(len(self._current))
+            self.count = 0
+
+    def to_state(self) -> dict:
+        return {"bits": [_b64(self._current), _b64(self._previous)], "count": self.count}
+
+    def restore(self, state: dict) -> bool:
+        current, previous = (base64.b64decode(s) for s in state["bits"])
+        if len(current) != len(self._current) or len(previous) != len(self._current):
+            return False
+        self._current, self._previous = bytearray(current), bytearray(previous)
+        self.count = int(state["count"])
+        return True
+
+
+class PersonaNoiseFilter:
+    """One persona's Bloom filter plus recent MinHash signatures per event type."""
+
+    def __init__(self, cfg: DedupeSettings):
+        self.cfg = cfg
+        self.bloom = RollingBloom(cfg.bloom_capacity, cfg.bloom_error_rate)
+        self._signatures: dict[str, np.ndarray] = {}
+        self._filled: dict[str, int] = {}
+        self._next: dict[str, int] = {}
+        self.recent: dict[str, deque[str]] = {}
+
+    def _ring(self, event_type: str) -> np.ndarray:
+        if event_type not in self._signatures:
+            rows = max(1, self.cfg.recent_signatures)
+            self._signatures[event_type] = np.zeros((rows, self.cfg.num_perm), dtype=np.uint32)
+            self._filled[event_type] = self._next[event_type] = 0
+        return self._signatures[event_type]
+
+    def _recent(self, event_type: str) -> deque[str]:
+        return self.recent.setdefault(event_type, deque(maxlen=max(0, self.cfg.avoid_hint)))
+
+    def check(self, event_type: str, item: str) -> str | None:
+        """``"exact"`` or ``"near"`` for a repeat; otherwise records the item and returns None."""
+        norm = normalize(event_type, item)
+        key = f"{event_type}:{norm}"
+        if key in self.bloom:
+            return "exact"
+        signature = minhash(norm, self.cfg.num_perm)
+        ring = self._ring(event_type)
+        filled = self._filled[event_type]
+        if filled:
+            similarity = (ring[:filled] == signature).mean(axis=1)
+            if float(similarity.max()) >= self.cfg.near_threshold:
+                return "near"
+        self.bloom.add(key)
+        slot = self._next[event_type]
+        ring[slot] = signature
+        self._next[event_type] = (slot + 1) % len(ring)
+        self._filled[event_type] = min(filled + 1, len(ring))
+        self._recent(event_type).append(item)
+        return None
+
+    def to_state(self) -> dict:
+        return {
+            "num_perm": self.cfg.num_perm,
+            "bloom": self.bloom.to_state(),
+            "signatures": {
+                t: {
+                    "rows": _b64(ring[: self._filled[t]].tobytes()),
+                    "next": self._next[t],
+                }
+                for t, ring in self._signatures.items()
+            },
+            "recent": {t: list(items) for t, items in self.recent.items()},
+        }
+
+    def restore(self, state: dict) -> None:
+        """Load persisted state; parts that no longer fit the settings are dropped."""
+        if state.get("num_perm") != self.cfg.num_perm or not self.bloom.restore(state["bloom"]):
+            return
+        for event_type, saved in state.get("signatures", {}).items():
+            rows = np.frombuffer(base64.b64decode(saved["rows"]), dtype=np.uint32)
+            rows = rows.reshape(-1, self.cfg.num_perm)[-self.cfg.recent_signatures:]
+            ring = self._ring(event_type)
+            ring[: len(rows)] = rows
+            self._filled[event_type] = len(rows)
+            self._next[event_type] = saved["next"] % len(ring) if len(rows) == len(ring) else len(rows)
+        for event_type, items in state.get("recent", {}).items():
+            self._recent(event_type).extend(items)
+
+
+class NoiseDeduper:
+    """LRU of per-persona filters, with optional persistence in ``noise_filters``."""
+
+    def __init__(self, cfg: DedupeSettings):
+        self.cfg = cfg
+        self._filters: OrderedDict[str, PersonaNoiseFilter] = OrderedDict()
+        self.stats: Counter[str] = Counter()  # kept / exact / near
+
+    def _get(self, persona_id: str) -> PersonaNoiseFilter:
+        f = self._filters.get(persona_id)
+        if f is None:
+            f = self._filters[persona_id] = PersonaNoiseFilter(self.cfg)
+            while len(self._filters) > max(1, self.cfg.max_personas):
+                self._filters.popitem(last=False)
+        self._filters.move_to_end(persona_id)
+        return f
+
+    async def load(self, db: AsyncSession, persona_id: str) -> None:
+        """Bring a persona's persisted filter into memory if it isn't already."""
+        if persona_id in self._filters or not self.cfg.persist:
+            return
+        row = await db.get(NoiseFilterState, persona_id)
+        f = self._get(persona_id)
+        if row is not None:
+            try:
+                f.restore(row.state)
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Discarding unreadable noise filter for persona %s", persona_id)
+
+    async def save(self, db: AsyncSession, persona_id: str) -> None:
+        """Stage the persona's filter for the caller's next commit."""
+        f = self._filters.get(persona_id)
+        if f is None or not self.cfg.persist:
+            return
+        row = await db.get(NoiseFilterState, persona_id)
+        if row is None:
+            db.add(NoiseFilterState(persona_id=persona_id, state=f.to_state()))
+        else:
+            row.state = f.to_state()
+
+    def filter(self, persona_id: str, event_type: str, items: list[str]) -> list[str]:
+        """Items not seen before (exactly or nearly), recording them as seen."""
+        f = self._get(persona_id)
+        kept = []
+        for item in items:
+            if not isinstance(item, str) or not item.strip():
+                continue
+            verdict = f.check(event_type, item)
+            self.stats[verdict or "kept"] += 1
+            if verdict is None:
+                kept.append(item)
+        dropped = len(items) - len(kept)
+        if dropped:
+            logger.debug("Dropped %d repeated %s items for persona %s", dropped, event_type, persona_id)
+        return kept
+
+    def recent(self, persona_id: str, event_type: str) -> list[str]:
+        """The persona's most recently accepted items of a type, oldest first."""
+        f = self._filters.get(persona_id)
+        return list(f.recent.get(event_type, ())) if f else []
+
+    @property
+    def dropped(self) -> int:
+        return self.stats["exact"] + self.stats["near"]
+
+
+noise_deduper = NoiseDeduper(get_settings().dedupe)
@@ -0,0 +1,152 @@
+"""Password hashing with a tunable KDF, run off the event loop.
+
+Hashes are stored in a versioned, self-describing format::
+
+    $scrypt$v=1$n=16384,r=8,p=1$<salt>$<hash>
+    $pbkdf2-sha256$v=1$i=600000$<salt>$<hash>
+
+(salt and hash base64, unpadded).  The cost is deliberately high, so the
+work runs in a dedicated pool of ``passwords.workers`` threads (both KDFs
+release the GIL inside OpenSSL, so threads use every core) or, with
+``passwords.pool = "process"``, worker processes.  A burst of logins then
+queues in the pool instead of stalling other requests and the scheduler.
+
+``needs_rehash`` reports hashes made with another algorithm or cost (or
+the old unversioned ``salt$sha256`` format); login re-hashes those with the
+current settings once the password has been verified.  Logins for unknown
+emails run ``verify_dummy`` so they take as long as a wrong password.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.config import PasswordSettings, get_settings
+
+FORMAT_VERSION = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_executor: Executor | None = None
+_dummy_hash: str | None = None
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(s: str) -> bytes:
+    return base64.b64decode(s + "=" * (-len(s) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * r * (n + p + 2), dklen=KEY_BYTES,
+    )
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=KEY_BYTES)
+
+
+def _params(cfg: PasswordSettings) -> tuple[str, str]:
+    """``(algorithm, parameter string)`` for newly made hashes."""
+    if cfg.algorithm == "pbkdf2":
+        return "pbkdf2-sha256", f"i={cfg.pbkdf2_iterations}"
+    return "scrypt", f"n={cfg.scrypt_n},r={cfg.scrypt_r},p={cfg.scrypt_p}"
+
+
+def _derive(algorithm: str, params: str, password: str, salt: bytes) -> bytes:
+    values = dict(item.split("=", 1) for item in params.split(","))
+    if algorithm == "scrypt":
+        return _scrypt(password, salt, int(values["n"]), int(values["r"]), int(values["p"]))
+    if algorithm == "pbkdf2-sha256":
+        return _pbkdf2(password, salt, int(values["i"]))
+    raise ValueError(f"Unknown password hash algorithm {algorithm!r}")
+
+
+def hash_password(password: str, cfg: PasswordSettings | None = None) -> str:
+    """Hash a password with the configured KDF and a random salt (blocking)."""
+    algorithm, params = _params(cfg or get_settings().passwords)
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _derive(algorithm, params, password, salt)
+    return f"${algorithm}$v={FORMAT_VERSION}${params}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    """Check a password against a stored hash in any supported format (blocking)."""
+    if hashed.startswith("$"):
+        try:
+            _, algorithm, _version, params, salt, key = hashed.split("$")
+            return hmac.compare_digest(_derive(algorithm, params, plain, _unb64(salt)), _unb64(key))
+        except (ValueError, KeyError):
+            return False
+    # Legacy unversioned format: salt$sha256(salt + password)
+    if "$" not in hashed:
+        return False
+    salt, stored_hash = hashed.split("$", 1)
+    h = hashlib.sha256((salt + plain).encode()).hexdigest()
+    return hmac.compare_digest(h, stored_hash)
+
+
+def verify_dummy(plain: str, cfg: PasswordSettings | None = None) -> bool:
+    """Do one verification's KDF work against a throwaway hash; always False (blocking)."""
+    global _dummy_hash
+    cfg = cfg or get_settings().passwords
+    if _dummy_hash is None or needs_rehash(_dummy_hash, cfg):
+        _dummy_hash = hash_password(secrets.token_urlsafe(16), cfg)
+    verify_password(plain, _dummy_hash)
+    return False
+
+
+def needs_rehash(hashed: str, cfg: PasswordSettings | None = None) -> bool:
+    """True unless ``hashed`` was made with the current algorithm, cost and format version."""
+    algorithm, params = _params(cfg or get_settings().passwords)
+    return not hashed.startswith(f"${algorithm}$v={FORMAT_VERSION}${params}$")
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        cfg = get_settings().passwords
+        workers = cfg.workers or os.cpu_count() or 1
+        if cfg.pool == "process":
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-kdf")
+    return _executor
+
+
+async def hash_password_async(password: str) -> str:
+    """``hash_password`` in the KDF worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), hash_password, password, get_settings().passwords
+    )
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """``verify_password`` in the KDF worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), verify_password, plain, hashed)
+
+
+async def verify_dummy_async(plain: str) -> bool:
+    """``verify_dummy`` in the KDF worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), verify_dummy, plain, get_settings().passwords)
+
+
+def shutdown() -> None:
+    """Stop the worker pool (it is recreated on next use)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,85 @@
+"""In-process cache of decoded persona JSON.
+
+``profile`` and ``wizard_answers`` are JSON columns, and loading them means
+the JSON type (or asyncpg's JSONB codec) runs ``json.loads`` on every row
+fetched — over half the cost of listing personas.  List and detail
+endpoints therefore load personas with both columns deferred and take the
+decoded dicts from here, keyed by persona id and ``updated_at`` so a stale
+entry is never served after an update; only misses fetch and decode the
+JSON.  The cache is bounded LRU so memory stays flat however many personas
+exist, and the persona router also drops entries on PATCH and DELETE.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+
+from app.models.persona import Persona
+
+# Load options for queries whose personas are rendered through the cache
+DEFER_JSON = (defer(Persona.profile, raiseload=True), defer(Persona.wizard_answers, raiseload=True))
+
+
+class ProfileCache:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[datetime | None, dict, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, persona_id: str, updated_at: datetime | None) -> tuple[dict, dict] | None:
+        """Decoded ``(profile, wizard_answers)`` if cached for this ``updated_at``."""
+        with self._lock:
+            entry = self._entries.get(persona_id)
+            if entry is None or entry[0] != updated_at:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(persona_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, persona_id: str, updated_at: datetime | None, profile: dict, answers: dict) -> None:
+        with self._lock:
+            self._entries[persona_id] = (updated_at, profile, answers)
+            self._entries.move_to_end(persona_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def load(self, db: AsyncSession, personas: list[Persona]) -> dict[str, tuple[dict, dict]]:
+        """Decoded JSON for ``personas`` (loaded with ``DEFER_JSON``), fetching only misses."""
+        decoded: dict[str, tuple[dict, dict]] = {}
+        missing: list[str] = []
+        for p in personas:
+            entry = self.get(p.id, p.updated_at)
+            if entry is None:
+                missing.append(p.id)
+            else:
+                decoded[p.id] = entry
+        if missing:
+            result = await db.execute(
+                select(Persona.id, Persona.updated_at, Persona.profile, Persona.wizard_answers)
+                .where(Persona.id.in_(missing))
+            )
+            for persona_id, updated_at, profile, answers in result.all():
+                profile, answers = profile or {}, answers or {}
+                self.put(persona_id, updated_at, profile, answers)
+                decoded[persona_id] = (profile, answers)
+        return decoded
+
+    def invalidate(self, persona_id: str) -> None:
+        with self._lock:
+            self._entries.pop(persona_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+profile_cache = ProfileCache()
@@ -33,15 +33,43 @@ Return ONLY a valid JSON object (no markdown, no explanation) with these keys:
 }}
 """
 
+VARIATION_NOTE = """
+This is persona {number} of {count} created from the same preferences, and they must read as different people. {guidance}
+"""
+
+# How far bulk-created personas may stray from the shared preferences
+DIVERSITY_GUIDANCE = {
+    "low": "Keep the preferences closely; vary only the name, exact age, city and personal details.",
+    "medium": "Use the preferences as a starting point; vary the age within the range, the city, "
+              "and which specific interests and sites they favour.",
+    "high": "Treat the preferences loosely; vary age, location, specific profession and interests "
+            "widely, keeping only the broad shopping style.",
+}
+
+# Appended when a generated profile nearly duplicates one of the user's personas
+DISTINCT_NOTE = """
+The user already has a persona very much like the one these preferences suggest. Make this one clearly different: other specific interests, other favourite sites and other search topics, while still fitting the preferences.
+"""
+
 
-async def generate_persona(answers: WizardAnswers) -> PersonaProfile:
-    """Take wizard answers, call the LLM, return a structured persona."""
+def variation_note(index: int, count: int, diversity: str = "medium") -> str:
+    """Prompt suffix that keeps ``count`` personas from one answer set distinct."""
+    return VARIATION_NOTE.format(
+        number=index + 1, count=count, guidance=DIVERSITY_GUIDANCE[diversity]
+    )
+
+
+async def generate_persona(answers: WizardAnswers, variation: str = "") -> PersonaProfile:
+    """Take wizard answers, call the LLM, return a structured persona.
+
+    ``variation`` is appended to the prompt (see ``variation_note``).
+    """
     prompt = PERSONA_PROMPT.format(
         interests=", ".join(answers.interests),
         age_range=answers.age_range,
         location=answers.location,
         profession=answers.profession,
         shopping_style=answers.shopping_style,
-    )
+    ) + variation
     data = await generate_json(prompt)
     return PersonaProfile(**data)
@@ -0,0 +1,190 @@
+"""Warm pool of pre-generated persona profiles.
+
+Generating a profile takes one slow ``PERSONA_PROMPT`` call, which the wizard
+used to wait on every time.  The pool keeps a few ready profiles per coarse
+bucket of wizard answers for the buckets users actually pick.  A bucket is
+everything the profile is generated from except the exact interests (age
+range, shopping style, location, profession, interest cluster), so a claimed
+profile's searches, sites and routine already fit; ``claim`` only adds the
+chosen interests.  On a miss the caller falls back to live generation.  ``refill`` tops the
+pool up from the scheduler, only while the LLM has spare capacity.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from collections.abc import Callable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Settings
+from app.db import is_postgres, release_connection
+from app.models.persona import Persona
+from app.models.persona_pool import BUCKET_LENGTH, PersonaPoolEntry
+from app.schemas.persona import PersonaProfile, WizardAnswers
+from app.services.llm import admission
+from app.services.persona_gen import generate_persona, variation_note
+
+logger = logging.getLogger(__name__)
+
+# Wizard interest ids grouped into clusters that produce similar personas
+INTEREST_CLUSTERS = {
+    "outdoors": "active", "health": "active", "travel": "active",
+    "tech": "tech", "gaming": "tech", "automotive": "tech",
+    "finance": "practical", "diy": "practical",
+    "cooking": "home", "pets": "home",
+    "fashion": "culture", "music": "culture",
+}
+DEFAULT_CLUSTER = "general"
+MAX_INTERESTS = 15
+# Recent personas whose answers decide which buckets to keep warm
+DEMAND_SAMPLE = 200
+
+
+def interest_cluster(interests: list[str]) -> str:
+    """Dominant cluster of the chosen interests (ties go to the earliest pick)."""
+    clusters = [INTEREST_CLUSTERS.get(i.lower(), DEFAULT_CLUSTER) for i in interests]
+    if not clusters:
+        return DEFAULT_CLUSTER
+    counts = Counter(clusters)
+    return max(clusters, key=lambda c: (counts[c], -clusters.index(c)))
+
+
+def _normalize(answer: str | None) -> str:
+    # "|" separates the parts of a bucket
+    return " ".join((answer or "").replace("|", " ").lower().split())
+
+
+def _bucket(
+    age_range: str | None,
+    shopping_style: str | None,
+    location: str | None,
+    profession: str | None,
+    interests: list[str] | None,
+) -> str | None:
+    bucket = "|".join([
+        _normalize(age_range),
+        _normalize(shopping_style),
+        _normalize(location),
+        _normalize(profession),
+        interest_cluster(interests or []),
+    ])
+    # Unusually long free-text answers aren't worth keeping warm
+    return bucket if len(bucket) <= BUCKET_LENGTH else None
+
+
+def bucket_for(answers: WizardAnswers) -> str | None:
+    """Pool bucket for ``answers``; None if they are too long to pool."""
+    return _bucket(
+        answers.age_range, answers.shopping_style, answers.location, answers.profession, answers.interests
+    )
+
+
+def _template(bucket: str) -> WizardAnswers:
+    """Representative answers for generating a profile that fits ``bucket``."""
+    age_range, style, location, profession, cluster = bucket.split("|")
+    interests = [i for i, c in INTEREST_CLUSTERS.items() if c == cluster] or ["everyday life"]
+    return WizardAnswers(
+        interests=interests,
+        age_range=age_range,
+        location=location,
+        profession=profession,
+        shopping_style=style,
+        noise_intensity="moderate",
+    )
+
+
+def adjust(profile: PersonaProfile, answers: WizardAnswers) -> PersonaProfile:
+    """Add the chosen interests to a pooled profile without another LLM call."""
+    data = profile.model_dump()
+    have = {i.lower() for i in data["interests"]}
+    chosen = [i for i in answers.interests if i.lower() not in have]
+    data["interests"] = (chosen + data["interests"])[:MAX_INTERESTS]
+    return PersonaProfile(**data)
+
+
+async def claim(
+    db: AsyncSession,
+    answers: WizardAnswers,
+    accept: Callable[[PersonaProfile], bool] | None = None,
+) -> PersonaProfile | None:
+    """Take the oldest pooled profile in the answers' bucket, adjusted; None on a miss.
+
+    Profiles ``accept`` rejects (e.g. near-duplicates of the user's own
+    personas) are left in the pool for other users.
+    """
+    bucket = bucket_for(answers)
+    if bucket is None:
+        return None
+    oldest = (
+        select(PersonaPoolEntry)
+        .where(PersonaPoolEntry.bucket == bucket)
+        .order_by(PersonaPoolEntry.created_at)
+        .limit(1)
+    )
+    if is_postgres(db):
+        oldest = oldest.with_for_update(skip_locked=True)
+    rejected: list[str] = []
+    while True:
+        result = await db.execute(oldest.where(PersonaPoolEntry.id.not_in(rejected)))
+        entry = result.scalar_one_or_none()
+        if entry is None:
+            return None
+        profile = adjust(PersonaProfile.model_validate_json(entry.profile), answers)
+        if accept is not None and not accept(profile):
+            rejected.append(entry.id)
+            continue
+        # Conditional delete so two concurrent claims can't take the same entry
+        taken = await db.execute(delete(PersonaPoolEntry).where(PersonaPoolEntry.id == entry.id))
+        await db.commit()
+        if taken.rowcount:
+            return profile
+
+
+async def wanted_buckets(db: AsyncSession, settings: Settings) -> list[str]:
+    """The most common buckets among recently created personas."""
+    answers = Persona.wizard_answers
+    result = await db.execute(
+        select(
+            answers["age_range"].as_string(),
+            answers["shopping_style"].as_string(),
+            answers["location"].as_string(),
+            answers["profession"].as_string(),
+            answers["interests"],
+        )
+        .order_by(Persona.created_at.desc())
+        .limit(DEMAND_SAMPLE)
+    )
+    counts: Counter[str] = Counter()
+    for age_range, style, location, profession, interests in result.all():
+        bucket = _bucket(age_range, style, location, profession, interests)
+        if age_range and style and bucket:
+            counts[bucket] += 1
+    return [bucket for bucket, _ in counts.most_common(settings.pool.max_buckets)]
+
+
+async def refill(db: AsyncSession, settings: Settings) -> int:
+    """Generate up to ``pool.refill_batch`` profiles for under-stocked buckets.
+
+    Stops as soon as the LLM has no free admission slot, so refills only use
+    idle capacity.  Returns how many profiles were added.
+    """
+    result = await db.execute(
+        select(PersonaPoolEntry.bucket, func.count()).group_by(PersonaPoolEntry.bucket)
+    )
+    stock = dict(result.all())
+    added = 0
+    for bucket in await wanted_buckets(db, settings):
+        while stock.get(bucket, 0) < settings.pool.per_bucket:
+            if added >= settings.pool.refill_batch or admission().locked():
+                return added
+            variation = variation_note(stock.get(bucket, 0), settings.pool.per_bucket)
+            await release_connection(db)
+            profile = await generate_persona(_template(bucket), variation)
+            db.add(PersonaPoolEntry(bucket=bucket, profile=profile.model_dump_json()))
+            await db.commit()
+            stock[bucket] = stock.get(bucket, 0) + 1
+            added += 1
+    return added
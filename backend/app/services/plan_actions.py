@@ -0,0 +1,64 @@
+"""Expand browsing plans into individually deliverable, individually acked actions."""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+
+from pydantic import BaseModel
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.plan import BrowsingPlan
+from app.models.plan_action import PlanAction
+from app.schemas.plan import BrowsingPlanData
+from app.services.plan_versions import bump_for_plans
+
+OPEN_STATUSES = ("pending", "delivered")
+DONE_STATUSES = ("completed", "failed")
+
+# Delivered actions that are never acked become deliverable again after this
+DELIVERY_LEASE = timedelta(minutes=30)
+
+
+def _action(plan: BrowsingPlan, action_type: str, action: BaseModel, start: datetime) -> PlanAction:
+    return PlanAction(
+        plan_id=plan.id,
+        persona_id=plan.persona_id,
+        action_type=action_type,
+        payload=json.dumps(action.model_dump(exclude={"time_offset_min"})),
+        due_at=start + timedelta(minutes=action.time_offset_min),
+    )
+
+
+def expand_plan(plan: BrowsingPlan, data: BrowsingPlanData) -> list[PlanAction]:
+    """One PlanAction per plan step, due at ``scheduled_for`` + its offset."""
+    start = plan.scheduled_for
+    return (
+        [_action(plan, "search", a, start) for a in data.searches]
+        + [_action(plan, "page_visit", a, start) for a in data.page_visits]
+        + [_action(plan, "product_browse", a, start) for a in data.product_browsing]
+    )
+
+
+async def settle_plans(db: AsyncSession, plan_ids: set[str]) -> None:
+    """Mark plans executed once none of their actions are still open.  Caller commits."""
+    if not plan_ids:
+        return
+    result = await db.execute(
+        select(PlanAction.plan_id)
+        .where(PlanAction.plan_id.in_(plan_ids), PlanAction.status.in_(OPEN_STATUSES))
+        .distinct()
+    )
+    finished = plan_ids - set(result.scalars().all())
+    if not finished:
+        return
+    result = await db.execute(
+        select(BrowsingPlan.id).where(BrowsingPlan.id.in_(finished), BrowsingPlan.executed == False)
+    )
+    newly_finished = set(result.scalars().all())
+    if newly_finished:
+        await db.execute(
+            update(BrowsingPlan).where(BrowsingPlan.id.in_(newly_finished)).values(executed=True)
+        )
+        await bump_for_plans(db, newly_finished)
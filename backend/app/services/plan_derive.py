@@ -0,0 +1,148 @@
+"""Derive a new daily plan from a persona's recent plans without calling the LLM.
+
+Prior actions are recombined and perturbed: times are shifted, search queries
+rotated between slots and lightly reworded, visited sites occasionally swapped
+for the profile's ``favorite_sites`` and product sites shuffled.  The profile's
+own ``search_topics`` are mixed into the search pool.  ``plan_gen`` still asks
+the LLM for a fresh plan every ``plans.fresh_every`` days so new material keeps
+entering the pool.
+"""
+
+from __future__ import annotations
+
+import random
+from collections.abc import Callable, Hashable, Iterable
+from typing import TypeVar
+
+from app.schemas.plan import (
+    BrowsingPlanData,
+    PageVisitAction,
+    ProductBrowseAction,
+    SearchAction,
+)
+
+T = TypeVar("T")
+
+# Max minutes an action's time moves from its source slot
+TIME_SHIFT = 45
+# Chance that a page visit is replaced by a favorite site / a query reworded
+SITE_SWAP = 0.3
+QUERY_TWEAK = 0.3
+QUERY_MODIFIERS = ("best", "reviews", "near me", "cheap", "ideas", "tips", "how to", "vs")
+
+
+def _unique(items: Iterable[T], key: Callable[[T], Hashable]) -> list[T]:
+    seen: set = set()
+    out = []
+    for item in items:
+        k = key(item)
+        if k not in seen:
+            seen.add(k)
+            out.append(item)
+    return out
+
+
+def _pick(pool: list[T], count: int, rng: random.Random) -> list[T]:
+    if count <= 0 or not pool:
+        return []
+    if count <= len(pool):
+        return rng.sample(pool, count)
+    return pool + rng.choices(pool, k=count - len(pool))
+
+
+def _shift(offset: int, window_minutes: int, rng: random.Random) -> int:
+    moved = offset + rng.randint(-TIME_SHIFT, TIME_SHIFT)
+    return min(max(moved, 0), window_minutes - 1)
+
+
+def _tweak_query(query: str, rng: random.Random) -> str:
+    if rng.random() >= QUERY_TWEAK:
+        return query
+    words = query.split()
+    for modifier in QUERY_MODIFIERS:
+        if query.lower().startswith(modifier + " "):
+            return " ".join(words[len(modifier.split()):])  # drop an existing modifier
+    return f"{rng.choice(QUERY_MODIFIERS)} {query}"
+
+
+def _site_url(site: str) -> str:
+    return site if "://" in site else f"https://{site}"
+
+
+def _counts(latest: BrowsingPlanData, total: int) -> tuple[int, int, int]:
+    """Split ``total`` actions in the proportions of the latest plan."""
+    sizes = (len(latest.searches), len(latest.page_visits), len(latest.product_browsing))
+    seen = sum(sizes) or 1
+    searches = round(total * sizes[0] / seen)
+    visits = round(total * sizes[1] / seen)
+    return searches, visits, max(total - searches - visits, 0)
+
+
+def derive_plan(
+    history: list[BrowsingPlanData],
+    profile: dict,
+    action_count: int,
+    window_hours: int = 16,
+    rng: random.Random | None = None,
+) -> BrowsingPlanData:
+    """Build a plan of about ``action_count`` actions from ``history`` (newest first)."""
+    rng = rng or random.Random()
+    window = window_hours * 60
+    n_searches, n_visits, n_products = _counts(history[0], action_count)
+
+    searches = _unique(
+        [a for plan in history for a in plan.searches]
+        + [
+            SearchAction(query=topic, time_offset_min=rng.randrange(window))
+            for topic in profile.get("search_topics", [])
+        ],
+        key=lambda a: a.query.strip().lower(),
+    )
+    visits = _unique(
+        [a for plan in history for a in plan.page_visits],
+        key=lambda a: a.url.strip().rstrip("/").lower(),
+    )
+    products = _unique(
+        [a for plan in history for a in plan.product_browsing],
+        key=lambda a: (a.site.lower(), a.search.strip().lower()),
+    )
+    favorites = [_site_url(s) for s in profile.get("favorite_sites", []) if s]
+    product_sites = sorted({a.site for a in products})
+
+    # Rotate queries between time slots rather than replaying them where they were
+    picked = _pick(searches, n_searches, rng)
+    slots = [a.time_offset_min for a in picked]
+    rng.shuffle(slots)
+    new_searches = [
+        SearchAction(
+            query=_tweak_query(a.query, rng),
+            engine=a.engine,
+            time_offset_min=_shift(slot, window, rng),
+        )
+        for a, slot in zip(picked, slots)
+    ]
+
+    new_visits = []
+    for a in _pick(visits, n_visits, rng):
+        url = rng.choice(favorites) if favorites and rng.random() < SITE_SWAP else a.url
+        new_visits.append(PageVisitAction(
+            url=url,
+            dwell_seconds=max(5, round(a.dwell_seconds * rng.uniform(0.7, 1.3))),
+            time_offset_min=_shift(a.time_offset_min, window, rng),
+        ))
+
+    new_products = [
+        ProductBrowseAction(
+            site=rng.choice(product_sites) if rng.random() < SITE_SWAP else a.site,
+            search=_tweak_query(a.search, rng),
+            add_to_cart=a.add_to_cart,
+            time_offset_min=_shift(a.time_offset_min, window, rng),
+        )
+        for a in _pick(products, n_products, rng)
+    ]
+
+    for actions in (new_searches, new_visits, new_products):
+        actions.sort(key=lambda a: a.time_offset_min)
+    return BrowsingPlanData(
+        searches=new_searches, page_visits=new_visits, product_browsing=new_products
+    )
@@ -1,11 +1,38 @@
-"""Generate daily browsing plans from a persona profile."""
+"""Generate daily browsing plans from a persona profile.
+
+Large plans are split into consecutive time-window chunks that are generated
+concurrently (bounded by the LLM admission semaphore) and merged, so a heavy
+plan costs roughly one chunk's latency and a bad response only re-runs its
+own chunk.
+
+Most days do not need the LLM at all: ``create_plan_for_persona`` derives the
+plan from the persona's recent ones (see ``plan_derive``) and only asks for a
+fresh plan every ``plans.fresh_every`` days.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+from datetime import datetime, timezone
 
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db import release_connection
+from app.models.persona import Persona
+from app.models.plan import BrowsingPlan
 from app.schemas.plan import BrowsingPlanData
 from app.services.llm import generate_json
+from app.services.plan_derive import derive_plan
+from app.services.plan_actions import expand_plan
+from app.services.plan_versions import bump_plan_version
+from app.services.rollups import record_planned
+
+logger = logging.getLogger(__name__)
 
 INTENSITY_MAP = {
     "subtle": 10,
@@ -43,6 +70,76 @@ Generate approximately {action_count} total actions (split roughly 40% searches,
 40% page visits, 20% product browsing). Spread them across a {window_hours}-hour window.
 """
 
+CHUNK_NOTE = """
+This is part {part} of {parts} of the day (hours {start_hour}-{end_hour} of the full \
+activity window), so match the activity to that time of day. Offsets are still \
+minutes from the start of THIS part.
+"""
+
+# Target actions per LLM call; plans larger than this are split into chunks.
+CHUNK_ACTIONS = 25
+CHUNK_RETRIES = 2
+
+
+def _split(total: int, parts: int) -> list[int]:
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+async def _generate_chunk(
+    persona_json: str, part: int, parts: int, action_count: int, window_hours: float
+) -> BrowsingPlanData:
+    """One chunk's LLM call, retried on its own if the response is unusable."""
+    prompt = PLAN_PROMPT.format(
+        persona_json=persona_json,
+        action_count=action_count,
+        window_hours=round(window_hours, 1),
+    )
+    if parts > 1:
+        prompt += CHUNK_NOTE.format(
+            part=part + 1,
+            parts=parts,
+            start_hour=round(part * window_hours, 1),
+            end_hour=round((part + 1) * window_hours, 1),
+        )
+    for attempt in range(CHUNK_RETRIES + 1):
+        try:
+            data = await generate_json(prompt)
+            return BrowsingPlanData(**data)
+        except Exception:
+            if attempt == CHUNK_RETRIES:
+                raise
+            logger.warning("Plan chunk %d/%d failed (attempt %d), retrying", part + 1, parts, attempt + 1)
+    raise AssertionError("unreachable")
+
+
+def _merge_chunks(chunks: list[tuple[int, BrowsingPlanData]], chunk_minutes: int) -> BrowsingPlanData:
+    """Shift each chunk's offsets to absolute minutes and drop repeated actions."""
+    merged = BrowsingPlanData(searches=[], page_visits=[], product_browsing=[])
+    seen: set[tuple] = set()
+
+    def place(action, key: tuple, part: int) -> bool:
+        if key in seen:
+            return False
+        seen.add(key)
+        offset = min(max(action.time_offset_min, 0), chunk_minutes - 1)
+        action.time_offset_min = part * chunk_minutes + offset
+        return True
+
+    for part, data in chunks:
+        for a in data.searches:
+            if place(a, ("search", a.query.strip().lower()), part):
+                merged.searches.append(a)
+        for a in data.page_visits:
+            if place(a, ("visit", a.url.strip().rstrip("/").lower()), part):
+                merged.page_visits.append(a)
+        for a in data.product_browsing:
+            if place(a, ("product", a.site.lower(), a.search.strip().lower()), part):
+                merged.product_browsing.append(a)
+    for actions in (merged.searches, merged.page_visits, merged.product_browsing):
+        actions.sort(key=lambda a: a.time_offset_min)
+    return merged
+
 
 async def generate_plan(
     persona_profile: dict,
@@ -51,10 +148,93 @@ async def generate_plan(
 ) -> BrowsingPlanData:
     """Generate a browsing plan for the given persona."""
     action_count = INTENSITY_MAP.get(noise_intensity, 35)
-    prompt = PLAN_PROMPT.format(
-        persona_json=json.dumps(persona_profile, indent=2),
-        action_count=action_count,
-        window_hours=window_hours,
+    persona_json = json.dumps(persona_profile, indent=2)
+    parts = max(1, min(window_hours, -(-action_count // CHUNK_ACTIONS)))
+    chunk_minutes = window_hours * 60 // parts
+
+    results = await asyncio.gather(
+        *(
+            _generate_chunk(persona_json, part, parts, count, window_hours / parts)
+            for part, count in enumerate(_split(action_count, parts))
+        ),
+        return_exceptions=True,
+    )
+    chunks = [(part, r) for part, r in enumerate(results) if isinstance(r, BrowsingPlanData)]
+    if not chunks:
+        raise results[0]
+    if len(chunks) < parts:
+        logger.warning("Plan generated with %d of %d chunks; dropping failed windows", len(chunks), parts)
+    if parts == 1:
+        return chunks[0][1]
+    return _merge_chunks(chunks, chunk_minutes)
+
+
+async def _recent_plans(db: AsyncSession, persona_id: str, limit: int) -> list[BrowsingPlan]:
+    result = await db.execute(
+        select(BrowsingPlan)
+        .where(BrowsingPlan.persona_id == persona_id)
+        .order_by(BrowsingPlan.created_at.desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+def _history(plans: list[BrowsingPlan]) -> list[BrowsingPlanData]:
+    history = []
+    for plan in plans:
+        try:
+            history.append(BrowsingPlanData.model_validate(plan.plan_data))
+        except ValidationError:
+            continue
+    return history
+
+
+async def create_plan_for_persona(
+    db: AsyncSession,
+    persona: Persona,
+    scheduled_for: datetime | None = None,
+    window_hours: int = 16,
+) -> BrowsingPlan:
+    """Generate a plan for ``persona`` and persist it, with its actions, as pending.
+
+    ``scheduled_for`` is when the plan's activity window opens (default: now).
+    The plan is derived from recent plans when possible and generated by the
+    LLM when there is no usable history or a fresh plan is due.
+    """
+    settings = get_settings().plans
+    profile = persona.profile
+    intensity = persona.noise_intensity
+
+    history: list[BrowsingPlanData] = []
+    if settings.derive:
+        # Look back far enough to see the last fresh plan, not just the history window
+        recent = await _recent_plans(db, persona.id, max(settings.history, settings.fresh_every))
+        streak = next((i for i, p in enumerate(recent) if p.source != "derived"), len(recent))
+        if streak < settings.fresh_every - 1:
+            history = _history(recent[: settings.history])
+
+    if history:
+        plan_data = derive_plan(
+            history, profile, INTENSITY_MAP.get(intensity, 35), window_hours=window_hours
+        )
+        source = "derived"
+    else:
+        await release_connection(db)
+        plan_data = await generate_plan(profile, noise_intensity=intensity, window_hours=window_hours)
+        source = "llm"
+
+    plan = BrowsingPlan(
+        persona_id=persona.id,
+        plan_data=plan_data.model_dump(),
+        scheduled_for=scheduled_for or datetime.now(timezone.utc),
+        source=source,
     )
-    data = await generate_json(prompt)
-    return BrowsingPlanData(**data)
+    db.add(plan)
+    await db.flush()
+    actions = expand_plan(plan, plan_data)
+    db.add_all(actions)
+    await record_planned(db, persona.user_id, actions)
+    await bump_plan_version(db, {persona.user_id})
+    await db.commit()
+    await db.refresh(plan)
+    return plan
@@ -0,0 +1,36 @@
+"""Per-user plan version counter backing conditional GET on /api/plans/next."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.persona import Persona
+from app.models.plan import BrowsingPlan
+from app.models.user import User
+
+
+async def bump_plan_version(db: AsyncSession, user_ids: set[str]) -> None:
+    """Invalidate cached /next responses for ``user_ids``.  Caller commits."""
+    if not user_ids:
+        return
+    await db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(plan_version=User.plan_version + 1, plans_changed_at=datetime.now(timezone.utc))
+    )
+
+
+async def bump_for_plans(db: AsyncSession, plan_ids: set[str]) -> None:
+    """Bump the owners of ``plan_ids``.  Caller commits."""
+    if not plan_ids:
+        return
+    result = await db.execute(
+        select(Persona.user_id)
+        .join(BrowsingPlan, BrowsingPlan.persona_id == Persona.id)
+        .where(BrowsingPlan.id.in_(plan_ids))
+        .distinct()
+    )
+    await bump_plan_version(db, set(result.scalars().all()))
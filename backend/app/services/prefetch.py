@@ -0,0 +1,73 @@
+"""Speculative background work when a persona is activated.
+
+Activating a persona used to leave the extension with nothing to do until
+someone generated a plan or the scheduler's next cycle came round.
+``prefetch_on_activation`` queues the persona's first plan as an ordinary
+``PlanJob`` and fills an initial noise buffer from its profile, both in the
+background, so the extension's next poll already finds work.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.models.job import PlanJob
+from app.models.persona import Persona
+from app.models.plan import BrowsingPlan
+from app.services.jobs import create_open_job, find_open_job, job_runner
+from app.services.scheduler import generate_browse_events, generate_search_events
+from app.services.usage import metered, usage_meter
+
+logger = logging.getLogger(__name__)
+
+
+async def prime_noise(persona_id: str, session_factory: async_sessionmaker[AsyncSession]) -> None:
+    """Generate one cycle's worth of search, browse and shop events for the persona."""
+    noise = get_settings().noise
+    async with session_factory() as db:
+        persona = await db.get(Persona, persona_id)
+        if persona is None or not persona.is_active or usage_meter.over_quota(persona.user_id):
+            return
+        summary = persona.summary
+        try:
+            with metered("noise_prefetch", persona.user_id, persona_id):
+                await generate_search_events(db, summary, noise.searches_per_cycle, persona_id)
+                await generate_browse_events(
+                    db, summary, noise.pages_per_cycle, noise.products_per_cycle, persona_id
+                )
+        except Exception:
+            logger.exception("Noise prefetch failed for persona %s", persona_id)
+
+
+async def prefetch_on_activation(
+    db: AsyncSession,
+    persona: Persona,
+    session_factory: async_sessionmaker[AsyncSession],
+) -> PlanJob | None:
+    """Queue the persona's first plan and a noise buffer; returns the plan job, if any.
+
+    No job is queued when the persona already has a pending plan or an
+    unfinished job, and nothing at all when its owner is over the daily LLM
+    token quota — the plan would spend tokens the quota has already refused.
+    """
+    persona_id, user_id = persona.id, persona.user_id
+    if usage_meter.over_quota(user_id):
+        return None
+    pending = await db.execute(
+        select(BrowsingPlan.id)
+        .where(BrowsingPlan.persona_id == persona_id, BrowsingPlan.executed == False)
+        .limit(1)
+    )
+    job = None
+    if pending.first() is None and await find_open_job(db, persona_id) is None:
+        job, created = await create_open_job(db, user_id, persona_id)
+        if created:
+            job_runner.submit(job.id, session_factory)
+        else:
+            job = None
+    job_runner.spawn(f"noise:{persona_id}", prime_noise(persona_id, session_factory))
+    return job
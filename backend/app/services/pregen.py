@@ -0,0 +1,153 @@
+"""Off-peak batch pre-generation of tomorrow's plans for every active persona.
+
+Runs once per UTC day from the scheduler during ``pregen.hour_utc``, and
+outside that hour too while the day's run is unfinished.  Active
+personas are streamed from the database in id-ordered pages and each page is
+generated concurrently, up to ``llm.max_concurrent`` at a time.  Progress
+(run day + last persona id) is checkpointed to ``scheduler_state`` after every
+page, and personas that already have a plan for their target window are
+skipped, so an interrupted run resumes where it stopped without duplicating
+LLM work.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import Settings
+from app.models.persona import Persona
+from app.models.plan import BrowsingPlan
+from app.models.scheduler_state import SchedulerState
+from app.services.plan_gen import create_plan_for_persona
+from app.services.usage import metered, usage_meter
+
+logger = logging.getLogger(__name__)
+
+STATE_ID = "pregen"
+
+
+def next_window(persona: Persona, now: datetime) -> tuple[datetime, int]:
+    """Start (UTC) and length in hours of the persona's active window tomorrow, local time."""
+    try:
+        tz = ZoneInfo(persona.timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = timezone.utc
+    day = now.astimezone(tz).date() + timedelta(days=1)
+    start = datetime.combine(day, time(hour=persona.active_hours_start), tzinfo=tz)
+    hours = (persona.active_hours_end - persona.active_hours_start) % 24 or 24
+    return start.astimezone(timezone.utc), hours
+
+
+async def _has_plan(db: AsyncSession, persona_id: str, start: datetime) -> bool:
+    result = await db.execute(
+        select(BrowsingPlan.id)
+        .where(
+            BrowsingPlan.persona_id == persona_id,
+            BrowsingPlan.scheduled_for >= start,
+            BrowsingPlan.scheduled_for < start + timedelta(days=1),
+        )
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def _pregenerate_one(
+    session_factory: async_sessionmaker[AsyncSession], persona_id: str, now: datetime
+) -> bool:
+    """Generate one persona's plan for tomorrow.  Returns False if skipped."""
+    async with session_factory() as db:
+        persona = await db.get(Persona, persona_id)
+        if persona is None or not persona.is_active:
+            return False
+        if usage_meter.over_quota(persona.user_id):
+            return False
+        start, hours = next_window(persona, now)
+        if await _has_plan(db, persona.id, start):
+            return False
+        with metered("pregen", persona.user_id, persona.id):
+            await create_plan_for_persona(db, persona, scheduled_for=start, window_hours=hours)
+        return True
+
+
+async def _load_state(session_factory: async_sessionmaker[AsyncSession]) -> dict:
+    async with session_factory() as db:
+        state = await db.get(SchedulerState, STATE_ID)
+        return json.loads(state.state) if state else {}
+
+
+async def _save_state(session_factory: async_sessionmaker[AsyncSession], data: dict) -> None:
+    async with session_factory() as db:
+        state = await db.get(SchedulerState, STATE_ID)
+        if state is None:
+            state = SchedulerState(id=STATE_ID)
+            db.add(state)
+        state.state = json.dumps(data)
+        await db.commit()
+
+
+async def run_unfinished(session_factory: async_sessionmaker[AsyncSession], now: datetime) -> bool:
+    """True when today's run was checkpointed but not completed, e.g. after a restart."""
+    state = await _load_state(session_factory)
+    return state.get("run") == now.date().isoformat() and not state.get("done")
+
+
+async def run_pregeneration(
+    session_factory: async_sessionmaker[AsyncSession],
+    settings: Settings,
+    now: datetime | None = None,
+) -> dict:
+    """Pre-generate tomorrow's plans for all active personas; resumes a partial run."""
+    now = now or datetime.now(timezone.utc)
+    run = now.date().isoformat()
+    state = await _load_state(session_factory)
+    if state.get("run") == run:
+        if state.get("done"):
+            return state
+        cursor, stats = state.get("cursor"), state["stats"]
+        logger.info("Resuming plan pre-generation for %s after persona %s", run, cursor)
+    else:
+        cursor, stats = None, {"generated": 0, "skipped": 0, "failed": 0}
+
+    limit = asyncio.Semaphore(max(1, settings.llm.max_concurrent))
+
+    async def guarded(persona_id: str) -> str:
+        async with limit:
+            try:
+                generated = await _pregenerate_one(session_factory, persona_id, now)
+                return "generated" if generated else "skipped"
+            except Exception:
+                logger.exception("Plan pre-generation failed for persona %s", persona_id)
+                return "failed"
+
+    while True:
+        query = (
+            select(Persona.id)
+            .where(Persona.is_active == True)
+            .order_by(Persona.id)
+            .limit(settings.pregen.page_size)
+        )
+        if cursor:
+            query = query.where(Persona.id > cursor)
+        async with session_factory() as db:
+            persona_ids = list((await db.execute(query)).scalars().all())
+        if not persona_ids:
+            break
+        for outcome in await asyncio.gather(*(guarded(pid) for pid in persona_ids)):
+            stats[outcome] += 1
+        cursor = persona_ids[-1]
+        await _save_state(session_factory, {"run": run, "cursor": cursor, "done": False, "stats": stats})
+
+    final = {"run": run, "cursor": cursor, "done": True, "stats": stats}
+    await _save_state(session_factory, final)
+    logger.info(
+        "Plan pre-generation for %s done: %d generated, %d skipped, %d failed",
+        run, stats["generated"], stats["skipped"], stats["failed"],
+    )
+    return final
@@ -0,0 +1,122 @@
+"""Short-lived cache of authenticated users, so auth skips the database.
+
+Every authenticated request used to verify its JWT and then load the user,
+or look the user up by API key; extension polls made that one query per
+poll.  ``get_current_user`` now keeps validated principals here for up to
+``auth.cache_ttl`` seconds, keyed by the JWT signature or the API key, in an
+LRU of ``auth.cache_size`` entries.  A cached JWT entry never outlives the
+token's own ``exp``.
+
+Entries hold a snapshot of the user's columns and each hit gets its own
+detached ``User`` built from it, so requests never share an ORM instance.
+A user's entries are dropped when the user row changes: any flushed ORM
+change (``is_active``, API key rotation, ...) invalidates them once at flush
+and again after the commit, so a request racing the commit cannot keep the
+old row cached.  Other processes only see the change when their entries
+expire, so fields that must be current everywhere (``plan_version`` for the
+/next ETag) are read from the database rather than the snapshot.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models.user import User
+
+_PENDING = "principal_cache_invalidate"
+
+
+class PrincipalCache:
+    def __init__(self) -> None:
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._keys_by_user: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> User | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, snapshot = entry
+        if time.monotonic() >= expires:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return User(**snapshot)
+
+    def put(self, key: str, user: User, expires_at: float | None = None) -> None:
+        """Cache ``user`` under ``key``; ``expires_at`` (epoch seconds) caps the TTL."""
+        cfg = get_settings().auth
+        if cfg.cache_ttl <= 0 or cfg.cache_size <= 0:
+            return
+        ttl = cfg.cache_ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, snapshot)
+        self._keys_by_user.setdefault(user.id, set()).add(key)
+        while len(self._entries) > cfg.cache_size:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1]["id"]
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def invalidate_users(self, user_ids: Iterable[str]) -> None:
+        for user_id in user_ids:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_on_commit(db: AsyncSession | Session, user_ids: Iterable[str]) -> None:
+    """Drop the users' cached principals now and again once ``db`` commits."""
+    user_ids = set(user_ids)
+    principal_cache.invalidate_users(user_ids)
+    db.info.setdefault(_PENDING, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _users_flushed(session: Session, flush_context) -> None:
+    changed = {
+        obj.id for obj in (*session.dirty, *session.deleted)
+        if isinstance(obj, User) and obj.id is not None
+    }
+    if changed:
+        invalidate_on_commit(session, changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        principal_cache.invalidate_users(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,162 @@
+"""Token-bucket rate limiting for LLM-backed endpoints.
+
+``/api/form-data``, persona creation and plan generation each cost an LLM
+call, and one misbehaving client looping on them could saturate the model
+for every tenant.  Each (endpoint class, principal) pair gets a token bucket:
+``burst`` tokens, refilled at ``per_minute`` tokens a minute, one spent per
+LLM-backed request.  Bulk persona creation has its own class and spends one
+token per persona; a request costing more than the whole burst can never be
+admitted, so it is refused outright with 422 (retrying won't help).  An
+empty bucket answers 429 with ``Retry-After`` set to when enough tokens will
+have arrived.
+
+Buckets live in a pluggable ``BucketStore``: ``MemoryBucketStore`` is
+per-process; ``SQLiteBucketStore`` keeps them in a small SQLite file
+(``rate_limit.sqlite_path``) so every worker process on the host draws from
+the same buckets.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from fastapi import HTTPException
+
+from app.config import BucketLimit, get_settings
+
+# Idle buckets are full again after burst / rate; the memory store forgets
+# the least recently used beyond this many.
+MEMORY_MAX_BUCKETS = 100_000
+
+
+def _refill(tokens: float, updated: float, now: float, limit: BucketLimit) -> float:
+    rate = limit.per_minute / 60
+    return min(float(limit.burst), tokens + max(0.0, now - updated) * rate)
+
+
+def _wait(tokens: float, cost: float, limit: BucketLimit) -> float:
+    """Seconds until ``tokens`` has grown to ``cost``."""
+    if limit.per_minute <= 0:
+        return math.inf
+    return (cost - tokens) / (limit.per_minute / 60)
+
+
+class BucketStore(Protocol):
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1.0) -> float:
+        """Spend ``cost`` tokens from ``key``'s bucket.
+
+        Returns 0 when they were spent, otherwise the seconds to wait (nothing
+        is spent then).
+        """
+        ...
+
+
+class MemoryBucketStore:
+    """Buckets in this process's memory."""
+
+    def __init__(self, max_buckets: int = MEMORY_MAX_BUCKETS):
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._max = max_buckets
+
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(limit.burst), now))
+        tokens = _refill(tokens, updated, now, limit)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = _wait(tokens, cost, limit)
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self._max:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBucketStore:
+    """Buckets in a SQLite file shared by every worker process on the host."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def _take(self, key: str, limit: BucketLimit, cost: float) -> float:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = _refill(*row, now, limit) if row else float(limit.burst)
+                wait = 0.0
+                if tokens >= cost:
+                    tokens -= cost
+                else:
+                    wait = _wait(tokens, cost, limit)
+                self._conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1.0) -> float:
+        return await asyncio.to_thread(self._take, key, limit, cost)
+
+
+_store: BucketStore | None = None
+
+
+def get_store() -> BucketStore:
+    global _store
+    if _store is None:
+        cfg = get_settings().rate_limit
+        _store = SQLiteBucketStore(cfg.sqlite_path) if cfg.store == "sqlite" else MemoryBucketStore()
+    return _store
+
+
+def set_store(store: BucketStore | None) -> None:
+    """Swap the bucket store (``None`` rebuilds it from settings on next use)."""
+    global _store
+    _store = store
+
+
+async def check_rate_limit(principal: str, endpoint_class: str, cost: float = 1.0) -> None:
+    """Spend from ``principal``'s bucket for ``endpoint_class`` or raise 429 with ``Retry-After``.
+
+    A ``cost`` above the bucket's burst raises 422: no wait would admit it.
+    """
+    cfg = get_settings().rate_limit
+    if not cfg.enabled:
+        return
+    limit: BucketLimit = getattr(cfg, endpoint_class)
+    if cost > limit.burst:
+        raise HTTPException(
+            422,
+            f"Request costs {cost:g} {endpoint_class.replace('_', '-')} tokens; "
+            f"at most {limit.burst} can be spent at once",
+        )
+    wait = await get_store().take(f"{endpoint_class}:{principal}", limit, cost)
+    if wait > 0:
+        retry_after = max(1, math.ceil(wait)) if math.isfinite(wait) else 3600
+        raise HTTPException(
+            429,
+            f"Rate limit exceeded for {endpoint_class.replace('_', '-')} requests",
+            headers={"Retry-After": str(retry_after)},
+        )
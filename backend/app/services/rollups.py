@@ -0,0 +1,60 @@
+"""Incrementally maintained activity rollups backing /api/analytics.
+
+Counters are bumped in the same transaction that creates plan actions or
+records their outcome, so analytics reads a handful of pre-aggregated rows
+instead of scanning every plan.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.rollup import ActivityRollup
+
+_COUNTERS = ("planned", "completed", "failed")
+
+
+def _day(moment: datetime) -> date:
+    return moment.date()
+
+
+async def _increment(
+    db: AsyncSession, user_id: str, counts: Counter, column: str
+) -> None:
+    """Upsert ``counts`` ((persona_id, day, action_type) -> n) into ``column``."""
+    if not counts:
+        return
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    rows = [
+        {
+            "persona_id": persona_id,
+            "day": day,
+            "action_type": action_type,
+            "user_id": user_id,
+            **{c: (n if c == column else 0) for c in _COUNTERS},
+        }
+        for (persona_id, day, action_type), n in counts.items()
+    ]
+    stmt = insert(ActivityRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["persona_id", "day", "action_type"],
+        set_={column: getattr(ActivityRollup, column) + getattr(stmt.excluded, column)},
+    )
+    await db.execute(stmt)
+
+
+async def record_planned(db: AsyncSession, user_id: str, actions) -> None:
+    """Count newly created PlanActions by due day and type.  Caller commits."""
+    counts = Counter((a.persona_id, _day(a.due_at), a.action_type) for a in actions)
+    await _increment(db, user_id, counts, "planned")
+
+
+async def record_outcomes(db: AsyncSession, user_id: str, rows, status: str) -> None:
+    """Count finished actions (rows with persona_id, due_at, action_type).  Caller commits."""
+    counts = Counter((r.persona_id, _day(r.due_at), r.action_type) for r in rows)
+    await _increment(db, user_id, counts, status)
@@ -1,10 +1,19 @@
 """Background noise scheduler — merged from daemon/phantom_engine/scheduler.py.
 
-Runs 4 async loops as FastAPI background tasks:
+Runs these async loops as FastAPI background tasks:
   - search loop: generates search queries via LLM
   - browsing loop: generates URLs + products via LLM
+    (both drop items the persona has already produced; see ``noise_dedupe``)
   - persona rotation loop: rotates persona periodically
-  - cleanup loop: removes delivered noise events
+  - cleanup loop: removes delivered noise events and expired idempotency keys
+  - pre-generation loop: builds tomorrow's plans during off-peak hours
+  - pool loop: keeps the persona warm pool stocked while the LLM is idle
+
+Counters, the current persona and each loop's next-due time are checkpointed
+to the ``scheduler_state`` table so a restart resumes the previous schedule
+(plus jitter) instead of firing every loop at once.  Checkpoints also flush
+LLM usage metering; personas of users over their daily token quota are
+skipped by the noise loops.
 """
 
 from __future__ import annotations
@@ -12,16 +21,27 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import random
+import time
+from collections import deque
 from datetime import datetime, timezone
 
-from sqlalchemy import delete, func, select
+from sqlalchemy import and_, delete, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import Settings
-from app.db import async_session
+from app.config import Settings, get_settings
+from app.db import async_session, read_session, release_connection
 from app.models.noise_event import NoiseEvent
 from app.models.persona import Persona
+from app.models.scheduler_state import SchedulerState
+from app.services import idempotency, persona_pool
+from app.services.demand import CyclePlan, DemandTracker, plan_cycle
+from app.services.diversity import diversity_index
 from app.services.llm import generate_json
+from app.services.noise_dedupe import noise_deduper
+from app.services.pregen import run_pregeneration, run_unfinished
+from app.services.usage import metered, usage_meter
+from app.services.timezones import local_hour
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +73,11 @@ Return ONLY a JSON object:
 }}
 """
 
+AVOID_NOTE = """
+Recently generated for this persona — do not repeat these or close variations:
+{items}
+"""
+
 FORM_DATA_PROMPT = """\
 Generate plausible fake form data for a fictional person.
 Current persona: {persona_summary}
@@ -73,6 +98,85 @@ Return ONLY a JSON object with these fields:
 """
 
 
+def _avoid_note(persona_id: str | None, *event_types: str) -> str:
+    """Prompt suffix listing the persona's recent items so the LLM doesn't repeat them."""
+    if persona_id is None or not get_settings().dedupe.enabled:
+        return ""
+    items = [i for t in event_types for i in noise_deduper.recent(persona_id, t)]
+    return AVOID_NOTE.format(items="\n".join(f"- {i}" for i in items)) if items else ""
+
+
+async def _dedupe(
+    db: AsyncSession, persona_id: str | None, batches: dict[str, list]
+) -> tuple[dict[str, list], int]:
+    """Drop items the persona has already produced (see ``noise_dedupe``); ``(kept, dropped)``."""
+    if persona_id is None or not get_settings().dedupe.enabled:
+        return batches, 0
+    kept = {t: noise_deduper.filter(persona_id, t, items) for t, items in batches.items()}
+    await noise_deduper.save(db, persona_id)
+    return kept, sum(len(items) - len(kept[t]) for t, items in batches.items())
+
+
+async def generate_search_events(
+    db: AsyncSession, summary: str, count: int, persona_id: str | None = None
+) -> tuple[int, int]:
+    """Ask the LLM for ``count`` search queries and queue the new ones as noise events.
+
+    With ``persona_id``, queries the persona has already searched for (or
+    something very close) are dropped instead of queued again.  Returns
+    ``(queued, dropped)``.
+    """
+    if persona_id is not None:
+        await noise_deduper.load(db, persona_id)
+    await release_connection(db)
+    queries = await generate_json(
+        SEARCH_PROMPT.format(persona_summary=summary, count=count) + _avoid_note(persona_id, "search")
+    )
+    if not isinstance(queries, list):
+        return 0, 0
+    kept, dropped = await _dedupe(db, persona_id, {"search": queries})
+    queries = kept["search"]
+    for q in queries:
+        db.add(NoiseEvent(persona_id=persona_id, event_type="search", payload={"query": q}))
+    await db.commit()
+    logger.info("Generated %d search queries", len(queries))
+    return len(queries), dropped
+
+
+async def generate_browse_events(
+    db: AsyncSession,
+    summary: str,
+    num_pages: int,
+    num_products: int,
+    persona_id: str | None = None,
+) -> tuple[int, int, int]:
+    """Ask the LLM for pages + products and queue the new ones as browse/shop events.
+
+    Returns ``(pages, products, dropped)``.
+    """
+    if persona_id is not None:
+        await noise_deduper.load(db, persona_id)
+    await release_connection(db)
+    data = await generate_json(
+        BROWSING_PROMPT.format(
+            persona_summary=summary, num_pages=num_pages, num_products=num_products
+        )
+        + _avoid_note(persona_id, "browse", "shop")
+    )
+    kept, dropped = await _dedupe(db, persona_id, {
+        "browse": data.get("urls_to_visit", []),
+        "shop": data.get("products_to_browse", []),
+    })
+    urls, products = kept["browse"], kept["shop"]
+    for url in urls:
+        db.add(NoiseEvent(persona_id=persona_id, event_type="browse", payload={"url": url}))
+    for product in products:
+        db.add(NoiseEvent(persona_id=persona_id, event_type="shop", payload={"product": product}))
+    await db.commit()
+    logger.info("Generated %d browse + %d shop events", len(urls), len(products))
+    return len(urls), len(products), dropped
+
+
 class PhantomScheduler:
     def __init__(self, settings: Settings):
         self.settings = settings
@@ -84,7 +188,18 @@ class PhantomScheduler:
             "pages_generated": 0,
             "products_generated": 0,
             "persona_rotations": 0,
+            "plans_pregenerated": 0,  # in the most recent nightly run
+            "noise_duplicates_dropped": 0,  # repeated queries/URLs/products not queued
         }
+        # loop name -> epoch seconds when it should next run
+        self._next_due: dict[str, float] = {}
+        self.demand = DemandTracker(settings.noise.demand_halflife_minutes)
+        # event type -> most recent adaptive sizing decision, for /api/status
+        self.cycle_plans: dict[str, dict] = {}
+        # personas picked most recently; the next pick should look unlike them
+        self._recent_personas: deque[str] = deque(maxlen=settings.diversity.scheduler_recent)
+        # last persona id of the previous candidate window; windows rotate by id
+        self._persona_cursor = ""
 
     @property
     def running(self) -> bool:
@@ -98,13 +213,23 @@ class PhantomScheduler:
         if not self.settings.scheduler.enabled:
             logger.info("Scheduler disabled via config")
             return
+        try:
+            async with async_session() as db:
+                await self.restore(db)
+        except Exception:
+            logger.exception("Could not restore scheduler checkpoint; starting cold")
         self._running = True
         self._tasks = [
             asyncio.create_task(self._search_loop()),
             asyncio.create_task(self._browsing_loop()),
             asyncio.create_task(self._persona_loop()),
             asyncio.create_task(self._cleanup_loop()),
+            asyncio.create_task(self._checkpoint_loop()),
         ]
+        if self.settings.pregen.enabled:
+            self._tasks.append(asyncio.create_task(self._pregen_loop()))
+        if self.settings.pool.enabled:
+            self._tasks.append(asyncio.create_task(self._pool_loop()))
         logger.info("Phantom scheduler started with %d loops", len(self._tasks))
 
     async def stop(self) -> None:
@@ -112,117 +237,245 @@ class PhantomScheduler:
         for task in self._tasks:
             task.cancel()
         self._tasks.clear()
+        try:
+            async with async_session() as db:
+                await self.checkpoint(db)
+        except Exception:
+            logger.exception("Could not write final scheduler checkpoint")
         logger.info("Phantom scheduler stopped")
 
-    async def get_queue_depth(self) -> int:
-        async with async_session() as db:
-            result = await db.execute(
-                select(func.count(NoiseEvent.id)).where(NoiseEvent.delivered == False)
+    # --- Checkpointing ---
+
+    def snapshot(self) -> dict:
+        """Serializable view of the state worth carrying across restarts."""
+        return {
+            "stats": dict(self.stats),
+            "current_persona": self._current_persona_summary,
+            "next_due": dict(self._next_due),
+            "demand": self.demand.snapshot(),
+        }
+
+    async def checkpoint(self, db: AsyncSession) -> None:
+        state = await db.get(SchedulerState, "default")
+        if state is None:
+            state = SchedulerState(id="default")
+            db.add(state)
+        state.state = json.dumps(self.snapshot())
+        await db.commit()
+
+    async def restore(self, db: AsyncSession) -> bool:
+        """Load the last checkpoint.  Returns False when there is none."""
+        state = await db.get(SchedulerState, "default")
+        if state is None:
+            return False
+        data = json.loads(state.state or "{}")
+        for key, value in data.get("stats", {}).items():
+            self.stats[key] = value
+        self._current_persona_summary = data.get("current_persona")
+        self._next_due = {k: float(v) for k, v in data.get("next_due", {}).items()}
+        self.demand.load(data.get("demand", {}))
+        logger.info("Restored scheduler checkpoint from %s", state.updated_at)
+        return True
+
+    def _initial_delay(self, loop_name: str) -> float:
+        """Seconds a loop waits before its first run: remaining time from the
+        checkpoint (zero on a cold start) plus random jitter."""
+        remaining = 0.0
+        due = self._next_due.get(loop_name)
+        if due is not None:
+            remaining = max(0.0, due - time.time())
+        return remaining + random.uniform(0, self.settings.scheduler.startup_jitter)
+
+    async def _sleep_until_next(self, loop_name: str, seconds: float) -> None:
+        self._next_due[loop_name] = time.time() + seconds
+        await asyncio.sleep(seconds)
+
+    async def _checkpoint_loop(self) -> None:
+        interval = self.settings.scheduler.checkpoint_interval
+        while self._running:
+            await asyncio.sleep(interval)
+            try:
+                async with async_session() as db:
+                    await self.checkpoint(db)
+            except Exception:
+                logger.exception("Error in checkpoint loop")
+
+    # --- Demand-adaptive sizing ---
+
+    def adaptive_state(self) -> dict:
+        return {
+            "enabled": self.settings.noise.adaptive,
+            "claim_rates_per_min": self.demand.snapshot()["rates"],
+            "cycles": dict(self.cycle_plans),
+        }
+
+    async def _plan_cycle(
+        self, db: AsyncSession, event_type: str, default_batch: int, base_interval: int
+    ) -> CyclePlan:
+        """Choose batch size + interval for ``event_type`` from measured demand."""
+        noise, sched = self.settings.noise, self.settings.scheduler
+        if not noise.adaptive:
+            return CyclePlan(batch=default_batch, interval_minutes=base_interval)
+        backlog = await db.execute(
+            select(func.count(NoiseEvent.id)).where(
+                NoiseEvent.event_type == event_type, NoiseEvent.delivered == False
             )
-            return result.scalar() or 0
+        )
+        plan = plan_cycle(
+            rate=self.demand.rate(event_type),
+            backlog=backlog.scalar() or 0,
+            default_batch=default_batch,
+            base_interval=base_interval,
+            min_batch=noise.min_per_cycle,
+            max_batch=noise.max_per_cycle,
+            min_interval=sched.min_interval,
+            max_interval=sched.max_interval,
+        )
+        self.cycle_plans[event_type] = {
+            "batch": plan.batch,
+            "interval_minutes": round(plan.interval_minutes, 2),
+        }
+        return plan
 
-    def _in_active_hours(self) -> bool:
-        hour = datetime.now(timezone.utc).hour
-        start = self.settings.scheduler.active_hours_start
-        end = self.settings.scheduler.active_hours_end
-        if start <= end:
-            return start <= hour < end
-        return hour >= start or hour < end  # handles overnight ranges
+    async def get_queue_depth(self, db: AsyncSession | None = None) -> int:
+        if db is None:
+            async with read_session() as db:
+                return await self.get_queue_depth(db)
+        result = await db.execute(
+            select(func.count(NoiseEvent.id)).where(NoiseEvent.delivered == False)
+        )
+        return result.scalar() or 0
 
-    async def _get_active_persona_summary(self, db: AsyncSession) -> str | None:
-        """Get a summary of an active persona for LLM prompts."""
+    async def _awake_clause(self, db: AsyncSession):
+        """SQL filter matching active personas whose local hour is inside their window.
+
+        Local hours are computed once per distinct timezone (a handful of
+        values) rather than per persona, and the window test runs in SQL
+        against the ``(is_active, timezone)`` index.  Returns None when no
+        timezone is currently awake.
+        """
         result = await db.execute(
-            select(Persona).where(Persona.is_active == True).limit(1)
+            select(Persona.timezone).where(Persona.is_active == True).distinct()
         )
-        persona = result.scalar_one_or_none()
-        if not persona:
+        now = datetime.now(timezone.utc)
+        clauses = []
+        for tz in result.scalars().all():
+            hour = local_hour(tz, now)
+            clauses.append(
+                and_(
+                    Persona.timezone == tz,
+                    or_(
+                        and_(
+                            Persona.active_hours_start <= Persona.active_hours_end,
+                            Persona.active_hours_start <= hour,
+                            Persona.active_hours_end > hour,
+                        ),
+                        and_(
+                            Persona.active_hours_start > Persona.active_hours_end,
+                            or_(Persona.active_hours_start <= hour, Persona.active_hours_end > hour),
+                        ),
+                    ),
+                )
+            )
+        return or_(*clauses) if clauses else None
+
+    async def _get_active_persona_summary(self, db: AsyncSession) -> str | None:
+        """Get a summary of an active persona inside its local active hours."""
+        picked = await self._pick_active_persona(db)
+        return picked[2] if picked else None
+
+    async def _pick_active_persona(self, db: AsyncSession) -> tuple[str, str, str] | None:
+        """``(id, user_id, summary)`` of an active persona inside its local active hours.
+
+        Candidates are a window of up to ``diversity.scheduler_candidates``
+        awake personas following the previous window in id order (wrapping
+        around), so every persona is reached however many are awake; among
+        them, picks the one least similar to those used recently, so
+        consecutive cycles spread noise across different interest profiles.
+        Personas of users over their daily LLM token quota are left out.
+        """
+        awake = await self._awake_clause(db)
+        if awake is None:
             return None
-        profile = json.loads(persona.profile) if persona.profile else {}
-        return (
-            f"{profile.get('name', persona.name)}, "
-            f"age {profile.get('age', '?')}, "
-            f"{profile.get('profession', '?')} from {profile.get('location', '?')}. "
-            f"Interests: {', '.join(profile.get('interests', [])[:5])}"
-        )
+        cfg = self.settings.diversity
+        limit = cfg.scheduler_candidates if cfg.enabled else 1
+        query = select(Persona.id, Persona.user_id, Persona.summary).where(Persona.is_active == True, awake)
+        over_quota = usage_meter.over_quota_users()
+        if over_quota:
+            query = query.where(Persona.user_id.notin_(over_quota))
+        query = query.order_by(Persona.id).limit(limit)
+        result = await db.execute(query.where(Persona.id > self._persona_cursor))
+        window = result.all()
+        if not window and self._persona_cursor:
+            window = (await db.execute(query)).all()
+        if not window:
+            return None
+        self._persona_cursor = window[-1][0]
+        rows = {persona_id: (user_id, summary) for persona_id, user_id, summary in window}
+        picked = next(iter(rows))
+        if cfg.enabled:
+            picked = diversity_index.most_diverse(list(rows), list(self._recent_personas)) or picked
+            self._recent_personas.append(picked)
+        return picked, *rows[picked]
 
     async def _search_loop(self) -> None:
         cfg = self.settings
         interval = cfg.scheduler.search_interval * 60
+        await asyncio.sleep(self._initial_delay("search"))
         while self._running:
             try:
-                if not self._in_active_hours():
-                    await asyncio.sleep(60)
-                    continue
                 async with async_session() as db:
-                    summary = await self._get_active_persona_summary(db)
-                    if not summary:
-                        await asyncio.sleep(60)
+                    picked = await self._pick_active_persona(db)
+                    if not picked:
+                        await self._sleep_until_next("search", 60)
                         continue
+                    persona_id, user_id, summary = picked
                     self._current_persona_summary = summary
-                    prompt = SEARCH_PROMPT.format(
-                        persona_summary=summary,
-                        count=cfg.noise.searches_per_cycle,
+                    cycle = await self._plan_cycle(
+                        db, "search", cfg.noise.searches_per_cycle, cfg.scheduler.search_interval
                     )
-                    queries = await generate_json(prompt)
-                    if isinstance(queries, list):
-                        for q in queries:
-                            event = NoiseEvent(
-                                event_type="search",
-                                payload=json.dumps({"query": q}),
-                            )
-                            db.add(event)
-                            self.stats["searches_generated"] += 1
-                        await db.commit()
-                        logger.info("Generated %d search queries", len(queries))
+                    interval = cycle.interval_minutes * 60
+                    with metered("noise_search", user_id, persona_id):
+                        count, dropped = await generate_search_events(db, summary, cycle.batch, persona_id)
+                    self.stats["searches_generated"] += count
+                    self.stats["noise_duplicates_dropped"] += dropped
             except Exception:
                 logger.exception("Error in search loop")
-            await asyncio.sleep(interval)
+            await self._sleep_until_next("search", interval)
 
     async def _browsing_loop(self) -> None:
         cfg = self.settings
         interval = cfg.scheduler.browsing_interval * 60
+        await asyncio.sleep(self._initial_delay("browsing"))
         while self._running:
             try:
-                if not self._in_active_hours():
-                    await asyncio.sleep(60)
-                    continue
                 async with async_session() as db:
-                    summary = await self._get_active_persona_summary(db)
-                    if not summary:
-                        await asyncio.sleep(60)
+                    picked = await self._pick_active_persona(db)
+                    if not picked:
+                        await self._sleep_until_next("browsing", 60)
                         continue
-                    prompt = BROWSING_PROMPT.format(
-                        persona_summary=summary,
-                        num_pages=cfg.noise.pages_per_cycle,
-                        num_products=cfg.noise.products_per_cycle,
+                    persona_id, user_id, summary = picked
+                    pages = await self._plan_cycle(
+                        db, "browse", cfg.noise.pages_per_cycle, cfg.scheduler.browsing_interval
                     )
-                    data = await generate_json(prompt)
-                    for url in data.get("urls_to_visit", []):
-                        event = NoiseEvent(
-                            event_type="browse",
-                            payload=json.dumps({"url": url}),
-                        )
-                        db.add(event)
-                        self.stats["pages_generated"] += 1
-                    for product in data.get("products_to_browse", []):
-                        event = NoiseEvent(
-                            event_type="shop",
-                            payload=json.dumps({"product": product}),
-                        )
-                        db.add(event)
-                        self.stats["products_generated"] += 1
-                    await db.commit()
-                    logger.info(
-                        "Generated %d browse + %d shop events",
-                        len(data.get("urls_to_visit", [])),
-                        len(data.get("products_to_browse", [])),
+                    products = await self._plan_cycle(
+                        db, "shop", cfg.noise.products_per_cycle, cfg.scheduler.browsing_interval
                     )
+                    interval = min(pages.interval_minutes, products.interval_minutes) * 60
+                    with metered("noise_browse", user_id, persona_id):
+                        n_pages, n_products, dropped = await generate_browse_events(
+                            db, summary, pages.batch, products.batch, persona_id
+                        )
+                    self.stats["pages_generated"] += n_pages
+                    self.stats["products_generated"] += n_products
+                    self.stats["noise_duplicates_dropped"] += dropped
             except Exception:
                 logger.exception("Error in browsing loop")
-            await asyncio.sleep(interval)
+            await self._sleep_until_next("browsing", interval)
 
     async def _persona_loop(self) -> None:
         rotation_seconds = self.settings.noise.persona_rotation_hours * 3600
+        await asyncio.sleep(self._initial_delay("persona"))
         while self._running:
             try:
                 async with async_session() as db:
@@ -232,16 +485,17 @@ class PhantomScheduler:
                         self.stats["persona_rotations"] += 1
                         event = NoiseEvent(
                             event_type="persona_rotate",
-                            payload=json.dumps({"persona": summary}),
+                            payload={"persona": summary},
                         )
                         db.add(event)
                         await db.commit()
                         logger.info("Persona rotation: %s", summary[:60])
             except Exception:
                 logger.exception("Error in persona loop")
-            await asyncio.sleep(rotation_seconds)
+            await self._sleep_until_next("persona", rotation_seconds)
 
     async def _cleanup_loop(self) -> None:
+        await asyncio.sleep(self._initial_delay("cleanup"))
         while self._running:
             try:
                 async with async_session() as db:
@@ -252,9 +506,40 @@ class PhantomScheduler:
                     await db.commit()
                     if count:
                         logger.info("Cleaned up %d delivered noise events", count)
+                    expired = await idempotency.purge_expired(db)
+                    if expired:
+                        logger.info("Purged %d expired idempotency keys", expired)
             except Exception:
                 logger.exception("Error in cleanup loop")
-            await asyncio.sleep(300)
+            await self._sleep_until_next("cleanup", 300)
+
+    async def _pregen_due(self, now: datetime) -> bool:
+        """During ``pregen.hour_utc``, or any time today's run was interrupted."""
+        return now.hour == self.settings.pregen.hour_utc or await run_unfinished(async_session, now)
+
+    async def _pregen_loop(self) -> None:
+        await asyncio.sleep(self._initial_delay("pregen"))
+        while self._running:
+            try:
+                if await self._pregen_due(datetime.now(timezone.utc)):
+                    result = await run_pregeneration(async_session, self.settings)
+                    self.stats["plans_pregenerated"] = result["stats"]["generated"]
+            except Exception:
+                logger.exception("Error in pre-generation loop")
+            await self._sleep_until_next("pregen", 600)
+
+    async def _pool_loop(self) -> None:
+        await asyncio.sleep(self._initial_delay("pool"))
+        while self._running:
+            try:
+                async with async_session() as db:
+                    with metered("pool"):
+                        added = await persona_pool.refill(db, self.settings)
+                    if added:
+                        logger.info("Added %d profiles to the persona pool", added)
+            except Exception:
+                logger.exception("Error in persona pool loop")
+            await self._sleep_until_next("pool", self.settings.pool.refill_interval)
 
 
 async def generate_form_data(persona_summary: str) -> dict:
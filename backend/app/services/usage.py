@@ -0,0 +1,177 @@
+"""LLM usage metering and per-user daily token quotas.
+
+Every call through ``llm.generate`` is recorded with its prompt and
+completion tokens (as reported by the provider; estimated at ~4 characters
+a token when it doesn't say) and wall-clock time, attributed to whatever
+``metered(task, user_id, persona_id)`` block it runs in.  The block is a
+context variable, so tasks spawned inside it inherit it.
+
+Counts accumulate in memory and are flushed to ``llm_usage_rollups`` every
+``usage.flush_interval`` seconds by the meter's own background task (started
+from the app lifespan, so it runs whether or not this worker runs the
+scheduler), where they back ``/api/analytics/usage``.
+Each flush also reloads today's per-user totals from the table so every
+worker sees the same quota picture.  Users past ``usage.daily_token_quota``
+have their background generation (noise cycles, nightly pre-generation,
+activation prefetch) skipped until the next UTC day; interactive endpoints
+stay available and are bounded by the rate limiter instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.models.llm_usage import LLMUsageRollup
+
+logger = logging.getLogger(__name__)
+
+_COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "wall_ms")
+
+
+@dataclass(frozen=True)
+class UsageScope:
+    task: str
+    user_id: str | None = None
+    persona_id: str | None = None
+
+
+_scope: ContextVar[UsageScope | None] = ContextVar("llm_usage_scope", default=None)
+
+
+@contextmanager
+def metered(task: str, user_id: str | None = None, persona_id: str | None = None):
+    """Attribute LLM calls made inside the block to ``task`` / user / persona."""
+    token = _scope.set(UsageScope(task, user_id, persona_id))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class UsageMeter:
+    def __init__(self) -> None:
+        # (user_id, day, persona_id, task) -> counters not yet written
+        self._pending: dict[tuple[str, date, str, str], list[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        self._day = _today()
+        self._used: dict[str, int] = {}  # user_id -> tokens used today (flushed + pending)
+        self._task: asyncio.Task | None = None
+
+    def record(self, prompt_tokens: int, completion_tokens: int, wall_ms: int) -> None:
+        """Count one LLM call against the current ``metered`` scope."""
+        scope = _scope.get() or UsageScope("other")
+        day = _today()
+        if day != self._day:
+            self._day, self._used = day, {}
+        user_id = scope.user_id or ""
+        counters = self._pending[(user_id, day, scope.persona_id or "", scope.task)]
+        for i, n in enumerate((1, prompt_tokens, completion_tokens, wall_ms)):
+            counters[i] += n
+        self._used[user_id] = self._used.get(user_id, 0) + prompt_tokens + completion_tokens
+
+    def used_today(self, user_id: str) -> int:
+        return self._used.get(user_id, 0) if self._day == _today() else 0
+
+    def over_quota(self, user_id: str) -> bool:
+        quota = get_settings().usage.daily_token_quota
+        return bool(quota) and bool(user_id) and self.used_today(user_id) >= quota
+
+    def over_quota_users(self) -> set[str]:
+        quota = get_settings().usage.daily_token_quota
+        if not quota or self._day != _today():
+            return set()
+        return {u for u, used in self._used.items() if u and used >= quota}
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Write pending counters to the rollup table and reload today's totals."""
+        pending, self._pending = self._pending, defaultdict(lambda: [0, 0, 0, 0])
+        if pending:
+            dialect = db.get_bind().dialect.name
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            rows = [
+                {"user_id": u, "day": d, "persona_id": p, "task": t, **dict(zip(_COUNTERS, counters))}
+                for (u, d, p, t), counters in pending.items()
+            ]
+            stmt = insert(LLMUsageRollup).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "day", "persona_id", "task"],
+                set_={c: getattr(LLMUsageRollup, c) + getattr(stmt.excluded, c) for c in _COUNTERS},
+            )
+            try:
+                await db.execute(stmt)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                for key, counters in pending.items():  # keep them for the next flush
+                    mine = self._pending[key]
+                    for i, n in enumerate(counters):
+                        mine[i] += n
+                raise
+        await self.refresh(db)
+        return len(pending)
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """Reload today's per-user token totals (plus anything still pending)."""
+        day = _today()
+        result = await db.execute(
+            select(
+                LLMUsageRollup.user_id,
+                func.sum(LLMUsageRollup.prompt_tokens + LLMUsageRollup.completion_tokens),
+            )
+            .where(LLMUsageRollup.day == day)
+            .group_by(LLMUsageRollup.user_id)
+        )
+        used = {user_id: int(total or 0) for user_id, total in result.all()}
+        for (user_id, d, _, _), counters in self._pending.items():
+            if d == day:
+                used[user_id] = used.get(user_id, 0) + counters[1] + counters[2]
+        self._day, self._used = day, used
+
+    async def start(self, session_factory: async_sessionmaker[AsyncSession], interval: float) -> None:
+        """Reload today's totals, then flush every ``interval`` seconds in the background."""
+        async with session_factory() as db:
+            await self.refresh(db)  # today's totals, so quotas hold across restarts
+        self._task = asyncio.create_task(self._flush_loop(session_factory, interval))
+
+    async def stop(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """Stop the flush loop and write whatever is still pending."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            async with session_factory() as db:
+                await self.flush(db)
+        except Exception:
+            logger.exception("Could not write final LLM usage rollups")
+
+    async def _flush_loop(self, session_factory: async_sessionmaker[AsyncSession], interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as db:
+                    await self.flush(db)
+            except Exception:
+                logger.exception("Error flushing LLM usage")
+
+
+usage_meter = UsageMeter()
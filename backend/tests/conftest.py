@@ -9,8 +9,12 @@ import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.db import Base, get_db
+from app.config import Settings, get_settings
+from app.db import Base, get_db, get_read_db, get_read_sessionmaker, get_sessionmaker, make_engine
 from app.main import app
+from app.services.persona_cache import profile_cache
+from app.services.principal_cache import principal_cache
+from app.services.rate_limit import set_store
 
 # In-memory SQLite for tests
 TEST_DATABASE_URL = "sqlite+aiosqlite://"
@@ -23,9 +27,46 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def no_activation_prefetch():
+    """Tests drive plan generation explicitly; opt back in where prefetch is tested."""
+    plans = get_settings().plans
+    plans.prefetch_on_activate = False
+    yield plans
+    plans.prefetch_on_activate = True
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cheap_password_hashing():
+    """Production KDF cost would add ~50 ms to every register/login."""
+    passwords = get_settings().passwords
+    passwords.scrypt_n = 2**4
+    yield passwords
+    passwords.scrypt_n = 2**14
+
+
+@pytest.fixture(autouse=True)
+def no_duplicate_rejection():
+    """Mocked LLM profiles are all identical; opt back in where dedupe is tested."""
+    diversity = get_settings().diversity
+    diversity.reject_duplicates = False
+    yield diversity
+    diversity.reject_duplicates = True
+
+
 @pytest_asyncio.fixture
-async def db_engine():
-    engine = create_async_engine(TEST_DATABASE_URL, echo=False)
+async def db_engine(request, tmp_path):
+    """In-memory by default: every session shares one connection.
+
+    Parametrize indirectly with ``"file"`` for a SQLite file where each
+    session opens its own connection, so concurrent background tasks don't
+    interleave on one transaction.
+    """
+    if getattr(request, "param", None) == "file":
+        settings = Settings(database_url=f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", db={"sqlite_readers": 0})
+        engine = make_engine(settings)
+    else:
+        engine = create_async_engine(TEST_DATABASE_URL, echo=False)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield engine
@@ -51,12 +92,18 @@ async def client(db_engine):
             yield session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_sessionmaker] = lambda: session_factory
+    app.dependency_overrides[get_read_sessionmaker] = lambda: session_factory
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
 
     app.dependency_overrides.clear()
+    principal_cache.clear()  # each test starts from a fresh database
+    profile_cache.clear()
+    set_store(None)  # ...and full rate-limit buckets
 
 
 @pytest_asyncio.fixture
@@ -1,6 +1,20 @@
 """Tests for authentication — registration, login, token, API key."""
 
+import hashlib
+from unittest.mock import patch
+
 import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import PasswordSettings, Settings
+from app.db import Base, get_db, make_engine
+from app.main import app
+from app.models.user import User
+from app.services import passwords
+from app.services.auth import create_access_token, decode_access_token, decode_access_token_claims
+from app.services.passwords import hash_password, needs_rehash, verify_password
+from app.services.principal_cache import principal_cache
 
 
 @pytest.mark.asyncio
@@ -56,6 +70,14 @@ async def test_login_wrong_password(client):
     assert resp.status_code == 401
 
 
+@pytest.mark.asyncio
+async def test_login_unknown_email_still_runs_kdf(client):
+    with patch.object(passwords, "_derive", wraps=passwords._derive) as derive:
+        resp = await client.post("/api/auth/login", json={"email": "nobody@phantom.dev", "password": "x"})
+    assert resp.status_code == 401
+    assert derive.call_count >= 1
+
+
 @pytest.mark.asyncio
 async def test_me_endpoint(client, auth_headers):
     resp = await client.get("/api/auth/me", headers=auth_headers)
@@ -87,3 +109,120 @@ async def test_token_refresh(client, auth_headers):
     resp = await client.post("/api/auth/refresh", headers=auth_headers)
     assert resp.status_code == 200
     assert "access_token" in resp.json()
+
+
+@pytest.mark.asyncio
+async def test_cached_principal_skips_db(client, auth_headers):
+    assert (await client.get("/api/auth/me", headers=auth_headers)).status_code == 200
+    assert len(principal_cache) == 1
+    with patch("sqlalchemy.ext.asyncio.AsyncSession.get", side_effect=AssertionError("db hit")):
+        resp = await client.get("/api/auth/me", headers=auth_headers)
+    assert resp.status_code == 200
+    assert resp.json()["email"] == "test@phantom.dev"
+
+
+@pytest.mark.asyncio
+async def test_rotated_api_key_stops_working(client, auth_headers):
+    old_key = (await client.get("/api/auth/me", headers=auth_headers)).json()["api_key"]
+    assert (await client.get("/api/auth/me", headers={"X-API-Key": old_key})).status_code == 200
+
+    resp = await client.post("/api/auth/api-key", headers=auth_headers)
+    assert resp.status_code == 200
+    new_key = resp.json()["api_key"]
+    assert new_key != old_key
+    assert (await client.get("/api/auth/me", headers={"X-API-Key": old_key})).status_code == 401
+    me = await client.get("/api/auth/me", headers={"X-API-Key": new_key})
+    assert me.json()["api_key"] == new_key
+
+
+@pytest.mark.asyncio
+async def test_deactivated_user_loses_cached_access(client, auth_headers, db_engine):
+    me = await client.get("/api/auth/me", headers=auth_headers)
+    async with AsyncSession(db_engine) as db:
+        user = await db.get(User, me.json()["id"])
+        user.is_active = False
+        await db.commit()
+    assert (await client.get("/api/auth/me", headers=auth_headers)).status_code == 401
+
+
+def test_token_roundtrip_and_tampering():
+    token = create_access_token("user-1")
+    assert decode_access_token(token) == "user-1"
+    assert decode_access_token_claims(token)["exp"] > 0
+    header, payload, signature = token.split(".")
+    forged = create_access_token("user-2").split(".")[1]
+    assert decode_access_token(f"{header}.{forged}.{signature}") is None
+
+
+def test_password_formats():
+    scrypt = PasswordSettings(scrypt_n=2**4)
+    hashed = hash_password("hunter22", scrypt)
+    assert hashed.startswith("$scrypt$v=1$n=16,r=8,p=1$")
+    assert verify_password("hunter22", hashed)
+    assert not verify_password("hunter23", hashed)
+    assert not needs_rehash(hashed, scrypt)
+    assert needs_rehash(hashed, PasswordSettings(scrypt_n=2**5))
+
+    pbkdf2 = PasswordSettings(algorithm="pbkdf2", pbkdf2_iterations=1000)
+    hashed = hash_password("hunter22", pbkdf2)
+    assert hashed.startswith("$pbkdf2-sha256$v=1$i=1000$")
+    assert verify_password("hunter22", hashed)
+    assert needs_rehash(hashed, scrypt)
+
+    assert not verify_password("hunter22", "$scrypt$garbage")
+    assert not verify_password("hunter22", "$scrypt$v=1$x=16$c2FsdA$a2V5")  # missing parameters
+
+
+@pytest.mark.asyncio
+async def test_login_upgrades_legacy_hash(client, db_engine):
+    reg = await client.post("/api/auth/register", json={"email": "old@phantom.dev", "password": "oldpass"})
+    salt = "ab" * 16
+    legacy = f"{salt}${hashlib.sha256((salt + 'oldpass').encode()).hexdigest()}"
+    async with AsyncSession(db_engine) as db:
+        user = await db.get(User, reg.json()["id"])
+        user.hashed_password = legacy
+        await db.commit()
+
+    login = {"email": "old@phantom.dev", "password": "oldpass"}
+    assert (await client.post("/api/auth/login", json=login)).status_code == 200
+    async with AsyncSession(db_engine) as db:
+        upgraded = (await db.get(User, reg.json()["id"])).hashed_password
+    assert upgraded.startswith("$scrypt$v=1$")
+    assert (await client.post("/api/auth/login", json=login)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_kdf_runs_without_holding_the_writer_connection(client, tmp_path):
+    # On SQLite files every writer shares one pooled connection
+    writer = make_engine(Settings(database_url=f"sqlite+aiosqlite:///{tmp_path / 'auth.db'}", db={"pool_timeout": 1}))
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(writer, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    def other_writer(kdf):
+        async def run(*args):
+            # Times out if the request still holds the writer connection
+            async with writer.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return await kdf(*args)
+        return run
+
+    try:
+        with (
+            patch("app.routers.auth.hash_password_async", other_writer(passwords.hash_password_async)),
+            patch("app.routers.auth.verify_password_async", other_writer(passwords.verify_password_async)),
+            patch("app.routers.auth.verify_dummy_async", other_writer(passwords.verify_dummy_async)),
+        ):
+            body = {"email": "pool@phantom.dev", "password": "pw"}
+            assert (await client.post("/api/auth/register", json=body)).status_code == 201
+            assert (await client.post("/api/auth/login", json=body)).status_code == 200
+            unknown = {"email": "nobody@phantom.dev", "password": "pw"}
+            assert (await client.post("/api/auth/login", json=unknown)).status_code == 401
+    finally:
+        await writer.dispose()
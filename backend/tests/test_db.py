@@ -0,0 +1,106 @@
+"""Tests for engine configuration and the database copy command."""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import Settings
+from app.db import Base, engine_options, make_engine, split_reads
+from app.migrate_data import migrate
+from app.models.persona import Persona
+from app.models.user import User
+
+
+def test_engine_options_pools_postgres_and_sqlite_files():
+    assert engine_options(Settings(database_url="sqlite+aiosqlite://")) == {}
+
+    opts = engine_options(Settings(
+        database_url="postgresql+asyncpg://u:p@db/phantom",
+        db={"pool_size": 5, "statement_cache_size": 0},
+    ))
+    assert opts["pool_size"] == 5
+    assert opts["pool_pre_ping"] is True
+    assert opts["connect_args"] == {"prepared_statement_cache_size": 0}
+
+    settings = Settings(database_url="sqlite+aiosqlite:///./x.db", db={"sqlite_readers": 4})
+    assert split_reads(settings)
+    assert engine_options(settings)["pool_size"] == 1
+    assert engine_options(settings)["max_overflow"] == 0
+    assert engine_options(settings, read_only=True)["pool_size"] == 4
+    single = Settings(database_url="sqlite+aiosqlite:///./x.db", db={"sqlite_readers": 0})
+    assert not split_reads(single)
+    assert engine_options(single) == {}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_engines_apply_pragmas_and_reader_is_read_only(tmp_path):
+    settings = Settings(database_url=f"sqlite+aiosqlite:///{tmp_path / 'perf.db'}")
+    writer, reader = make_engine(settings), make_engine(settings, read_only=True)
+    try:
+        async with writer.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            assert (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar() == "wal"
+            assert (await conn.exec_driver_sql("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar() == 5000
+            await conn.execute(insert(User.__table__), [
+                {"id": "u1", "email": "a@example.com", "hashed_password": "x", "api_key": "k1"},
+            ])
+
+        async with writer.connect() as write_conn:
+            # An open write transaction doesn't block readers under WAL
+            await write_conn.execute(insert(User.__table__), [
+                {"id": "u2", "email": "b@example.com", "hashed_password": "x", "api_key": "k2"},
+            ])
+            async with reader.connect() as conn:
+                assert (await conn.exec_driver_sql("PRAGMA query_only")).scalar() == 1
+                emails = (await conn.execute(select(User.email))).scalars().all()
+                assert emails == ["a@example.com"]
+                with pytest.raises(Exception, match="readonly"):
+                    await conn.execute(insert(User.__table__), [
+                        {"id": "u3", "email": "c@example.com", "hashed_password": "x", "api_key": "k3"},
+                    ])
+            await write_conn.commit()
+    finally:
+        await writer.dispose()
+        await reader.dispose()
+
+
+async def _create(url):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_migrate_copies_rows_and_refuses_non_empty_target(tmp_path):
+    source_url = f"sqlite+aiosqlite:///{tmp_path / 'source.db'}"
+    target_url = f"sqlite+aiosqlite:///{tmp_path / 'target.db'}"
+    source, target = await _create(source_url), await _create(target_url)
+    created = datetime(2024, 5, 1, 12, 0)
+    async with source.begin() as conn:
+        await conn.execute(insert(User.__table__), [
+            {"id": "u1", "email": "a@example.com", "hashed_password": "x", "api_key": "k1", "created_at": created},
+        ])
+        await conn.execute(insert(Persona.__table__), [
+            {"id": f"p{i}", "user_id": "u1", "name": f"P{i}", "wizard_answers": {}, "profile": {"i": i}} for i in range(3)
+        ])
+
+    copied = await migrate(source_url, target_url)
+    assert copied["users"] == 1
+    assert copied["personas"] == 3
+
+    async with target.connect() as conn:
+        profiles = (await conn.execute(select(Persona.profile).order_by(Persona.id))).scalars().all()
+        assert profiles == [{"i": 0}, {"i": 1}, {"i": 2}]
+        assert (await conn.execute(text("SELECT created_at FROM users"))).scalar_one().startswith("2024-05-01 12:00")
+
+    with pytest.raises(SystemExit):
+        await migrate(source_url, target_url)
+    copied = await migrate(source_url, target_url, truncate=True)
+    assert copied["personas"] == 3
+
+    await source.dispose()
+    await target.dispose()
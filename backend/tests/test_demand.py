@@ -0,0 +1,86 @@
+"""Tests for demand tracking and adaptive cycle sizing."""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.config import Settings
+from app.main import app
+from app.models.noise_event import NoiseEvent
+from app.services.demand import DemandTracker, plan_cycle
+from app.services.scheduler import PhantomScheduler
+
+BOUNDS = dict(min_batch=1, max_batch=20, min_interval=5, max_interval=60)
+
+
+def test_plan_cycle_uses_static_settings_without_data():
+    plan = plan_cycle(rate=None, backlog=0, default_batch=5, base_interval=10, **BOUNDS)
+    assert (plan.batch, plan.interval_minutes) == (5, 10)
+
+
+def test_plan_cycle_matches_demand():
+    # 0.8 claims/min over a 10 min interval, 2 already queued -> 6
+    plan = plan_cycle(rate=0.8, backlog=2, default_batch=5, base_interval=10, **BOUNDS)
+    assert (plan.batch, plan.interval_minutes) == (6, 10)
+
+
+def test_plan_cycle_high_demand_shortens_interval():
+    plan = plan_cycle(rate=3.0, backlog=0, default_batch=5, base_interval=10, **BOUNDS)
+    assert plan.batch == 20
+    assert plan.interval_minutes == pytest.approx(20 / 3)
+
+
+def test_plan_cycle_idle_demand_stretches_interval():
+    plan = plan_cycle(rate=0.0, backlog=0, default_batch=5, base_interval=10, **BOUNDS)
+    assert (plan.batch, plan.interval_minutes) == (1, 60)
+    plan = plan_cycle(rate=0.05, backlog=1, default_batch=5, base_interval=10, **BOUNDS)
+    assert plan.batch == 1
+    assert plan.interval_minutes == pytest.approx(40)
+
+
+def test_tracker_rate():
+    with patch("app.services.demand.time.time", return_value=0.0):
+        tracker = DemandTracker(halflife_minutes=30)
+        assert tracker.rate("search") is None
+        tracker.record_claim("search", 10)
+    with patch("app.services.demand.time.time", return_value=600.0):
+        assert tracker.rate("search") == pytest.approx(1.0)  # 10 over 10 min
+    with patch("app.services.demand.time.time", return_value=1200.0):
+        # No claims in the next 10 min decays the estimate toward zero
+        assert 0 < tracker.rate("search") < 1.0
+
+
+def test_tracker_first_burst_does_not_spike():
+    with patch("app.services.demand.time.time", return_value=0.0):
+        tracker = DemandTracker(halflife_minutes=30)
+    with patch("app.services.demand.time.time", return_value=10.0):
+        tracker.record_claim("search", 10)
+    with patch("app.services.demand.time.time", return_value=11.0):
+        assert tracker.rate("search") is None  # window too short to fold yet
+    with patch("app.services.demand.time.time", return_value=3000.0):
+        tracker.record_claim("browse", 10)
+    with patch("app.services.demand.time.time", return_value=3001.0):
+        # Spread over the tracker's lifetime, not the one second since the claim
+        assert tracker.rate("browse") == pytest.approx(10 / (3001 / 60))
+
+
+@pytest.mark.asyncio
+async def test_noise_claims_feed_tracker(client, db_session):
+    db_session.add_all([
+        NoiseEvent(event_type="search", payload={"query": "q1"}),
+        NoiseEvent(event_type="search", payload={"query": "q2"}),
+        NoiseEvent(event_type="browse", payload={"url": "https://a.com"}),
+    ])
+    await db_session.commit()
+
+    scheduler = PhantomScheduler(Settings())
+    app.state.scheduler = scheduler
+    try:
+        resp = await client.get("/api/noise")
+        assert len(resp.json()) == 3
+        assert scheduler.demand._pending == {"search": 2, "browse": 1}
+
+        status = await client.get("/api/status")
+        assert status.json()["adaptive"]["enabled"] is True
+    finally:
+        del app.state.scheduler
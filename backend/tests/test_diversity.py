@@ -0,0 +1,162 @@
+"""Tests for the persona diversity index and near-duplicate rejection."""
+
+import time
+
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.persona import Persona
+from app.services.diversity import PersonaIndex, vectorize
+from app.services.persona_gen import DISTINCT_NOTE
+from tests.conftest import MOCK_PERSONA_PROFILE
+
+ANSWERS = {
+    "interests": ["outdoors", "tech"],
+    "age_range": "25-34",
+    "location": "Colorado",
+    "profession": "designer",
+    "shopping_style": "budget",
+    "noise_intensity": "moderate",
+}
+
+GAMER = {
+    **MOCK_PERSONA_PROFILE,
+    "name": "Sam Lee",
+    "profession": "Line Cook",
+    "interests": ["video games", "anime", "esports", "mechanical keyboards"],
+    "search_topics": ["elden ring build guide", "best gaming mouse"],
+    "favorite_sites": ["https://twitch.tv", "https://reddit.com/r/gaming"],
+    "shopping_interests": ["gaming chairs", "graphics cards"],
+}
+
+
+def test_vectorize_similarity():
+    a = vectorize(MOCK_PERSONA_PROFILE)
+    tweaked = vectorize({**MOCK_PERSONA_PROFILE, "interests": MOCK_PERSONA_PROFILE["interests"] + ["tea"]})
+    assert a.dtype == np.float32
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert float(a @ tweaked) > 0.9
+    assert float(a @ vectorize(GAMER)) < 0.5
+    assert not vectorize({}).any()
+
+
+def test_index_nearest_and_remove():
+    index = PersonaIndex(dim=256, capacity=2)
+    index.add("p1", "u1", MOCK_PERSONA_PROFILE)
+    index.add("p2", "u1", GAMER)
+    index.add("p3", "u2", MOCK_PERSONA_PROFILE)  # grows past the initial capacity
+
+    assert [pid for pid, _ in index.nearest(MOCK_PERSONA_PROFILE, k=2)][0] in {"p1", "p3"}
+    assert index.nearest(MOCK_PERSONA_PROFILE, k=3, user_id="u2") == [("p3", pytest.approx(1.0))]
+    assert index.find_duplicate(MOCK_PERSONA_PROFILE, "u1", 0.9)[0] == "p1"
+    assert index.find_duplicate(MOCK_PERSONA_PROFILE, "nobody", 0.9) is None
+
+    index.remove("p1")
+    assert len(index) == 2
+    assert index.find_duplicate(MOCK_PERSONA_PROFILE, "u1", 0.9) is None
+    assert index.nearest(GAMER, k=1, user_id="u1")[0][0] == "p2"
+
+
+def test_most_diverse():
+    index = PersonaIndex()
+    index.add("hiker", "u", MOCK_PERSONA_PROFILE)
+    index.add("hiker2", "u", {**MOCK_PERSONA_PROFILE, "name": "Jo"})
+    index.add("gamer", "u", GAMER)
+    assert index.most_diverse(["hiker2", "gamer"], ["hiker"]) == "gamer"
+    assert index.most_diverse(["hiker2", "gamer"], []) == "hiker2"
+    assert index.most_diverse(["unknown"], ["hiker"]) == "unknown"
+
+
+def _random_index(n: int, users: int) -> tuple[PersonaIndex, np.ndarray]:
+    rng = np.random.default_rng(0)
+    index = PersonaIndex(dim=256, capacity=n)
+    vectors = rng.standard_normal((n, 256)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index._vectors[:] = vectors
+    index._ids = [f"p{i}" for i in range(n)]
+    index._rows = {pid: i for i, pid in enumerate(index._ids)}
+    for i, pid in enumerate(index._ids):
+        index._set_owner(pid, f"u{i % users}")
+    return index, vectors
+
+
+def _best_of(runs: int, fn) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def test_batched_queries_are_fast():
+    index, vectors = _random_index(20_000, users=100)
+    start = time.perf_counter()
+    results = index.nearest_batch(vectors[:8], k=3)
+    elapsed = time.perf_counter() - start
+    assert [r[0][0] for r in results] == [f"p{i}" for i in range(8)]
+    assert elapsed < 1.0  # generous bound; typically a few ms
+
+
+def test_duplicate_checks_score_only_the_users_rows():
+    index, vectors = _random_index(100_000, users=10_000)
+    # u3 owns p3, p10003, p20003, ...; only those rows are scored
+    results = index.nearest_batch(vectors[[3, 10_003]], k=2, user_id="u3")
+    assert [r[0] for r in results] == [("p3", pytest.approx(1.0)), ("p10003", pytest.approx(1.0))]
+    assert {pid for pid, _ in results[0]} <= {f"p{i}" for i in range(3, 100_000, 10_000)}
+
+    # Generous bounds; both typically take well under a millisecond
+    assert _best_of(5, lambda: index.nearest_batch(vectors[:8], k=5, user_id="u3")) < 0.25
+    assert _best_of(5, lambda: index.find_duplicate(MOCK_PERSONA_PROFILE, "u3", 0.9)) < 0.25
+
+
+@pytest.mark.asyncio
+async def test_sync_picks_up_other_workers_changes(db_engine, db_session):
+    db_session.add_all([
+        Persona(id="kept", user_id="u1", name="Alex", wizard_answers=ANSWERS, profile=MOCK_PERSONA_PROFILE),
+        Persona(id="gone", user_id="u1", name="Alex", wizard_answers=ANSWERS, profile=MOCK_PERSONA_PROFILE),
+    ])
+    await db_session.commit()
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    index = PersonaIndex()
+    assert await index.load(session_factory) == 2
+
+    # Another worker creates one persona and deletes another
+    db_session.add(Persona(id="new", user_id="u2", name="Sam", wizard_answers=ANSWERS, profile=GAMER))
+    await db_session.delete(await db_session.get(Persona, "gone"))
+    await db_session.commit()
+
+    assert await index.sync(session_factory) == (1, 1)
+    assert sorted(index._rows) == ["kept", "new"]
+    assert index.find_duplicate(GAMER, "u2", 0.9)[0] == "new"
+    assert await index.sync(session_factory) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_create_rejects_near_duplicate(client, auth_headers, mock_llm, no_duplicate_rejection):
+    no_duplicate_rejection.reject_duplicates = True
+    first = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert first.status_code == 201
+
+    # The same profile again: regenerated once, still a duplicate -> 409
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 409
+    assert first.json()["id"] in resp.json()["detail"]
+    assert mock_llm.call_count == 3
+
+    # A regeneration that comes back distinct is accepted
+    mock_llm.side_effect = [MOCK_PERSONA_PROFILE, GAMER]
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 201
+    assert resp.json()["name"] == "Sam Lee"
+    assert mock_llm.call_args.args[0].endswith(DISTINCT_NOTE)
+
+
+@pytest.mark.asyncio
+async def test_deleted_persona_leaves_index(client, auth_headers, mock_llm, no_duplicate_rejection):
+    no_duplicate_rejection.reject_duplicates = True
+    first = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    await client.delete(f"/api/personas/{first.json()['id']}", headers=auth_headers)
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 201
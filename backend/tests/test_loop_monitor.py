@@ -0,0 +1,65 @@
+"""Tests for the event-loop lag monitor."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.main import app
+from app.services.loop_monitor import LoopMonitor
+
+
+def test_record_lag_histogram():
+    monitor = LoopMonitor()
+    for lag in (0.5, 3, 40, 4000):
+        monitor.record_lag(lag)
+    lag = monitor.metrics()["lag_ms"]
+    assert lag["count"] == 4
+    assert lag["max"] == 4000
+    assert lag["buckets"]["1"] == 1
+    assert lag["buckets"]["5"] == 2
+    assert lag["buckets"]["50"] == 3
+    assert lag["buckets"]["+Inf"] == 4
+
+
+@pytest.mark.asyncio
+async def test_detects_blocked_loop_with_stack(caplog):
+    monitor = LoopMonitor(probe_interval=0.02, slow_threshold=0.05)
+    await monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)  # block the loop on purpose
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    metrics = monitor.metrics()
+    assert metrics["slow_callbacks"] >= 1
+    assert metrics["lag_ms"]["max"] >= 200
+    assert "blocked" in metrics["recent_slow"][0]["description"]
+    # The stack is logged, never exported
+    assert "stack" not in metrics["recent_slow"][0]
+    assert "test_detects_blocked_loop_with_stack" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_stop_restores_asyncio_debug():
+    loop = asyncio.get_running_loop()
+    was = loop.get_debug(), loop.slow_callback_duration
+    monitor = LoopMonitor(slow_threshold=0.01, asyncio_debug=True)
+    await monitor.start()
+    assert loop.get_debug()
+    assert loop.slow_callback_duration == 0.01
+    await monitor.stop()
+    assert (loop.get_debug(), loop.slow_callback_duration) == was
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client):
+    app.state.loop_monitor = LoopMonitor()
+    try:
+        resp = await client.get("/api/metrics")
+        assert resp.status_code == 200
+        assert resp.json()["event_loop"]["lag_ms"]["count"] == 0
+    finally:
+        del app.state.loop_monitor
@@ -0,0 +1,95 @@
+"""Tests for per-persona noise duplicate suppression."""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.config import DedupeSettings
+from app.models.noise_event import NoiseEvent
+from app.models.noise_filter import NoiseFilterState
+from app.models.persona import Persona
+from app.services.noise_dedupe import NoiseDeduper, RollingBloom, normalize
+from app.services.scheduler import generate_browse_events, generate_search_events
+from tests.conftest import MOCK_PERSONA_PROFILE
+
+
+def test_normalize():
+    assert normalize("search", "  Best Hiking-Trails, Denver?! ") == "best hiking trails denver"
+    assert normalize("browse", "https://www.AllTrails.com/trail/?utm_source=x#top") == "alltrails.com/trail"
+    assert normalize("browse", "alltrails.com/trail?b=2&a=1") == "alltrails.com/trail?a=1&b=2"
+
+
+def test_rolling_bloom_ages_out():
+    bloom = RollingBloom(capacity=10, error_rate=0.01)
+    bloom.add("first")
+    assert "first" in bloom and "second" not in bloom
+    for i in range(10):
+        bloom.add(f"a{i}")  # fills the generation holding "first": it becomes the previous one
+    assert "first" in bloom
+    for i in range(10):
+        bloom.add(f"b{i}")
+    assert "first" not in bloom
+
+
+def test_filter_drops_exact_and_near_repeats():
+    deduper = NoiseDeduper(DedupeSettings())
+    kept = deduper.filter("p1", "search", [
+        "best hiking trails near denver",
+        "Best hiking trails near Denver!",  # exact after normalisation
+        "best hiking trail near denver",  # near
+        "mirrorless camera deals",
+    ])
+    assert kept == ["best hiking trails near denver", "mirrorless camera deals"]
+    assert deduper.stats == {"kept": 2, "exact": 1, "near": 1}
+
+    # Other personas and event types keep their own history
+    assert deduper.filter("p2", "search", ["mirrorless camera deals"]) == ["mirrorless camera deals"]
+    assert deduper.filter("p1", "shop", ["mirrorless camera deals"]) == ["mirrorless camera deals"]
+    assert deduper.recent("p1", "search") == kept
+
+
+def test_filter_memory_is_bounded():
+    deduper = NoiseDeduper(DedupeSettings(max_personas=2, recent_signatures=4, avoid_hint=2))
+    for persona in ("p1", "p2", "p3"):
+        deduper.filter(persona, "search", [f"query number {i} for {persona}" for i in range(10)])
+    assert list(deduper._filters) == ["p2", "p3"]
+    f = deduper._filters["p3"]
+    assert f._signatures["search"].shape == (4, 32)
+    assert len(f.recent["search"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_events_skip_repeats_and_persist(db_session):
+    persona = Persona(
+        user_id="u1", name="Alex", wizard_answers={}, profile=MOCK_PERSONA_PROFILE, is_active=True
+    )
+    db_session.add(persona)
+    await db_session.commit()
+
+    with patch("app.services.scheduler.generate_json", new_callable=AsyncMock) as mock:
+        mock.return_value = ["best hiking trails near denver", "mirrorless camera deals"]
+        assert await generate_search_events(db_session, "Alex", 2, persona.id) == (2, 0)
+        assert await generate_search_events(db_session, "Alex", 2, persona.id) == (0, 2)
+        # The second prompt asked the LLM not to repeat the first batch
+        assert "mirrorless camera deals" in mock.call_args.args[0]
+
+        mock.return_value = {
+            "urls_to_visit": ["https://alltrails.com/trail", "https://www.alltrails.com/trail/"],
+            "products_to_browse": ["hiking boots on amazon"],
+        }
+        assert await generate_browse_events(db_session, "Alex", 2, 1, persona.id) == (1, 1, 1)
+
+    events = (await db_session.execute(select(NoiseEvent))).scalars().all()
+    assert len(events) == 4
+    assert {e.persona_id for e in events} == {persona.id}
+
+    # A fresh deduper (e.g. after a restart) picks the filter up from the database
+    row = await db_session.get(NoiseFilterState, persona.id)
+    assert row is not None
+    restarted = NoiseDeduper(DedupeSettings())
+    await restarted.load(db_session, persona.id)
+    assert restarted.filter(persona.id, "search", ["mirrorless camera deals", "trail running shoes"]) == [
+        "trail running shoes"
+    ]
+    assert restarted.filter(persona.id, "browse", ["alltrails.com/trail"]) == []
@@ -0,0 +1,109 @@
+"""Tests for the persona warm pool — bucketing, claiming, refilling."""
+
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import func, select
+
+from app.config import Settings
+from app.models.persona import Persona
+from app.models.persona_pool import PersonaPoolEntry
+from app.schemas.persona import PersonaProfile, WizardAnswers
+from app.services.persona_pool import adjust, bucket_for, interest_cluster, refill
+from tests.conftest import MOCK_PERSONA_PROFILE
+
+BUCKET = "25-34|budget|colorado|park ranger|active"
+ANSWERS = {
+    "interests": ["outdoors", "health", "tech"],
+    "age_range": "25-34",
+    "location": "Colorado",
+    "profession": "park ranger",
+    "shopping_style": "budget",
+    "noise_intensity": "moderate",
+}
+
+
+def test_buckets():
+    assert interest_cluster(["tech", "outdoors", "health"]) == "active"
+    assert interest_cluster(["music", "tech"]) == "culture"  # tie -> first pick
+    assert interest_cluster([]) == "general"
+    assert bucket_for(WizardAnswers(**ANSWERS)) == BUCKET
+    # Free-text answers are normalized, and can't smuggle in a separator
+    messy = WizardAnswers(**{**ANSWERS, "profession": "  Park |  Ranger ", "location": "COLORADO"})
+    assert bucket_for(messy) == "25-34|budget|colorado|park ranger|active"
+    assert bucket_for(WizardAnswers(**{**ANSWERS, "profession": "x" * 300})) is None
+
+
+def test_adjust_adds_chosen_interests():
+    answers = WizardAnswers(**{**ANSWERS, "interests": ["hiking", "DIY"]})
+    profile = adjust(PersonaProfile(**MOCK_PERSONA_PROFILE), answers)
+    assert profile.interests[0] == "DIY"  # chosen interests are added up front
+    assert profile.interests.count("hiking") == 1  # ...but not duplicated
+    assert profile.location == MOCK_PERSONA_PROFILE["location"]
+    assert profile.profession == MOCK_PERSONA_PROFILE["profession"]
+
+
+@pytest.mark.asyncio
+async def test_create_persona_claims_pool_entry(client, auth_headers, mock_llm, db_session):
+    db_session.add(PersonaPoolEntry(
+        bucket=BUCKET, profile=json.dumps({**MOCK_PERSONA_PROFILE, "profession": "Park Ranger"})
+    ))
+    await db_session.commit()
+
+    # Other answers for the same age, style and interests don't match it
+    other = {**ANSWERS, "location": "Utah"}
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": other})
+    assert resp.status_code == 201
+    assert mock_llm.call_count == 1
+
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 201
+    assert resp.json()["profile"]["profession"] == "Park Ranger"
+    assert mock_llm.call_count == 1
+
+    # Pool is now empty for the bucket: the next one is generated live
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 201
+    assert mock_llm.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_pool_entry_stays_pooled(
+    client, auth_headers, mock_llm, db_session, no_duplicate_rejection
+):
+    no_duplicate_rejection.reject_duplicates = True
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 201
+    db_session.add(PersonaPoolEntry(bucket=BUCKET, profile=json.dumps(MOCK_PERSONA_PROFILE)))
+    await db_session.commit()
+
+    # The pooled profile duplicates the user's persona, and so does every
+    # live regeneration: 409, but the pooled profile isn't used up
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 409
+    count = await db_session.scalar(select(func.count()).select_from(PersonaPoolEntry))
+    assert count == 1
+
+
+@pytest.mark.asyncio
+async def test_refill_stocks_popular_buckets(db_session):
+    for _ in range(2):
+        db_session.add(Persona(
+            user_id="u1", name="Alex", wizard_answers=ANSWERS, profile=MOCK_PERSONA_PROFILE,
+        ))
+    await db_session.commit()
+    settings = Settings()
+    settings.pool.per_bucket = 2
+    settings.pool.refill_batch = 5
+
+    with patch("app.services.persona_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.return_value = MOCK_PERSONA_PROFILE
+        assert await refill(db_session, settings) == 2
+        assert await refill(db_session, settings) == 0  # already stocked
+    assert "persona 1 of 2" in mock.call_args_list[0].args[0]
+
+    buckets = (await db_session.execute(
+        select(PersonaPoolEntry.bucket, func.count()).group_by(PersonaPoolEntry.bucket)
+    )).all()
+    assert buckets == [(BUCKET, 2)]
@@ -1,9 +1,21 @@
 """Tests for persona CRUD — creation, listing, update, delete, auth enforcement."""
 
+import json
+from datetime import datetime, timezone
+
 import pytest
 from unittest.mock import AsyncMock, patch
 
-from tests.conftest import MOCK_PERSONA_PROFILE
+from sqlalchemy import select
+
+from app.models.job import PlanJob
+from app.models.noise_event import NoiseEvent
+from app.models.persona import Persona
+from app.config import get_settings
+from app.services.jobs import job_runner
+from app.services.persona_cache import profile_cache
+from app.services.usage import metered, usage_meter
+from tests.conftest import MOCK_PERSONA_PROFILE, MOCK_PLAN_DATA
 
 
 @pytest.mark.asyncio
@@ -22,6 +34,7 @@ async def test_create_persona(client, auth_headers, mock_llm):
     data = resp.json()
     assert data["name"] == "Alex Rivera"
     assert data["is_active"] is False
+    assert data["timezone"] == "America/Denver"
     mock_llm.assert_called_once()
 
 
@@ -150,3 +163,261 @@ async def test_persona_isolation(client, mock_llm):
     # User B's list is empty
     resp = await client.get("/api/personas", headers=headers_b)
     assert resp.json() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("db_engine", ["file"], indirect=True)  # the job and noise tasks run concurrently
+async def test_activation_prefetches_plan_and_noise(
+    client, auth_headers, mock_llm, db_session, no_activation_prefetch
+):
+    no_activation_prefetch.prefetch_on_activate = True
+    create = await client.post("/api/personas", headers=auth_headers, json={
+        "wizard_answers": {
+            "interests": ["running"],
+            "age_range": "25-34",
+            "location": "Ohio",
+            "profession": "teacher",
+            "shopping_style": "budget",
+            "noise_intensity": "subtle",
+        }
+    })
+    pid = create.json()["id"]
+
+    with (
+        patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as plan_mock,
+        patch("app.services.scheduler.generate_json", new_callable=AsyncMock) as noise_mock,
+    ):
+        plan_mock.return_value = MOCK_PLAN_DATA
+        noise_mock.side_effect = [
+            ["trail running shoes", "5k training plan"],
+            {"urls_to_visit": ["https://runnersworld.com"], "products_to_browse": ["running vest"]},
+        ]
+        resp = await client.patch(f"/api/personas/{pid}", headers=auth_headers, json={"is_active": True})
+        assert resp.status_code == 200
+        await job_runner.drain()
+
+    jobs = (await db_session.execute(select(PlanJob).where(PlanJob.persona_id == pid))).scalars().all()
+    assert [j.status for j in jobs] == ["succeeded"]
+    events = (await db_session.execute(select(NoiseEvent.event_type))).scalars().all()
+    assert sorted(events) == ["browse", "search", "search", "shop"]
+
+    # Re-activating with a plan still pending queues no second job
+    await client.patch(f"/api/personas/{pid}", headers=auth_headers, json={"is_active": False})
+    with patch("app.services.scheduler.generate_json", new_callable=AsyncMock) as noise_mock:
+        noise_mock.side_effect = [[], {}]
+        await client.patch(f"/api/personas/{pid}", headers=auth_headers, json={"is_active": True})
+        await job_runner.drain()
+    jobs = (await db_session.execute(select(PlanJob).where(PlanJob.persona_id == pid))).scalars().all()
+    assert len(jobs) == 1
+
+
+@pytest.mark.asyncio
+async def test_activation_prefetch_skipped_over_quota(
+    client, auth_headers, mock_llm, db_session, no_activation_prefetch
+):
+    no_activation_prefetch.prefetch_on_activate = True
+    create = await client.post("/api/personas", headers=auth_headers, json={
+        "wizard_answers": {
+            "interests": ["chess"],
+            "age_range": "35-44",
+            "location": "Maine",
+            "profession": "nurse",
+            "shopping_style": "midrange",
+            "noise_intensity": "subtle",
+        }
+    })
+    persona = create.json()
+    usage = get_settings().usage
+    usage.daily_token_quota = 100
+    try:
+        with metered("persona", persona["user_id"], persona["id"]):
+            usage_meter.record(prompt_tokens=60, completion_tokens=50, wall_ms=5)
+        resp = await client.patch(f"/api/personas/{persona['id']}", headers=auth_headers, json={"is_active": True})
+        assert resp.status_code == 200
+        await job_runner.drain()
+    finally:
+        usage.daily_token_quota = 0
+        usage_meter._used.clear()
+        usage_meter._pending.clear()
+
+    jobs = (await db_session.execute(select(PlanJob).where(PlanJob.persona_id == persona["id"]))).scalars().all()
+    assert jobs == []
+
+
+@pytest.mark.asyncio
+async def test_create_persona_idempotency_key(client, auth_headers, mock_llm):
+    body = {
+        "wizard_answers": {
+            "interests": ["chess"],
+            "age_range": "35-44",
+            "location": "Texas",
+            "profession": "accountant",
+            "shopping_style": "budget",
+            "noise_intensity": "subtle",
+        }
+    }
+    headers = {**auth_headers, "Idempotency-Key": "wizard-1"}
+    first = await client.post("/api/personas", headers=headers, json=body)
+    retry = await client.post("/api/personas", headers=headers, json=body)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+    assert mock_llm.call_count == 1
+
+    body["wizard_answers"]["interests"] = ["poker"]
+    reused = await client.post("/api/personas", headers=headers, json=body)
+    assert reused.status_code == 422
+
+    listed = await client.get("/api/personas", headers=auth_headers)
+    assert len(listed.json()) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_idempotent_create_can_be_retried(client, auth_headers, mock_llm):
+    body = {
+        "wizard_answers": {
+            "interests": ["chess"],
+            "age_range": "35-44",
+            "location": "Texas",
+            "profession": "accountant",
+            "shopping_style": "budget",
+            "noise_intensity": "subtle",
+        }
+    }
+    headers = {**auth_headers, "Idempotency-Key": "wizard-2"}
+    mock_llm.side_effect = [RuntimeError("model down"), MOCK_PERSONA_PROFILE]
+    failed = await client.post("/api/personas", headers=headers, json=body)
+    assert failed.status_code == 500
+    retry = await client.post("/api/personas", headers=headers, json=body)
+    assert retry.status_code == 201
+    assert "Idempotent-Replayed" not in retry.headers
+
+
+def _ndjson(resp) -> list[dict]:
+    return [json.loads(line) for line in resp.text.splitlines() if line]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_from_template(client, auth_headers, mock_llm):
+    resp = await client.post("/api/personas/bulk", headers=auth_headers, json={
+        "template": {
+            "interests": ["gardening"],
+            "age_range": "45-54",
+            "location": "random",
+            "profession": "retired",
+            "shopping_style": "midrange",
+            "noise_intensity": "subtle",
+        },
+        "count": 3,
+        "diversity": "high",
+    })
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = _ndjson(resp)
+    assert lines[-1] == {"done": True, "created": 3, "failed": 0}
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    prompts = [call.args[0] for call in mock_llm.call_args_list]
+    assert all("of 3 created from the same preferences" in p for p in prompts)
+    assert len(set(prompts)) == 3
+
+    listed = await client.get("/api/personas", headers=auth_headers)
+    assert len(listed.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_reports_failures(client, auth_headers, mock_llm):
+    answers = {
+        "interests": ["sailing"],
+        "age_range": "25-34",
+        "location": "Maine",
+        "profession": "boat builder",
+        "shopping_style": "budget",
+        "noise_intensity": "subtle",
+    }
+    mock_llm.side_effect = [MOCK_PERSONA_PROFILE, RuntimeError("model down")]
+    resp = await client.post("/api/personas/bulk", headers=auth_headers, json={
+        "wizard_answers": [answers, answers],
+    })
+    lines = _ndjson(resp)
+    assert lines[-1] == {"done": True, "created": 1, "failed": 1}
+    assert {"persona" in line for line in lines[:-1]} == {True, False}
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_validation(client, auth_headers, mock_llm):
+    resp = await client.post("/api/personas/bulk", headers=auth_headers, json={"count": 2})
+    assert resp.status_code == 422
+
+
+def test_derived_columns_follow_json():
+    persona = Persona(
+        user_id="u1",
+        name="Alex",
+        wizard_answers={"noise_intensity": "heavy"},
+        profile=MOCK_PERSONA_PROFILE,
+    )
+    assert persona.summary.startswith("Alex Rivera, age 32, UX Designer from Denver, Colorado.")
+    assert persona.location == "Denver, Colorado"
+    assert persona.noise_intensity == "heavy"
+
+    persona.profile = {**MOCK_PERSONA_PROFILE, "location": "Austin, Texas"}
+    assert persona.location == "Austin, Texas"
+    assert "from Austin, Texas" in persona.summary
+
+
+
+@pytest.mark.asyncio
+async def test_list_personas_filters(client, auth_headers, mock_llm):
+    for intensity in ("subtle", "heavy"):
+        await client.post("/api/personas", headers=auth_headers, json={
+            "wizard_answers": {
+                "interests": ["film"],
+                "age_range": "25-34",
+                "location": "Colorado",
+                "profession": "editor",
+                "shopping_style": "midrange",
+                "noise_intensity": intensity,
+            }
+        })
+    heavy = await client.get("/api/personas?noise_intensity=heavy", headers=auth_headers)
+    assert [p["wizard_answers"]["noise_intensity"] for p in heavy.json()] == ["heavy"]
+    denver = await client.get("/api/personas?location=denver&active=false", headers=auth_headers)
+    assert len(denver.json()) == 2
+    # LIKE wildcards in the filter are matched literally
+    for pattern in ("%", "D_nver"):
+        resp = await client.get("/api/personas", headers=auth_headers, params={"location": pattern})
+        assert resp.json() == []
+    active = await client.get("/api/personas?active=true", headers=auth_headers)
+    assert active.json() == []
+
+
+@pytest.mark.asyncio
+async def test_profile_cache_serves_decoded_json_until_updated(client, auth_headers, mock_llm, db_session):
+    create = await client.post("/api/personas", headers=auth_headers, json={
+        "wizard_answers": {
+            "interests": ["film"],
+            "age_range": "25-34",
+            "location": "Colorado",
+            "profession": "editor",
+            "shopping_style": "midrange",
+            "noise_intensity": "subtle",
+        }
+    })
+    pid = create.json()["id"]
+    first = await client.get("/api/personas", headers=auth_headers)
+    hits = profile_cache.hits
+    second = await client.get("/api/personas", headers=auth_headers)
+    assert profile_cache.hits == hits + 1
+    assert second.json() == first.json()
+
+    # A changed row (new updated_at) is re-read, never served stale
+    persona = await db_session.get(Persona, pid)
+    persona.profile = {**MOCK_PERSONA_PROFILE, "location": "Austin, Texas"}
+    await db_session.commit()
+    got = await client.get(f"/api/personas/{pid}", headers=auth_headers)
+    assert got.json()["profile"]["location"] == "Austin, Texas"
+
+    await client.patch(f"/api/personas/{pid}", headers=auth_headers, json={"name": "Renamed"})
+    listed = await client.get("/api/personas", headers=auth_headers)
+    assert listed.json()[0]["name"] == "Renamed"
+    assert listed.json()[0]["profile"]["location"] == "Austin, Texas"
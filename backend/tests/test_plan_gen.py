@@ -0,0 +1,135 @@
+"""Tests for plan generation — chunking, merging, per-chunk retry, derivation."""
+
+import random
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config import Settings
+from app.models.persona import Persona
+from app.schemas.plan import BrowsingPlanData
+from app.services.plan_derive import derive_plan
+from app.services.plan_gen import create_plan_for_persona, generate_plan
+from tests.conftest import MOCK_PERSONA_PROFILE, MOCK_PLAN_DATA
+
+
+def _chunk(tag: str, offset: int = 10) -> dict:
+    return {
+        "searches": [
+            {"query": f"{tag} query", "engine": "google", "time_offset_min": offset},
+            {"query": "shared query", "engine": "google", "time_offset_min": offset + 5},
+        ],
+        "page_visits": [
+            {"url": f"https://{tag}.example.com", "dwell_seconds": 30, "time_offset_min": 9999},
+        ],
+        "product_browsing": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_subtle_plan_is_single_call():
+    with patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.return_value = _chunk("a")
+        plan = await generate_plan({"name": "Alex"}, noise_intensity="subtle")
+    assert mock.call_count == 1
+    assert "part 1 of" not in mock.call_args.args[0]
+    assert len(plan.searches) == 2
+
+
+@pytest.mark.asyncio
+async def test_heavy_plan_is_chunked_and_merged():
+    with patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.side_effect = [_chunk(t) for t in "abcd"]
+        plan = await generate_plan({"name": "Alex"}, noise_intensity="heavy", window_hours=16)
+
+    assert mock.call_count == 4
+    prompts = [c.args[0] for c in mock.call_args_list]
+    assert all("approximately 25 total actions" in p for p in prompts)
+    assert "part 3 of 4" in prompts[2]
+
+    # "shared query" appears in every chunk but is kept once
+    queries = [s.query for s in plan.searches]
+    assert queries.count("shared query") == 1
+    assert len(queries) == 5
+    # Offsets are shifted into each chunk's 4-hour window and clamped inside it
+    offsets = {s.query: s.time_offset_min for s in plan.searches}
+    assert offsets["d query"] == 3 * 240 + 10
+    assert [v.time_offset_min for v in plan.page_visits] == [239, 479, 719, 959]
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_retried_alone():
+    with patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.side_effect = [_chunk("a"), ValueError("bad json"), _chunk("b")]
+        plan = await generate_plan({"name": "Alex"}, noise_intensity="moderate")
+    assert mock.call_count == 3
+    assert {s.query for s in plan.searches} == {"a query", "b query", "shared query"}
+
+
+@pytest.mark.asyncio
+async def test_all_chunks_failing_raises():
+    with patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.side_effect = ValueError("bad json")
+        with pytest.raises(ValueError):
+            await generate_plan({"name": "Alex"}, noise_intensity="moderate")
+
+
+def test_derive_plan_perturbs_history():
+    history = [BrowsingPlanData(**MOCK_PLAN_DATA)]
+    plan = derive_plan(history, MOCK_PERSONA_PROFILE, action_count=8, window_hours=2, rng=random.Random(7))
+
+    # Proportions follow the latest plan: 2 searches : 1 visit : 1 product
+    assert (len(plan.searches), len(plan.page_visits), len(plan.product_browsing)) == (4, 2, 2)
+    known = {a["query"] for a in MOCK_PLAN_DATA["searches"]} | set(MOCK_PERSONA_PROFILE["search_topics"])
+    for a in plan.searches:
+        assert any(q in a.query or a.query in q for q in known)
+    allowed = {MOCK_PLAN_DATA["page_visits"][0]["url"], *MOCK_PERSONA_PROFILE["favorite_sites"]}
+    assert {a.url for a in plan.page_visits} <= allowed
+    offsets = [a.time_offset_min for a in plan.searches + plan.page_visits + plan.product_browsing]
+    assert all(0 <= o < 120 for o in offsets)
+
+
+@pytest.mark.asyncio
+async def test_plans_are_derived_between_fresh_llm_plans(db_session):
+    persona = Persona(
+        user_id="u1",
+        name="Alex",
+        wizard_answers={"noise_intensity": "subtle"},
+        profile=MOCK_PERSONA_PROFILE,
+    )
+    db_session.add(persona)
+    await db_session.commit()
+    settings = Settings()
+    settings.plans.fresh_every = 3
+
+    with (
+        patch("app.services.plan_gen.get_settings", return_value=settings),
+        patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock,
+    ):
+        mock.return_value = MOCK_PLAN_DATA
+        sources = [(await create_plan_for_persona(db_session, persona)).source for _ in range(4)]
+    assert sources == ["llm", "derived", "derived", "llm"]
+    assert mock.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fresh_plans_recur_when_fresh_every_exceeds_history(db_session):
+    persona = Persona(
+        user_id="u1",
+        name="Alex",
+        wizard_answers={"noise_intensity": "subtle"},
+        profile=MOCK_PERSONA_PROFILE,
+    )
+    db_session.add(persona)
+    await db_session.commit()
+    settings = Settings()
+    assert settings.plans.fresh_every > settings.plans.history  # the defaults (10 / 7)
+
+    with (
+        patch("app.services.plan_gen.get_settings", return_value=settings),
+        patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock,
+    ):
+        mock.return_value = MOCK_PLAN_DATA
+        sources = [(await create_plan_for_persona(db_session, persona)).source for _ in range(21)]
+    fresh = [i for i, source in enumerate(sources) if source == "llm"]
+    assert fresh == [0, 10, 20]
@@ -1,8 +1,20 @@
 """Tests for browsing plan endpoints — generation, polling, completion."""
 
+import asyncio
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from unittest.mock import AsyncMock, patch
 
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db import get_db
+from app.main import app
+from app.models.job import PlanJob
+from app.routers.plans import _next_validators
+from app.services.jobs import JOB_LEASE, JobRunner, job_runner
+
 from tests.conftest import MOCK_PERSONA_PROFILE, MOCK_PLAN_DATA
 
 
@@ -18,6 +30,26 @@ def mock_llm_plan():
         yield plan_mock
 
 
+async def _wait_for_job(client, headers, job_id: str) -> dict:
+    """Let in-flight plan jobs finish, then fetch the job.
+
+    Jobs run as background tasks sharing the test engine's single in-memory
+    connection, so wait for them instead of polling concurrently.
+    """
+    await job_runner.drain()
+    resp = await client.get(f"/api/plans/jobs/{job_id}", headers=headers)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+async def _generate(client, headers, persona_id: str) -> dict:
+    resp = await client.post(f"/api/plans/generate/{persona_id}", headers=headers)
+    assert resp.status_code == 202
+    job = await _wait_for_job(client, headers, resp.json()["id"])
+    assert job["status"] == "succeeded"
+    return job["plan"]
+
+
 @pytest.mark.asyncio
 async def test_generate_plan(client, auth_headers, mock_llm_plan):
     # Create persona first
@@ -34,8 +66,13 @@ async def test_generate_plan(client, auth_headers, mock_llm_plan):
     pid = create.json()["id"]
 
     resp = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
-    assert resp.status_code == 201
-    data = resp.json()
+    assert resp.status_code == 202
+    assert resp.headers["Location"] == f"/api/plans/jobs/{resp.json()['id']}"
+    assert resp.json()["status"] == "queued"
+
+    job = await _wait_for_job(client, auth_headers, resp.json()["id"])
+    assert job["status"] == "succeeded"
+    data = job["plan"]
     assert data["persona_id"] == pid
     assert data["executed"] is False
     assert "searches" in data["plan_data"]
@@ -57,7 +94,7 @@ async def test_get_next_plans(client, auth_headers, mock_llm_plan):
     pid = create.json()["id"]
     await client.patch(f"/api/personas/{pid}", headers=auth_headers, json={"is_active": True})
 
-    await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    await _generate(client, auth_headers, pid)
 
     resp = await client.get("/api/plans/next", headers=auth_headers)
     assert resp.status_code == 200
@@ -80,13 +117,18 @@ async def test_complete_plan(client, auth_headers, mock_llm_plan):
     })
     pid = create.json()["id"]
 
-    plan_resp = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
-    plan_id = plan_resp.json()["id"]
+    plan_id = (await _generate(client, auth_headers, pid))["id"]
 
+    # MOCK_PLAN_DATA has 4 actions: completing 3 leaves the plan open
     resp = await client.post(f"/api/plans/{plan_id}/complete", headers=auth_headers, json={
         "actions_completed": 3,
     })
     assert resp.status_code == 200
+    assert resp.json()["executed"] is False
+
+    resp = await client.post(f"/api/plans/{plan_id}/complete", headers=auth_headers, json={
+        "actions_completed": 1,
+    })
     assert resp.json()["executed"] is True
 
 
@@ -103,7 +145,7 @@ async def test_activity_log(client, auth_headers, mock_llm_plan):
         }
     })
     pid = create.json()["id"]
-    await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    await _generate(client, auth_headers, pid)
 
     resp = await client.get("/api/plans/activity", headers=auth_headers)
     assert resp.status_code == 200
@@ -114,3 +156,427 @@ async def test_activity_log(client, auth_headers, mock_llm_plan):
 async def test_plans_require_auth(client):
     resp = await client.get("/api/plans/next")
     assert resp.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_generate_plan_job_failure(client, auth_headers, mock_llm_plan):
+    create = await client.post("/api/personas", headers=auth_headers, json={
+        "wizard_answers": {
+            "interests": ["chess"],
+            "age_range": "25-34",
+            "location": "Ohio",
+            "profession": "teacher",
+            "shopping_style": "budget",
+            "noise_intensity": "subtle",
+        }
+    })
+    pid = create.json()["id"]
+    mock_llm_plan.side_effect = ValueError("LLM did not return valid JSON")
+
+    resp = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    job = await _wait_for_job(client, auth_headers, resp.json()["id"])
+    assert job["status"] == "failed"
+    assert "valid JSON" in job["error"]
+    assert job["plan"] is None
+
+
+@pytest.mark.asyncio
+async def test_plan_job_events_stream(client, auth_headers, mock_llm_plan):
+    create = await client.post("/api/personas", headers=auth_headers, json={
+        "wizard_answers": {
+            "interests": ["golf"],
+            "age_range": "55-64",
+            "location": "Arizona",
+            "profession": "accountant",
+            "shopping_style": "luxury",
+            "noise_intensity": "moderate",
+        }
+    })
+    pid = create.json()["id"]
+    resp = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    job_id = resp.json()["id"]
+    await job_runner.drain()
+
+    stream = await client.get(f"/api/plans/jobs/{job_id}/events", headers=auth_headers)
+    assert stream.status_code == 200
+    assert stream.headers["content-type"].startswith("text/event-stream")
+    assert '"status":"succeeded"' in stream.text
+
+
+@pytest.mark.asyncio
+async def test_plan_job_not_visible_to_other_user(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    job_id = (await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)).json()["id"]
+    await job_runner.drain()
+    assert (await client.get(f"/api/plans/jobs/{job_id}", headers=auth_headers)).status_code == 200
+
+    await client.post("/api/auth/register", json={"email": "other@phantom.dev", "password": "pw"})
+    login = await client.post("/api/auth/login", json={"email": "other@phantom.dev", "password": "pw"})
+    other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert (await client.get(f"/api/plans/jobs/{job_id}", headers=other)).status_code == 404
+    assert (await client.get("/api/plans/jobs/does-not-exist", headers=auth_headers)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_resume_runs_each_job_once_across_workers(client, auth_headers, mock_llm_plan, db_engine, db_session):
+    me = (await client.get("/api/auth/me", headers=auth_headers)).json()
+    stale_pid = await _active_persona(client, auth_headers)
+    live_pid = await _active_persona(client, auth_headers)
+    long_ago = datetime.now(timezone.utc) - JOB_LEASE - timedelta(minutes=1)
+    stale = PlanJob(user_id=me["id"], persona_id=stale_pid, status="running", updated_at=long_ago)
+    live = PlanJob(user_id=me["id"], persona_id=live_pid, status="running")  # another worker's
+    db_session.add_all([stale, live])
+    await db_session.commit()
+
+    # Two workers start up and resume at once
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    workers = [JobRunner(), JobRunner()]
+    for worker in workers:
+        await worker.resume(session_factory)
+    for worker in workers:
+        await worker.drain()
+
+    await db_session.refresh(stale)
+    await db_session.refresh(live)
+    assert stale.status == "succeeded"
+    assert live.status == "running"
+    assert mock_llm_plan.call_count == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("db_engine", ["file"], indirect=True)  # the heartbeat runs concurrently
+async def test_running_job_renews_its_lease(client, auth_headers, mock_llm_plan, db_session):
+    pid = await _active_persona(client, auth_headers)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_llm(*args, **kwargs):
+        started.set()
+        await release.wait()
+        return MOCK_PLAN_DATA
+
+    mock_llm_plan.side_effect = slow_llm
+    with patch("app.services.jobs.JOB_HEARTBEAT", timedelta(milliseconds=10)):
+        job_id = (await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)).json()["id"]
+        await started.wait()
+        job = await db_session.get(PlanJob, job_id)
+        claimed_at = job.updated_at
+        await db_session.commit()
+        await asyncio.sleep(0.1)
+
+        # Still generating, but touched since the claim: resume() leaves it alone
+        await db_session.refresh(job)
+        assert job.status == "running"
+        assert job.updated_at > claimed_at
+        await db_session.commit()
+        release.set()
+        await job_runner.drain()
+
+    await db_session.refresh(job)
+    assert job.status == "succeeded"
+
+
+@pytest.mark.asyncio
+async def test_shutdown_requeues_running_job(client, auth_headers, mock_llm_plan, db_engine, db_session):
+    pid = await _active_persona(client, auth_headers)
+    started = asyncio.Event()
+
+    async def slow_llm(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(3600)
+
+    mock_llm_plan.side_effect = slow_llm
+    job_id = (await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)).json()["id"]
+    await started.wait()
+    await job_runner.shutdown()
+
+    job = await db_session.get(PlanJob, job_id)
+    assert job.status == "queued"
+
+
+async def _active_persona(client, headers) -> str:
+    create = await client.post("/api/personas", headers=headers, json={
+        "wizard_answers": {
+            "interests": ["baking"],
+            "age_range": "25-34",
+            "location": "Vermont",
+            "profession": "baker",
+            "shopping_style": "midrange",
+            "noise_intensity": "subtle",
+        }
+    })
+    pid = create.json()["id"]
+    await client.patch(f"/api/personas/{pid}", headers=headers, json={"is_active": True})
+    return pid
+
+
+@pytest.mark.asyncio
+async def test_generate_attaches_to_in_flight_job(client, auth_headers, mock_llm_plan, db_session):
+    pid = await _active_persona(client, auth_headers)
+    # A job already queued for the persona (not started, so the test's single
+    # connection isn't shared with a running generation)
+    me = await client.get("/api/auth/me", headers=auth_headers)
+    queued = PlanJob(user_id=me.json()["id"], persona_id=pid)
+    db_session.add(queued)
+    await db_session.commit()
+
+    resp = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    assert resp.status_code == 202
+    assert resp.json()["id"] == queued.id
+    assert resp.headers["Location"] == f"/api/plans/jobs/{queued.id}"
+    await job_runner.drain()
+    assert mock_llm_plan.call_count == 0
+
+    # Once nothing is in flight, a request starts a new job
+    queued.status = "failed"
+    await db_session.commit()
+    fresh = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    assert fresh.json()["id"] != queued.id
+    await job_runner.drain()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_generate_attaches_instead_of_duplicating(
+    client, auth_headers, mock_llm_plan, db_session
+):
+    pid = await _active_persona(client, auth_headers)
+    me = await client.get("/api/auth/me", headers=auth_headers)
+    queued = PlanJob(user_id=me.json()["id"], persona_id=pid)
+    db_session.add(queued)
+    await db_session.commit()
+
+    # The request's own check misses the job (as when two requests race);
+    # the unique index stops the second insert and it attaches instead
+    with patch("app.routers.plans.find_open_job", new_callable=AsyncMock, return_value=None):
+        resp = await client.post(f"/api/plans/generate/{pid}", headers=auth_headers)
+    assert resp.status_code == 202
+    assert resp.json()["id"] == queued.id
+    await job_runner.drain()
+    assert mock_llm_plan.call_count == 0
+    jobs = (await db_session.execute(select(PlanJob).where(PlanJob.persona_id == pid))).scalars().all()
+    assert len(jobs) == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_idempotency_key_replays_job(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    headers = {**auth_headers, "Idempotency-Key": "gen-1"}
+    first = await client.post(f"/api/plans/generate/{pid}", headers=headers)
+    await job_runner.drain()
+
+    retry = await client.post(f"/api/plans/generate/{pid}", headers=headers)
+    assert retry.status_code == 202
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.json()["status"] == "succeeded"  # current state, not the stored 202 body
+
+
+@pytest.mark.asyncio
+async def test_due_actions_and_ack(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    plan = await _generate(client, auth_headers, pid)
+
+    # Offsets in MOCK_PLAN_DATA are 10-50 minutes; a 20-minute window gets two
+    resp = await client.get("/api/plans/actions/due?window_minutes=20", headers=auth_headers)
+    assert resp.status_code == 200
+    actions = resp.json()
+    assert [a["action_type"] for a in actions] == ["search", "page_visit"]
+    assert actions[0]["payload"] == {"query": "best hiking trails near denver", "engine": "google"}
+    assert all(a["status"] == "delivered" for a in actions)
+
+    # Delivered actions aren't handed out twice
+    resp = await client.get("/api/plans/actions/due?window_minutes=20", headers=auth_headers)
+    assert resp.json() == []
+
+    ack = await client.post("/api/plans/actions/ack", headers=auth_headers, json={
+        "completed": [actions[0]["id"]],
+        "failed": [actions[1]["id"]],
+    })
+    assert ack.json() == {"updated": 2}
+
+    rest = await client.get("/api/plans/actions/due?window_minutes=120", headers=auth_headers)
+    assert len(rest.json()) == 2
+    await client.post("/api/plans/actions/ack", headers=auth_headers, json={
+        "completed": [a["id"] for a in rest.json()],
+    })
+    next_plans = await client.get("/api/plans/next", headers=auth_headers)
+    assert plan["id"] not in [p["id"] for p in next_plans.json()]
+
+
+@pytest.mark.asyncio
+async def test_empty_due_poll_skips_the_writer(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    writer = AsyncMock()
+
+    async def untouched_writer():
+        yield writer
+
+    real_writer = app.dependency_overrides[get_db]
+    app.dependency_overrides[get_db] = untouched_writer
+    resp = await client.get("/api/plans/actions/due", headers=auth_headers)
+    assert resp.json() == []
+    writer.execute.assert_not_awaited()
+    app.dependency_overrides[get_db] = real_writer
+
+    # Once something is due, the poll claims it through the writer
+    await _generate(client, auth_headers, pid)
+    resp = await client.get("/api/plans/actions/due?window_minutes=20", headers=auth_headers)
+    assert len(resp.json()) == 2
+
+
+def test_last_modified_rounds_up():
+    now = datetime(2026, 1, 1, 12, 2, tzinfo=timezone.utc)
+    bucket_start = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _, last_modified = _next_validators(1, bucket_start + timedelta(milliseconds=300), now)
+    assert last_modified == bucket_start + timedelta(seconds=1)
+    _, last_modified = _next_validators(1, None, now)
+    assert last_modified == bucket_start
+
+
+@pytest.mark.asyncio
+async def test_due_actions_only_returns_rows_it_claimed(client, auth_headers, mock_llm_plan, db_engine):
+    pid = await _active_persona(client, auth_headers)
+    await _generate(client, auth_headers, pid)
+
+    def other_poller(conn, cursor, statement, parameters, context, executemany):
+        # Between this poll's SELECT and UPDATE, another poller claims the earliest action
+        if statement.startswith("UPDATE plan_actions") and not raced:
+            raced.append(True)
+            cursor.execute(
+                "UPDATE plan_actions SET status = 'delivered', delivered_at = CURRENT_TIMESTAMP "
+                "WHERE id = (SELECT id FROM plan_actions ORDER BY due_at LIMIT 1)"
+            )
+
+    raced: list[bool] = []
+    event.listen(db_engine.sync_engine, "before_cursor_execute", other_poller)
+    try:
+        resp = await client.get("/api/plans/actions/due?window_minutes=20", headers=auth_headers)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", other_poller)
+    assert raced
+    assert [a["action_type"] for a in resp.json()] == ["page_visit"]
+
+
+@pytest.mark.asyncio
+async def test_ack_ignores_other_users_actions(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    await _generate(client, auth_headers, pid)
+    actions = (await client.get("/api/plans/actions/due", headers=auth_headers)).json()
+
+    await client.post("/api/auth/register", json={"email": "other@phantom.dev", "password": "pw"})
+    login = await client.post("/api/auth/login", json={"email": "other@phantom.dev", "password": "pw"})
+    other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    assert (await client.get("/api/plans/actions/due", headers=other)).json() == []
+    ack = await client.post("/api/plans/actions/ack", headers=other, json={
+        "completed": [a["id"] for a in actions],
+    })
+    assert ack.json() == {"updated": 0}
+
+
+@pytest.mark.asyncio
+async def test_next_conditional_get(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+
+    first = await client.get("/api/plans/next", headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    same = await client.get("/api/plans/next", headers={**auth_headers, "If-None-Match": etag})
+    assert same.status_code == 304
+    assert same.headers["ETag"] == etag
+
+    since = await client.get("/api/plans/next", headers={
+        **auth_headers, "If-Modified-Since": first.headers["Last-Modified"],
+    })
+    assert since.status_code == 304
+
+    # A new plan bumps the version, so the old ETag no longer matches
+    await _generate(client, auth_headers, pid)
+    changed = await client.get("/api/plans/next", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 1
+
+    # Deactivating the persona also changes what /next returns
+    await client.patch(f"/api/personas/{pid}", headers=auth_headers, json={"is_active": False})
+    resp = await client.get("/api/plans/next", headers={
+        **auth_headers, "If-None-Match": changed.headers["ETag"],
+    })
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+@pytest.mark.asyncio
+async def test_next_etag_ignores_stale_cached_principal(client, auth_headers, db_session):
+    first = await client.get("/api/plans/next", headers=auth_headers)
+    etag = first.headers["ETag"]
+
+    # Another worker bumps the version; this process's cached principal is untouched
+    await db_session.execute(text("UPDATE users SET plan_version = plan_version + 1"))
+    await db_session.commit()
+
+    resp = await client.get("/api/plans/next", headers={**auth_headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_activity_keyset_pagination(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    plan_ids = [(await _generate(client, auth_headers, pid))["id"] for _ in range(3)]
+
+    page1 = await client.get("/api/plans/activity?limit=2", headers=auth_headers)
+    assert page1.status_code == 200
+    assert len(page1.json()) == 2
+    assert page1.json()[0]["plan_data"] is None
+    cursor = page1.headers["X-Next-Cursor"]
+
+    page2 = await client.get(f"/api/plans/activity?limit=2&cursor={cursor}", headers=auth_headers)
+    assert len(page2.json()) == 1
+    assert "X-Next-Cursor" not in page2.headers
+    seen = [p["id"] for p in page1.json() + page2.json()]
+    assert sorted(seen) == sorted(plan_ids)
+
+    full = await client.get("/api/plans/activity?include_plan_data=true", headers=auth_headers)
+    assert "searches" in full.json()[0]["plan_data"]
+
+    bad = await client.get("/api/plans/activity?cursor=not-a-cursor", headers=auth_headers)
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_activity_scoped_to_user(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    await _generate(client, auth_headers, pid)
+
+    await client.post("/api/auth/register", json={"email": "feed@phantom.dev", "password": "pw"})
+    login = await client.post("/api/auth/login", json={"email": "feed@phantom.dev", "password": "pw"})
+    other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert (await client.get("/api/plans/activity", headers=other)).json() == []
+
+
+@pytest.mark.asyncio
+async def test_analytics_rollups(client, auth_headers, mock_llm_plan):
+    pid = await _active_persona(client, auth_headers)
+    await _generate(client, auth_headers, pid)
+    actions = (await client.get("/api/plans/actions/due?window_minutes=120", headers=auth_headers)).json()
+    searches = [a["id"] for a in actions if a["action_type"] == "search"]
+    await client.post("/api/plans/actions/ack", headers=auth_headers, json={
+        "completed": searches[:1], "failed": searches[1:],
+    })
+
+    resp = await client.get("/api/analytics", headers=auth_headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["totals"] == {"planned": 4, "completed": 1, "failed": 1}
+    by_type = {t["action_type"]: t for t in data["by_type"]}
+    assert by_type["search"] == {"action_type": "search", "planned": 2, "completed": 1, "failed": 1}
+    assert by_type["product_browse"]["planned"] == 1
+    assert data["by_persona"][0]["persona_id"] == pid
+
+    # Persona attribute filters run against the indexed persona columns
+    subtle = await client.get("/api/analytics?noise_intensity=subtle&location=denver", headers=auth_headers)
+    assert subtle.json()["totals"]["planned"] == 4
+    heavy = await client.get("/api/analytics?noise_intensity=heavy", headers=auth_headers)
+    assert heavy.json()["totals"]["planned"] == 0
@@ -0,0 +1,125 @@
+"""Tests for nightly plan pre-generation — windows, skipping and resume."""
+
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import Settings
+from app.models.persona import Persona
+from app.models.plan import BrowsingPlan
+from app.models.scheduler_state import SchedulerState
+from app.services.pregen import STATE_ID, next_window, run_pregeneration
+from app.services.scheduler import PhantomScheduler
+from tests.conftest import MOCK_PERSONA_PROFILE, MOCK_PLAN_DATA
+
+NIGHT = datetime(2026, 1, 15, 3, 0, tzinfo=timezone.utc)
+
+
+def _persona(name: str, tz: str = "America/Denver", active: bool = True) -> Persona:
+    return Persona(
+        user_id="u1",
+        name=name,
+        wizard_answers={"noise_intensity": "subtle"},
+        profile={**MOCK_PERSONA_PROFILE, "name": name},
+        is_active=active,
+        timezone=tz,
+        active_hours_start=8,
+        active_hours_end=22,
+    )
+
+
+def _settings(page_size: int = 2) -> Settings:
+    settings = Settings()
+    settings.pregen.page_size = page_size
+    settings.llm.max_concurrent = 1  # tests share one in-memory connection
+    return settings
+
+
+def test_next_window_is_tomorrow_local():
+    # 03:00 UTC is 20:00 on Jan 14 in Denver, so "tomorrow" is Jan 15 08:00 MST
+    start, hours = next_window(_persona("Alex"), NIGHT)
+    assert start == datetime(2026, 1, 15, 15, 0, tzinfo=timezone.utc)
+    assert hours == 14
+
+    owl = _persona("Owl", tz="Asia/Tokyo")
+    owl.active_hours_start, owl.active_hours_end = 20, 6
+    start, hours = next_window(owl, NIGHT)
+    assert start == datetime(2026, 1, 16, 11, 0, tzinfo=timezone.utc)
+    assert hours == 10
+
+
+@pytest.mark.asyncio
+async def test_pregenerates_active_personas_once(db_engine, db_session):
+    db_session.add_all([_persona(f"P{i}") for i in range(3)] + [_persona("Off", active=False)])
+    await db_session.commit()
+    factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    with patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.return_value = MOCK_PLAN_DATA
+        result = await run_pregeneration(factory, _settings(), now=NIGHT)
+        assert result["done"] is True
+        assert result["stats"] == {"generated": 3, "skipped": 0, "failed": 0}
+
+        # Finished runs are not repeated the same day
+        again = await run_pregeneration(factory, _settings(), now=NIGHT)
+        assert again["stats"]["generated"] == 3
+    assert mock.call_count == 3
+
+    count = await db_session.scalar(select(func.count()).select_from(BrowsingPlan))
+    assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_resumes_after_checkpoint_and_skips_existing(db_engine, db_session):
+    personas = [_persona(f"P{i}") for i in range(4)]
+    db_session.add_all(personas)
+    await db_session.commit()
+    ordered = sorted(p.id for p in personas)
+    factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    # A previous run got through the first page, then stopped
+    db_session.add(SchedulerState(id=STATE_ID, state=json.dumps({
+        "run": "2026-01-15", "cursor": ordered[1], "done": False,
+        "stats": {"generated": 2, "skipped": 0, "failed": 0},
+    })))
+    # ...and one persona on the next page already has tomorrow's plan
+    start, _ = next_window(personas[0], NIGHT)
+    db_session.add(BrowsingPlan(persona_id=ordered[2], plan_data={}, scheduled_for=start))
+    await db_session.commit()
+
+    with patch("app.services.plan_gen.generate_json", new_callable=AsyncMock) as mock:
+        mock.return_value = MOCK_PLAN_DATA
+        result = await run_pregeneration(factory, _settings(), now=NIGHT)
+    assert mock.call_count == 1
+    assert result["stats"] == {"generated": 3, "skipped": 1, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_outside_its_hour(db_engine, db_session):
+    factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    settings = _settings()
+    settings.pregen.hour_utc = NIGHT.hour
+    scheduler = PhantomScheduler(settings)
+    later = NIGHT + timedelta(hours=5)
+
+    with patch("app.services.scheduler.async_session", factory):
+        assert await scheduler._pregen_due(NIGHT)
+        assert not await scheduler._pregen_due(later)
+
+        # The process restarted mid-run: carry on after the hour has passed
+        db_session.add(SchedulerState(id=STATE_ID, state=json.dumps({
+            "run": "2026-01-15", "cursor": "p1", "done": False,
+            "stats": {"generated": 2, "skipped": 0, "failed": 0},
+        })))
+        await db_session.commit()
+        assert await scheduler._pregen_due(later)
+        assert not await scheduler._pregen_due(later + timedelta(days=1))
+
+        state = await db_session.get(SchedulerState, STATE_ID)
+        state.state = json.dumps({**json.loads(state.state), "done": True})
+        await db_session.commit()
+        assert not await scheduler._pregen_due(later)
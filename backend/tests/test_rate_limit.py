@@ -0,0 +1,96 @@
+"""Tests for token-bucket rate limiting of LLM-backed endpoints."""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.config import BucketLimit, get_settings
+from app.services.rate_limit import MemoryBucketStore, SQLiteBucketStore
+
+LIMIT = BucketLimit(per_minute=60, burst=2)  # one token a second
+
+ANSWERS = {
+    "interests": ["outdoors"],
+    "age_range": "25-34",
+    "location": "Colorado",
+    "profession": "designer",
+    "shopping_style": "budget",
+    "noise_intensity": "moderate",
+}
+
+
+@pytest.mark.asyncio
+async def test_memory_bucket_refills():
+    store = MemoryBucketStore()
+    with patch("app.services.rate_limit.time.monotonic", return_value=100.0):
+        assert await store.take("k", LIMIT) == 0
+        assert await store.take("k", LIMIT) == 0
+        assert await store.take("k", LIMIT) == pytest.approx(1.0)
+        assert await store.take("other", LIMIT) == 0  # buckets are per key
+    with patch("app.services.rate_limit.time.monotonic", return_value=100.5):
+        assert await store.take("k", LIMIT) == pytest.approx(0.5)  # refused: nothing spent
+    with patch("app.services.rate_limit.time.monotonic", return_value=101.0):
+        assert await store.take("k", LIMIT) == 0
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_is_shared(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)  # e.g. two workers
+    assert await first.take("k", LIMIT) == 0
+    assert await second.take("k", LIMIT) == 0
+    assert await first.take("k", LIMIT) > 0
+
+
+@pytest.mark.asyncio
+async def test_persona_creation_is_limited(client, auth_headers, mock_llm):
+    limit = get_settings().rate_limit.personas
+    for _ in range(limit.burst):
+        resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+        assert resp.status_code == 201
+    resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert mock_llm.call_count == limit.burst
+
+
+@pytest.mark.asyncio
+async def test_bulk_creation_spends_a_token_per_persona(client, auth_headers, mock_llm):
+    cfg = get_settings().rate_limit
+    saved = cfg.persona_bulk
+    cfg.persona_bulk = BucketLimit(per_minute=6, burst=10)
+    try:
+        resp = await client.post(
+            "/api/personas/bulk", headers=auth_headers, json={"template": ANSWERS, "count": 8},
+        )
+        assert resp.status_code == 200
+        resp = await client.post(
+            "/api/personas/bulk", headers=auth_headers, json={"template": ANSWERS, "count": 3},
+        )
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 10  # 2 tokens left, the 3rd arrives in 10 s
+
+        # More than the whole burst can never be admitted: refused without a
+        # Retry-After and without touching the bucket
+        with patch("app.services.rate_limit.MemoryBucketStore.take") as take:
+            resp = await client.post(
+                "/api/personas/bulk", headers=auth_headers, json={"template": ANSWERS, "count": 11},
+            )
+        assert resp.status_code == 422
+        assert "Retry-After" not in resp.headers
+        assert "at most 10" in resp.json()["detail"]
+        take.assert_not_called()
+    finally:
+        cfg.persona_bulk = saved
+
+
+@pytest.mark.asyncio
+async def test_disabled_limiter(client, auth_headers, mock_llm):
+    cfg = get_settings().rate_limit
+    cfg.enabled = False
+    try:
+        for _ in range(cfg.personas.burst + 1):
+            resp = await client.post("/api/personas", headers=auth_headers, json={"wizard_answers": ANSWERS})
+            assert resp.status_code == 201
+    finally:
+        cfg.enabled = True
@@ -0,0 +1,123 @@
+"""Tests for the background scheduler — persona selection and timing."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from app.config import Settings
+from app.models.persona import Persona
+from app.services.scheduler import PhantomScheduler
+from app.services.timezones import local_hour, timezone_for_location
+from tests.conftest import MOCK_PERSONA_PROFILE
+
+
+def test_timezone_for_location():
+    assert timezone_for_location("Denver, Colorado") == "America/Denver"
+    assert timezone_for_location("Austin, TX") == "America/Chicago"
+    assert timezone_for_location("Portland, Maine") == "America/New_York"
+    assert timezone_for_location("Paris, France") == "Europe/Paris"
+    assert timezone_for_location("somewhere") == "UTC"
+    assert timezone_for_location(None) == "UTC"
+
+
+def test_local_hour():
+    noon_utc = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+    assert local_hour("America/Denver", noon_utc) == 5
+    assert local_hour("UTC", noon_utc) == 12
+
+
+def _persona(name: str, tz: str, start: int = 8, end: int = 22) -> Persona:
+    return Persona(
+        user_id="u1",
+        name=name,
+        wizard_answers={},
+        profile={**MOCK_PERSONA_PROFILE, "name": name},
+        is_active=True,
+        timezone=tz,
+        active_hours_start=start,
+        active_hours_end=end,
+    )
+
+
+@pytest.mark.asyncio
+async def test_summary_only_picks_awake_personas(db_session):
+    db_session.add_all([
+        _persona("Denver Sleeper", "America/Denver"),
+        _persona("Tokyo Owl", "Asia/Tokyo", start=20, end=6),
+    ])
+    await db_session.commit()
+    scheduler = PhantomScheduler(Settings())
+
+    # 12:00 UTC = 05:00 in Denver (asleep), 21:00 in Tokyo (inside 20-06)
+    fixed = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+    with patch("app.services.scheduler.datetime") as mock_dt:
+        mock_dt.now.return_value = fixed
+        summary = await scheduler._get_active_persona_summary(db_session)
+    assert summary is not None
+    assert summary.startswith("Tokyo Owl")
+
+
+@pytest.mark.asyncio
+async def test_summary_none_when_everyone_asleep(db_session):
+    db_session.add(_persona("Denver Sleeper", "America/Denver"))
+    await db_session.commit()
+    scheduler = PhantomScheduler(Settings())
+
+    fixed = datetime(2026, 1, 15, 10, 0, tzinfo=timezone.utc)  # 03:00 Denver
+    with patch("app.services.scheduler.datetime") as mock_dt:
+        mock_dt.now.return_value = fixed
+        assert await scheduler._get_active_persona_summary(db_session) is None
+
+
+@pytest.mark.asyncio
+async def test_candidate_windows_rotate_through_every_persona(db_session):
+    personas = [_persona(f"Tokyo Owl {i}", "Asia/Tokyo", start=20, end=6) for i in range(3)]
+    db_session.add_all(personas)
+    await db_session.commit()
+    ids = sorted(p.id for p in personas)
+
+    # One candidate per window: successive picks walk the ids and wrap around
+    scheduler = PhantomScheduler(Settings(diversity={"enabled": False}))
+    fixed = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+    with patch("app.services.scheduler.datetime") as mock_dt:
+        mock_dt.now.return_value = fixed
+        picks = [(await scheduler._pick_active_persona(db_session))[0] for _ in range(4)]
+    assert picks == [*ids, ids[0]]
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_roundtrip(db_session):
+    scheduler = PhantomScheduler(Settings())
+    scheduler.stats["searches_generated"] = 42
+    scheduler._current_persona_summary = "Alex Rivera, age 32"
+    scheduler._next_due["search"] = 1_900_000_000.0
+    await scheduler.checkpoint(db_session)
+    await scheduler.checkpoint(db_session)  # second write updates in place
+
+    restored = PhantomScheduler(Settings())
+    assert await restored.restore(db_session) is True
+    assert restored.stats["searches_generated"] == 42
+    assert restored.stats["pages_generated"] == 0
+    assert restored.current_persona == "Alex Rivera, age 32"
+    assert restored._next_due["search"] == 1_900_000_000.0
+
+
+@pytest.mark.asyncio
+async def test_restore_without_checkpoint(db_session):
+    scheduler = PhantomScheduler(Settings())
+    assert await scheduler.restore(db_session) is False
+
+
+def test_initial_delay_resumes_with_jitter():
+    settings = Settings()
+    settings.scheduler.startup_jitter = 10
+    scheduler = PhantomScheduler(settings)
+    with patch("app.services.scheduler.time.time", return_value=1000.0):
+        scheduler._next_due["search"] = 1300.0
+        delay = scheduler._initial_delay("search")
+        assert 300 <= delay <= 310
+        # Overdue or never-run loops only wait for jitter
+        scheduler._next_due["browsing"] = 500.0
+        assert 0 <= scheduler._initial_delay("browsing") <= 10
+        assert 0 <= scheduler._initial_delay("cleanup") <= 10
@@ -0,0 +1,116 @@
+"""Tests for LLM usage metering, rollups and daily quotas."""
+
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import Settings, get_settings
+from app.models.llm_usage import LLMUsageRollup
+from app.models.persona import Persona
+from app.services.llm import generate
+from app.services.scheduler import PhantomScheduler
+from app.services.usage import metered, usage_meter
+from tests.conftest import MOCK_PERSONA_PROFILE
+
+
+@pytest.fixture(autouse=True)
+def fresh_meter():
+    usage_meter._pending.clear()
+    usage_meter._used.clear()
+    yield usage_meter
+    usage_meter._pending.clear()
+    usage_meter._used.clear()
+
+
+@pytest.mark.asyncio
+async def test_calls_are_metered_and_rolled_up(db_session):
+    async def ollama(prompt, usage):
+        usage.update(prompt_tokens=11, completion_tokens=7)
+        return "ok"
+
+    with patch("app.services.llm._ollama_generate", side_effect=ollama):
+        with metered("plan", "u1", "p1"):
+            await generate("prompt")
+            await generate("prompt")
+    with patch("app.services.llm._ollama_generate", new_callable=AsyncMock, return_value="x" * 40):
+        await generate("y" * 20)  # no counts reported: estimated, unattributed
+
+    assert usage_meter.used_today("u1") == 36
+    assert await usage_meter.flush(db_session) == 2
+    rows = {(r.user_id, r.persona_id, r.task): r for r in (await db_session.execute(select(LLMUsageRollup))).scalars()}
+    plan = rows[("u1", "p1", "plan")]
+    assert (plan.calls, plan.prompt_tokens, plan.completion_tokens) == (2, 22, 14)
+    other = rows[("", "", "other")]
+    assert (other.prompt_tokens, other.completion_tokens) == (5, 10)
+
+    # A second flush adds to the same rows; totals are reloaded from the table
+    with patch("app.services.llm._ollama_generate", side_effect=ollama):
+        with metered("plan", "u1", "p1"):
+            await generate("prompt")
+    await usage_meter.flush(db_session)
+    await db_session.refresh(plan)
+    assert plan.calls == 3
+    assert usage_meter.used_today("u1") == 54
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("db_engine", ["file"], indirect=True)  # the flush loop runs concurrently
+async def test_meter_flushes_on_its_own_loop(db_engine, db_session):
+    factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    await usage_meter.start(factory, interval=0.01)
+    try:
+        with metered("plan", "u1", "p1"):
+            usage_meter.record(prompt_tokens=5, completion_tokens=5, wall_ms=1)
+        await asyncio.sleep(0.1)
+        rows = (await db_session.execute(select(LLMUsageRollup))).scalars().all()
+        assert [(r.user_id, r.calls) for r in rows] == [("u1", 1)]
+        await db_session.commit()
+    finally:
+        with metered("plan", "u1", "p1"):
+            usage_meter.record(prompt_tokens=5, completion_tokens=5, wall_ms=1)
+        await usage_meter.stop(factory)  # writes what is still pending
+    row = (await db_session.execute(select(LLMUsageRollup).execution_options(populate_existing=True))).scalar_one()
+    assert row.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_over_quota_users_are_skipped_by_scheduler(db_session):
+    persona = Persona(
+        user_id="heavy", name="Alex", wizard_answers={}, profile=MOCK_PERSONA_PROFILE,
+        is_active=True, timezone="UTC", active_hours_start=0, active_hours_end=24,
+    )
+    db_session.add(persona)
+    await db_session.commit()
+    scheduler = PhantomScheduler(Settings())
+    usage = get_settings().usage
+    usage.daily_token_quota = 100
+    try:
+        with metered("noise_search", "heavy", persona.id):
+            usage_meter.record(prompt_tokens=60, completion_tokens=50, wall_ms=5)
+        assert usage_meter.over_quota("heavy")
+        assert await scheduler._pick_active_persona(db_session) is None
+    finally:
+        usage.daily_token_quota = 0
+    assert (await scheduler._pick_active_persona(db_session))[1] == "heavy"
+
+
+@pytest.mark.asyncio
+async def test_usage_endpoint(client, auth_headers, db_session):
+    me = (await client.get("/api/auth/me", headers=auth_headers)).json()
+    db_session.add(LLMUsageRollup(
+        user_id=me["id"], day=datetime.now(timezone.utc).date(), persona_id="", task="persona",
+        calls=2, prompt_tokens=300, completion_tokens=200, wall_ms=900,
+    ))
+    await db_session.commit()
+
+    resp = await client.get("/api/analytics/usage", headers=auth_headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["totals"]["prompt_tokens"] == 300
+    assert data["by_task"][0]["task"] == "persona"
+    assert data["by_persona"][0]["persona_id"] is None
+    assert data["daily_quota"] is None
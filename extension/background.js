@@ -1,6 +1,6 @@
 /**
  * Phantom — Background Service Worker
- * Polls the backend for browsing plans and executes phantom actions.
+ * Polls the backend for due plan actions and executes them, acking each one.
  */
 
 const DEFAULT_CONFIG = {
@@ -44,12 +44,12 @@ function authHeaders(apiKey) {
   return headers;
 }
 
-// --- Plan fetching with exponential backoff ---
+// --- Action fetching with exponential backoff ---
 
 let consecutiveFailures = 0;
 
-async function fetchNextPlans(backendUrl, apiKey) {
-  const resp = await fetch(`${backendUrl}/api/plans/next`, {
+async function fetchDueActions(backendUrl, apiKey) {
+  const resp = await fetch(`${backendUrl}/api/plans/actions/due?window_minutes=60&limit=5`, {
     headers: authHeaders(apiKey),
   });
   if (!resp.ok) {
@@ -59,25 +59,14 @@ async function fetchNextPlans(backendUrl, apiKey) {
   return resp.json();
 }
 
-async function completePlan(backendUrl, apiKey, planId, actionsCompleted) {
-  await fetch(`${backendUrl}/api/plans/${planId}/complete`, {
+async function ackActions(backendUrl, apiKey, completed, failed) {
+  await fetch(`${backendUrl}/api/plans/actions/ack`, {
     method: "POST",
     headers: authHeaders(apiKey),
-    body: JSON.stringify({ actions_completed: actionsCompleted }),
+    body: JSON.stringify({ completed, failed }),
   });
 }
 
-// --- Plan validation ---
-
-function isValidPlan(plan) {
-  if (!plan || !plan.plan_data) return false;
-  const d = plan.plan_data;
-  if (!Array.isArray(d.searches) && !Array.isArray(d.page_visits) && !Array.isArray(d.product_browsing)) {
-    return false;
-  }
-  return true;
-}
-
 // --- Tab execution (one at a time) ---
 
 let executing = false;
@@ -127,48 +116,33 @@ async function executeProductBrowse(site, searchTerm) {
   await openPhantomTab(url, 5000 + Math.random() * 10000);
 }
 
-// --- Plan execution ---
-
-async function executePlan(backendUrl, apiKey, plan) {
-  if (!isValidPlan(plan)) {
-    console.warn("[Phantom] Skipping invalid plan:", plan?.id);
-    return;
-  }
-
-  const data = plan.plan_data;
-  const allActions = [];
+// --- Action execution ---
 
-  for (const s of data.searches || []) {
-    allActions.push({ type: "search", ...s });
-  }
-  for (const p of data.page_visits || []) {
-    allActions.push({ type: "page_visit", ...p });
-  }
-  for (const pb of data.product_browsing || []) {
-    allActions.push({ type: "product_browse", ...pb });
+async function executeAction(action) {
+  const p = action.payload || {};
+  if (action.action_type === "search") {
+    await executeSearch(p.query, p.engine);
+  } else if (action.action_type === "page_visit") {
+    await executePageVisit(p.url, p.dwell_seconds);
+  } else if (action.action_type === "product_browse") {
+    await executeProductBrowse(p.site, p.search);
+  } else {
+    throw new Error(`Unknown action type: ${action.action_type}`);
   }
-  allActions.sort((a, b) => a.time_offset_min - b.time_offset_min);
-
-  const batchSize = Math.min(5, allActions.length);
-  const batch = allActions.slice(0, batchSize);
+}
 
-  for (const action of batch) {
+async function executeActions(backendUrl, apiKey, actions) {
+  for (const action of actions) {
     try {
-      if (action.type === "search") {
-        await executeSearch(action.query, action.engine);
-      } else if (action.type === "page_visit") {
-        await executePageVisit(action.url, action.dwell_seconds);
-      } else if (action.type === "product_browse") {
-        await executeProductBrowse(action.site, action.search);
-      }
+      await executeAction(action);
       await incrementActions();
+      await ackActions(backendUrl, apiKey, [action.id], []);
       await new Promise((r) => setTimeout(r, 10000 + Math.random() * 50000));
     } catch (err) {
       console.warn("[Phantom] Action failed:", err);
+      await ackActions(backendUrl, apiKey, [], [action.id]).catch(() => {});
     }
   }
-
-  await completePlan(backendUrl, apiKey, plan.id, batch.length);
 }
 
 // --- Alarm handler with exponential backoff ---
@@ -191,9 +165,9 @@ async function onAlarm() {
 
   executing = true;
   try {
-    const plans = await fetchNextPlans(config.backendUrl, config.apiKey);
-    if (plans.length > 0) {
-      await executePlan(config.backendUrl, config.apiKey, plans[0]);
+    const actions = await fetchDueActions(config.backendUrl, config.apiKey);
+    if (actions.length > 0) {
+      await executeActions(config.backendUrl, config.apiKey, actions);
     }
   } catch (err) {
     consecutiveFailures++;
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useCallback } from "react";
+import { useState, useCallback, useEffect, useRef } from "react";
 import { useRouter } from "next/navigation";
 import { api, WizardAnswers, Persona } from "@/lib/api";
 
@@ -596,11 +596,21 @@ export default function PersonaWizard() {
     };
   }, [interests, ageRange, location, profession, shoppingStyle, noiseIntensity]);
 
-  const generatePersona = useCallback(async () => {
+  // One Idempotency-Key per set of answers: double clicks and retries reuse the
+  // persona the server already generated instead of paying for another LLM call.
+  const idempotencyKey = useRef<string | null>(null);
+  useEffect(() => {
+    idempotencyKey.current = null;
+  }, [buildAnswers]);
+
+  const generatePersona = useCallback(async (fresh = false) => {
+    if (fresh || !idempotencyKey.current) {
+      idempotencyKey.current = crypto.randomUUID();
+    }
     setGenerating(true);
     setError(null);
     try {
-      const result = await api.createPersona(buildAnswers());
+      const result = await api.createPersona(buildAnswers(), idempotencyKey.current);
       setPersona(result);
     } catch (err) {
       setError(err instanceof Error ? err.message : "Failed to create persona");
@@ -641,7 +651,7 @@ export default function PersonaWizard() {
   const handleRegenerate = () => {
     setPersona(null);
     setError(null);
-    generatePersona();
+    generatePersona(true);
   };
 
   const animationClass =
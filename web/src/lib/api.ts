@@ -33,6 +33,17 @@ export interface Plan {
   created_at: string;
 }
 
+export interface PlanJob {
+  id: string;
+  persona_id: string;
+  status: "queued" | "running" | "succeeded" | "failed";
+  plan_id?: string;
+  error?: string;
+  plan?: Plan;
+  created_at: string;
+  updated_at: string;
+}
+
 export interface PlanAction {
   id: string;
   plan_id: string;
@@ -107,10 +118,14 @@ class ApiClient {
   }
 
   // Personas
-  async createPersona(wizardAnswers: WizardAnswers): Promise<Persona> {
+  async createPersona(
+    wizardAnswers: WizardAnswers,
+    idempotencyKey?: string
+  ): Promise<Persona> {
     return this.request<Persona>("/api/personas", {
       method: "POST",
       body: JSON.stringify({ wizard_answers: wizardAnswers }),
+      headers: idempotencyKey ? { "Idempotency-Key": idempotencyKey } : {},
     });
   }
 
@@ -140,9 +155,21 @@ class ApiClient {
 
   // Plans
   async generatePlan(personaId: string): Promise<Plan> {
-    return this.request<Plan>(`/api/plans/generate/${personaId}`, {
+    let job = await this.request<PlanJob>(`/api/plans/generate/${personaId}`, {
       method: "POST",
     });
+    while (job.status === "queued" || job.status === "running") {
+      await new Promise((r) => setTimeout(r, 2000));
+      job = await this.getPlanJob(job.id);
+    }
+    if (job.status === "failed" || !job.plan) {
+      throw new Error(`Plan generation failed: ${job.error ?? "unknown error"}`);
+    }
+    return job.plan;
+  }
+
+  async getPlanJob(jobId: string): Promise<PlanJob> {
+    return this.request<PlanJob>(`/api/plans/jobs/${jobId}`);
   }
 
   async getNextPlan(): Promise<Plan> {